@@ -3,7 +3,7 @@ from ..use_cases import AmountDTO
 from .operation_id import get_operation_id
 from .validation import account_balance_parser
 from ..use_cases import credit_account, debit_account
-from ..composition_root import get_account_write_repo
+from ..composition_root import execute_account_command
 from werkzeug.exceptions import BadRequest
 from bank_ddd_es_cqrs.shared.logger import logger
 from bank_ddd_es_cqrs.shared.model import AppException, StatusCodes, UniqueID
@@ -30,9 +30,8 @@ class AccountBalance(Resource):
                 dollars=args['dollars'],
                 cents=args['cents']
             )
-            with get_account_write_repo() as account_repo:
-                action_func = self._get_func_by_action(action)
-                action_func(operation_id, UniqueID(account_id), account_repo, amount)
+            action_func = self._get_func_by_action(action)
+            execute_account_command(action_func, operation_id, UniqueID(account_id), amount)
         except AppException as e:
             return {'message': str(e)}, e.status
         except BadRequest as e:
@@ -2,6 +2,7 @@ from flask import Blueprint
 from flask_restplus import Api  # type: ignore
 from .account import account_ns
 from .client import client_ns
+from .metrics import metrics_ns
 
 
 account_blueprint = Blueprint('Banking API', __name__)
@@ -10,6 +11,7 @@ account_api = Api(account_blueprint, version='1.0', title='Account API',
 
 account_api.add_namespace(account_ns, '/api/v1')
 account_api.add_namespace(client_ns, '/api/v1')
+account_api.add_namespace(metrics_ns, '/api/v1')
 
 
 # TODO: maybe I should change the way I designed the api, maybe it should be hierarchical instead of just separated
@@ -1,10 +1,11 @@
+from typing import Any, Tuple
 from flask import Response, request
 from flask_restplus import Namespace, Resource  # type: ignore
 from bank_ddd_es_cqrs.shared.model import UniqueID, StatusCodes
-from ..use_cases import add_account_to_client, create_client, ClientDetailsDTO
-from ..composition_root import get_client_write_repo
+from ..use_cases import add_account_to_client, add_accounts_to_client, create_client, ClientDetailsDTO
+from ..composition_root import get_client_write_repo, execute_client_command
 from .operation_id import get_operation_id
-from .validation import client_add_account_parser, client_create_parser
+from .validation import client_add_account_parser, client_add_accounts_parser, client_create_parser
 from werkzeug.exceptions import BadRequest
 from bank_ddd_es_cqrs.shared.logger import logger
 from bank_ddd_es_cqrs.shared.model import AppException
@@ -24,8 +25,9 @@ class ClientAccount(Resource):
             args = client_add_account_parser.parse_args()
             operation_id = get_operation_id(args)
             new_account_name = args['account_name']
-            with get_client_write_repo() as client_repo:
-                new_account_id = add_account_to_client(operation_id, UniqueID(client_id), client_repo, new_account_name)
+            new_account_id = execute_client_command(
+                add_account_to_client, operation_id, UniqueID(client_id), new_account_name
+            )
             return Response(
                 status=StatusCodes.CREATED.value,
                 headers={
@@ -43,6 +45,32 @@ class ClientAccount(Resource):
             return str(e), StatusCodes.INTERNAL_SERVER_ERROR.value
 
 
+class ClientAccounts(Resource):
+    @client_ns.expect(client_add_accounts_parser)
+    @client_ns.doc(
+        responses={201: 'Accounts have been created in one operation',
+                   400: 'Bad client data',
+                   409: 'Conflict with current state (trying to change stale state)',
+                   500: 'Interval Server Error'})
+    def post(self, client_id: str) -> Tuple[Any, int]:
+        try:
+            args = client_add_accounts_parser.parse_args()
+            operation_id = get_operation_id(args)
+            new_account_ids = execute_client_command(
+                add_accounts_to_client, operation_id, UniqueID(client_id), args['account_name']
+            )
+            return {'accounts': [str(account_id) for account_id in new_account_ids]}, StatusCodes.CREATED.value
+        except AppException as e:
+            return {'message': str(e)}, e.status
+        except BadRequest as e:
+            return e.data['errors'], e.code  # type: ignore
+        except ValueError as e:
+            return {'message': str(e)}, StatusCodes.INVALID_USER_DATA.value
+        except Exception as e:
+            logger.error(e)
+            return str(e), StatusCodes.INTERNAL_SERVER_ERROR.value
+
+
 class Client(Resource):
     @client_ns.expect(client_create_parser)
     @client_ns.doc(
@@ -85,3 +113,4 @@ class Client(Resource):
 
 client_ns.add_resource(Client, '/client')
 client_ns.add_resource(ClientAccount, '/client/<client_id>/account')
+client_ns.add_resource(ClientAccounts, '/client/<client_id>/accounts')
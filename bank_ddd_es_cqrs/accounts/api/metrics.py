@@ -0,0 +1,17 @@
+from typing import Dict
+from flask_restplus import Namespace, Resource  # type: ignore
+from bank_ddd_es_cqrs.shared.metrics import metrics
+
+metrics_ns = Namespace('Metrics', description='Metrics of the process')
+
+
+class Metrics(Resource):
+    @metrics_ns.doc(responses={200: 'Current values of the counters and gauges of the process'})
+    def get(self) -> Dict[str, float]:
+        """
+        Counters and gauges of the process, such as the checkouts of the database connection pool
+        """
+        return metrics.snapshot()
+
+
+metrics_ns.add_resource(Metrics, '/metrics')
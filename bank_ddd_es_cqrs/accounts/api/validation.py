@@ -30,6 +30,17 @@ client_add_account_parser.add_argument('account_name',
                                        required=True,
                                        help='Name of the account to create')
 
+client_add_accounts_parser = reqparse.RequestParser()
+client_add_accounts_parser.add_argument('operation_id',
+                                        type=str,
+                                        help='operation id that will be used to perform the task, '
+                                             'if not specified will be generated')
+client_add_accounts_parser.add_argument('account_name',
+                                        type=str,
+                                        action='append',
+                                        required=True,
+                                        help='Name of an account to create, given once for every account')
+
 client_create_parser = reqparse.RequestParser()
 client_create_parser.add_argument('first_name',
                                   type=str,
@@ -1,25 +1,421 @@
 import os
-from contextlib import contextmanager
+import threading
+from contextlib import contextmanager, ExitStack
+from typing import Dict, Type, List, Optional, Iterator, Callable, Any, TypeVar
+from bank_ddd_es_cqrs.shared.model import AggregateRoot, SnapshotPolicy, UniqueID, BaseEvent, BoundedOperationLog, \
+    OperationDuplicate
+from bank_ddd_es_cqrs.shared.metrics import metrics
+from bank_ddd_es_cqrs.shared.retry import RetryingCommandExecutor, RetryBudget
+from bank_ddd_es_cqrs.shared.coalescer import CommandCoalescer
+from .model import Account, Client, AccountCreated, ClientCreated
+from .use_cases import credit_account, debit_account, add_account_to_client, add_accounts_to_client
 from .infrastructure import PyDispatcherEventManager, start_kafka_consumer
-from .infrastructure import ESAccountRepository, ESClientRepository, PostgresEventStore, sql_session_scope
+from .infrastructure import ESAccountRepository, ESClientRepository, PostgresEventStore, SegmentEventStore, \
+    EventStore, sql_session_scope, EventSerializer, StructEventCodec, migrate_uuid_columns as migrate_columns, \
+    migrate_events_table as migrate_events
+from .infrastructure.repos import EventSourcedRepository
+from .infrastructure.cache import AggregateCache
+from .infrastructure.event_store import ConcurrencyException, NotFoundException
+from .infrastructure.actors import ActorSystem
+from .infrastructure.sharded import ShardedEventStore, HashRing
+from .infrastructure.sharded.event_store import copy_stream, moved_streams
+
+T = TypeVar('T')
+
+snapshot_policies: Dict[Type[AggregateRoot], SnapshotPolicy] = {
+    Account: SnapshotPolicy(every=int(os.environ.get('ACCOUNTS_ACCOUNT_SNAPSHOT_EVERY', 100))),
+    Client: SnapshotPolicy(every=int(os.environ.get('ACCOUNTS_CLIENT_SNAPSHOT_EVERY', 100)))
+}
+stream_batch_size: Optional[int] = int(os.environ['ACCOUNTS_STREAM_BATCH_SIZE']) \
+    if os.environ.get('ACCOUNTS_STREAM_BATCH_SIZE') else None
+
+
+def _aggregate_cache(name: str) -> Optional[AggregateCache[Any]]:
+    max_entries = int(os.environ.get('ACCOUNTS_AGGREGATE_CACHE_ENTRIES', 0))
+    max_bytes = int(os.environ['ACCOUNTS_AGGREGATE_CACHE_BYTES']) \
+        if os.environ.get('ACCOUNTS_AGGREGATE_CACHE_BYTES') else None
+    return AggregateCache(name, max_entries, max_bytes) if max_entries else None
+
+
+# Disabled unless `ACCOUNTS_AGGREGATE_CACHE_ENTRIES` is set
+aggregate_caches: Dict[Type[AggregateRoot], Optional[AggregateCache[Any]]] = {
+    Account: _aggregate_cache('account'),
+    Client: _aggregate_cache('client')
+}
+
+# Aggregates remember only their last `ACCOUNTS_OPERATION_WINDOW` operations when it is set, older ones are looked
+# up in the `operations` table, which has to be filled by `backfill-operations` before it is set.
+# With `ACCOUNTS_OPERATION_INDEX` set the table is filled and commands that were already committed are found
+# there before their aggregate is loaded
+operation_window = int(os.environ.get('ACCOUNTS_OPERATION_WINDOW', 0))
+operation_bloom_bits = int(os.environ.get('ACCOUNTS_OPERATION_BLOOM_BITS', 1 << 15))
+index_operations = bool(operation_window) or os.environ.get('ACCOUNTS_OPERATION_INDEX', '') not in ('', '0')
+if operation_window:
+    for _aggregate_class in (Account, Client):
+        _aggregate_class.operation_log_factory = lambda: BoundedOperationLog(operation_window, operation_bloom_bits)
+
+# Replayed accounts sum their credits and debits in chunks when `ACCOUNTS_FOLD_BALANCE` is set, as int64 arrays
+# when numpy is installed
+Account.fold_balance = os.environ.get('ACCOUNTS_FOLD_BALANCE', '') not in ('', '0')
+
+# `json` keeps the events in the `data` column of postgres, `struct` encodes the hot events into fixed size records
+event_serializer: Optional[EventSerializer] = EventSerializer(StructEventCodec()) \
+    if os.environ.get('ACCOUNTS_EVENT_CODEC', 'json') == 'struct' else None
+
+segment_store_directory: Optional[str] = os.environ.get('ACCOUNTS_SEGMENT_STORE_DIR')
+
+
+def parse_shards(value: str) -> Dict[str, str]:
+    """
+    Shard map in the format `name=url,name=url`, the names are hashed to place the shards on the ring, so a shard
+    keeps its name when its database moves.
+    """
+    shards: Dict[str, str] = {}
+    for entry in filter(None, (entry.strip() for entry in value.split(','))):
+        name, separator, url = entry.partition('=')
+        if not separator or not name or not url:
+            raise ValueError(f'Shard {entry} is not in the format name=url')
+        shards[name] = url
+    return shards
+
+
+# Postgres databases the streams are sharded over when `ACCOUNTS_SHARDS` is set
+shard_urls: Dict[str, str] = parse_shards(os.environ.get('ACCOUNTS_SHARDS', ''))
+shard_virtual_nodes = int(os.environ.get('ACCOUNTS_SHARD_VIRTUAL_NODES', 100))
+shard_ring: Optional[HashRing] = HashRing(list(shard_urls), shard_virtual_nodes) if shard_urls else None
+
+
+def database_urls() -> List[Optional[str]]:
+    """
+    Urls of the shards, or `None` for the database of the environment when the streams are not sharded.
+    """
+    urls: List[Optional[str]] = list(shard_urls.values())
+    return urls or [None]
+
+
+def postgres_event_store(session: Any) -> PostgresEventStore:
+    return PostgresEventStore(session, serializer=event_serializer, index_operations=index_operations)
+
+
+_segment_event_store: Optional[SegmentEventStore] = None
+_segment_event_store_lock = threading.Lock()
+
+
+def get_segment_event_store() -> SegmentEventStore:
+    global _segment_event_store
+    with _segment_event_store_lock:
+        if _segment_event_store is None:
+            if segment_store_directory is None:
+                raise ValueError('ACCOUNTS_SEGMENT_STORE_DIR is not set')
+            _segment_event_store = SegmentEventStore(segment_store_directory, serializer=event_serializer)
+        return _segment_event_store
 
 
 @contextmanager
-def get_account_write_repo() -> ESAccountRepository:
-    with sql_session_scope() as session:
-        event_store = PostgresEventStore(session)
-        yield ESAccountRepository(event_store)
+def get_event_store() -> Iterator[EventStore]:
+    """
+    The segment files store of the process when `ACCOUNTS_SEGMENT_STORE_DIR` is set, otherwise postgres
+    in a session of its own, or the shards of `ACCOUNTS_SHARDS` each in a session of its own.
+    Events saved to segment files are not captured by the CDC,
+    so the event handlers don't get them.
+    """
+    if segment_store_directory:
+        yield get_segment_event_store()
+    elif shard_urls:
+        # Sessions connect only once they are used, a command opens a transaction only in the shard of its aggregate
+        with ExitStack() as stack:
+            yield ShardedEventStore({
+                name: postgres_event_store(stack.enter_context(sql_session_scope(url)))
+                for name, url in shard_urls.items()
+            }, shard_ring)
+    else:
+        with sql_session_scope() as session:
+            yield postgres_event_store(session)
 
 
 @contextmanager
-def get_client_write_repo() -> ESClientRepository:
-    with sql_session_scope() as session:
-        event_store = PostgresEventStore(session)
-        yield ESClientRepository(event_store)
+def get_account_write_repo(cached: bool = True) -> Iterator[ESAccountRepository]:
+    """
+    :param cached: whether aggregates are taken from and saved to the aggregate cache, the actors keep their
+        aggregates themselves and open the repository without it.
+    """
+    with get_event_store() as event_store:
+        repository = ESAccountRepository(
+            event_store, snapshot_policies[Account], stream_batch_size, aggregate_caches[Account] if cached else None
+        )
+        yield repository
+    # Only reached once the changes are committed
+    repository.cache_saved()
+
+
+@contextmanager
+def get_client_write_repo(cached: bool = True) -> Iterator[ESClientRepository]:
+    with get_event_store() as event_store:
+        repository = ESClientRepository(
+            event_store, snapshot_policies[Client], stream_batch_size, aggregate_caches[Client] if cached else None
+        )
+        yield repository
+    repository.cache_saved()
+
+
+def _command_executor(name: str) -> RetryingCommandExecutor:
+    return RetryingCommandExecutor(
+        name,
+        retry_on=(ConcurrencyException,),
+        max_attempts=int(os.environ.get('ACCOUNTS_COMMAND_MAX_ATTEMPTS', 5)),
+        base_delay=float(os.environ.get('ACCOUNTS_COMMAND_RETRY_BASE_DELAY', 0.01)),
+        max_delay=float(os.environ.get('ACCOUNTS_COMMAND_RETRY_MAX_DELAY', 0.5)),
+        budget=RetryBudget(float(os.environ.get('ACCOUNTS_COMMAND_RETRY_BUDGET_RATIO', 0.2)))
+    )
+
+
+# Commands that conflict with a concurrent change of the same account are run again from loading the account
+account_command_executor = _command_executor('account')
+# Only the client actors retry, a kept client that another writer changed is reloaded before the command runs again
+client_command_executor = _command_executor('client')
+
+
+# Disabled unless `ACCOUNTS_COMMAND_COALESCE_WINDOW_MS` is set, it delays every command by up to the window
+account_command_coalescer: Optional[CommandCoalescer] = CommandCoalescer(
+    'account',
+    get_account_write_repo,
+    window=float(os.environ['ACCOUNTS_COMMAND_COALESCE_WINDOW_MS']) / 1000,
+    max_batch_size=int(os.environ.get('ACCOUNTS_COMMAND_COALESCE_MAX_BATCH', 100)),
+    executor=account_command_executor
+) if float(os.environ.get('ACCOUNTS_COMMAND_COALESCE_WINDOW_MS', 0)) else None
+
+
+def _actor_system(name: str, open_repository: Callable[[], Any],
+                  executor: Optional[RetryingCommandExecutor] = None) -> Optional[ActorSystem[Any]]:
+    workers = int(os.environ.get('ACCOUNTS_ACTOR_WORKERS', 0))
+    if not workers:
+        return None
+    return ActorSystem(
+        name,
+        open_repository,
+        workers=workers,
+        max_actors=int(os.environ.get('ACCOUNTS_ACTOR_MAX_ACTORS', 10000)),
+        max_bytes=int(os.environ['ACCOUNTS_ACTOR_MAX_BYTES']) if os.environ.get('ACCOUNTS_ACTOR_MAX_BYTES') else None,
+        executor=executor,
+        process_index=int(os.environ.get('ACCOUNTS_ACTOR_PROCESS_INDEX', 0)),
+        process_count=int(os.environ.get('ACCOUNTS_ACTOR_PROCESS_COUNT', 1))
+    )
+
+
+# Disabled unless `ACCOUNTS_ACTOR_WORKERS` is set, requests must then be routed to the process that owns
+# the aggregate by `ACCOUNTS_ACTOR_PROCESS_INDEX` out of `ACCOUNTS_ACTOR_PROCESS_COUNT`
+account_actors: Optional[ActorSystem[Any]] = _actor_system(
+    'account', lambda: get_account_write_repo(cached=False), account_command_executor
+)
+client_actors: Optional[ActorSystem[Any]] = _actor_system(
+    'client', lambda: get_client_write_repo(cached=False), client_command_executor
+)
+
+
+# Rebuild the result of a use case out of the events its operation committed, to answer a command that is
+# performed again with the result of the first time, use cases that are not here reject it with `OperationDuplicate`
+committed_results: Dict[Callable[..., Any], Callable[[List[BaseEvent]], Any]] = {
+    credit_account: lambda events: None,
+    debit_account: lambda events: None,
+    add_account_to_client: lambda events: UniqueID(events[0].account_id),  # type: ignore
+    add_accounts_to_client: lambda events: [UniqueID(event.account_id) for event in events]  # type: ignore
+}
+
+
+def committed_operation_events(aggregate_id: UniqueID, operation_id: UniqueID) -> Optional[List[BaseEvent]]:
+    """
+    The events the operation committed to the aggregate, by one lookup in the `operations` table.
+    Always `None` when the table is not filled, looking through the stream would load the aggregate anyway.
+    """
+    if not index_operations or segment_store_directory:
+        return None
+    with get_event_store() as event_store:
+        return event_store.operation_events(aggregate_id, str(operation_id))
+
+
+def _execute_once(command: Callable[..., T], operation_id: UniqueID, aggregate_id: UniqueID,
+                  execute: Callable[[], T]) -> T:
+    events = committed_operation_events(aggregate_id, operation_id)
+    if events is None:
+        try:
+            return execute()
+        except OperationDuplicate:
+            # Committed by a concurrent command with the same operation after the lookup above
+            events = committed_operation_events(aggregate_id, operation_id)
+            if events is None:
+                raise
+    if command not in committed_results:
+        raise OperationDuplicate()
+    metrics.increment('commands.answered_committed')
+    return committed_results[command](events)
+
+
+def execute_account_command(command: Callable[..., T], operation_id: UniqueID, account_id: UniqueID,
+                            *args: Any) -> T:
+    """
+    Run an account use case in a repository of its own, every retry opens a new one.
+    In the actor mode the use case runs in the mailbox of the account when this process owns it,
+    otherwise when coalescing is enabled, it runs in a batch with the commands of the same account.
+    An operation the account already committed is answered from the `operations` table without running it.
+    """
+    def execute() -> T:
+        if account_actors and account_actors.owns(account_id):
+            return account_actors.execute(
+                account_id, lambda account_repo: command(operation_id, account_id, account_repo, *args)
+            )
+        if account_command_coalescer:
+            return account_command_coalescer.execute(
+                account_id, operation_id, lambda account_repo: command(operation_id, account_id, account_repo, *args)
+            )
+
+        def run() -> T:
+            with get_account_write_repo() as account_repo:
+                return command(operation_id, account_id, account_repo, *args)
+        return account_command_executor.execute(run)
+    return _execute_once(command, operation_id, account_id, execute)
+
+
+def execute_client_command(command: Callable[..., T], operation_id: UniqueID, client_id: UniqueID,
+                           *args: Any) -> T:
+    """
+    Run a client use case in the mailbox of the client in the actor mode, otherwise in a repository of its own.
+    An operation the client already committed is answered from the `operations` table without running it.
+    """
+    def execute() -> T:
+        if client_actors and client_actors.owns(client_id):
+            return client_actors.execute(
+                client_id, lambda client_repo: command(operation_id, client_id, client_repo, *args)
+            )
+        with get_client_write_repo() as client_repo:
+            return command(operation_id, client_id, client_repo, *args)
+    return _execute_once(command, operation_id, client_id, execute)
 
 
 event_manager = PyDispatcherEventManager()
 
 
-def start_event_consuming():
-    start_kafka_consumer(event_manager.publish, os.environ['ACCOUNTS_KAFKA_CONN_STRING'], os.environ['ACCOUNTS_KAFKA_CDC_TOPIC'], os.environ['ACCOUNTS_KAFKA_CONSUMER_GROUP_ID'])
+def start_event_consuming() -> None:
+    start_kafka_consumer(event_manager.publish, os.environ['ACCOUNTS_KAFKA_CONN_STRING'],
+                         os.environ['ACCOUNTS_KAFKA_CDC_TOPIC'], os.environ['ACCOUNTS_KAFKA_CONSUMER_GROUP_ID'])
+
+
+def backfill_snapshots(batch_size: int = 500) -> Dict[str, int]:
+    """
+    Build snapshots for the existing streams, every batch of aggregates is committed on its own.
+    """
+    repositories: Dict[Type[BaseEvent], Type[EventSourcedRepository[Any]]] = {
+        AccountCreated: ESAccountRepository,
+        ClientCreated: ESClientRepository
+    }
+    taken: Dict[str, int] = {}
+    for created_event, repository_class in repositories.items():
+        with get_event_store() as event_store:
+            aggregate_ids: List[UniqueID] = list(event_store.stream_ids(created_event))
+        aggregate_class = repository_class.aggregate_class
+        taken[aggregate_class.__name__] = 0
+        for start in range(0, len(aggregate_ids), batch_size):
+            with get_event_store() as event_store:
+                repository = repository_class(event_store, snapshot_policies[aggregate_class])
+                taken[aggregate_class.__name__] += repository.backfill_snapshots(
+                    aggregate_ids[start:start + batch_size]
+                )
+    return taken
+
+
+def migrate_events_table() -> List[str]:
+    """
+    Add the missing columns of the `events` table of the postgres database, or of every shard, every database
+    in its own transaction. Returns the added columns.
+    """
+    added: List[str] = []
+    for url in database_urls():
+        with sql_session_scope(url) as session:
+            added += migrate_events(session)
+    return added
+
+
+def upcast_events(batch_size: int = 1000) -> int:
+    """
+    Rewrite the events in postgres that are upcasted on read, every batch of events is committed on its own.
+    Returns the amount of events rewritten.
+    """
+    rewritten = 0
+    for url in database_urls():
+        position = 0
+        while True:
+            with sql_session_scope(url) as session:
+                event_store = postgres_event_store(session)
+                last_position, batch_rewritten = event_store.rewrite_upcasted_events(position, batch_size)
+            rewritten += batch_rewritten
+            if last_position == position:
+                break
+            position = last_position
+    return rewritten
+
+
+def backfill_operations(batch_size: int = 1000) -> int:
+    """
+    Index the operations of the events in postgres that are not in the `operations` table, every batch of events
+    is committed on its own. Returns the amount of operations indexed.
+    """
+    indexed = 0
+    for url in database_urls():
+        position = 0
+        while True:
+            with sql_session_scope(url) as session:
+                event_store = postgres_event_store(session)
+                last_position, batch_indexed = event_store.backfill_operations(position, batch_size)
+            indexed += batch_indexed
+            if last_position == position:
+                break
+            position = last_position
+    return indexed
+
+
+def migrate_uuid_columns() -> List[str]:
+    """
+    Convert the id columns of the postgres database, or of every shard, to the `UUID` type, every database in its
+    own transaction. Returns the converted columns.
+    """
+    converted: List[str] = []
+    for url in database_urls():
+        with sql_session_scope(url) as session:
+            converted += migrate_columns(session)
+    return converted
+
+
+def rebalance_shards(previous_shards: Dict[str, str]) -> int:
+    """
+    Move the streams that are in another shard by the shard map of `ACCOUNTS_SHARDS` than by `previous_shards`,
+    the shard map they were saved with. Urls of the previous shards may be left empty when they are in the current
+    shard map. Every stream is committed to its new shard before it is deleted from its previous one, so
+    running it again after it was stopped completes the moves. Nothing may write to the streams while they move.
+    Returns the amount of streams moved, streams that an earlier run already moved are not counted.
+    """
+    if not shard_ring:
+        raise ValueError('ACCOUNTS_SHARDS is not set')
+    previous_urls = {name: url or shard_urls[name] for name, url in previous_shards.items()}
+    previous_ring = HashRing(list(previous_urls), shard_virtual_nodes)
+    moved = 0
+    for created_event in (AccountCreated, ClientCreated):
+        for name, url in previous_urls.items():
+            # A shard of both maps also has the streams moved into it, only the ones it had before are moved out
+            with sql_session_scope(url) as session:
+                aggregate_ids = [
+                    aggregate_id for aggregate_id in PostgresEventStore(session).stream_ids(created_event)
+                    if previous_ring.shard(aggregate_id) == name
+                ]
+            for aggregate_id, source, target in moved_streams(aggregate_ids, previous_ring, shard_ring):
+                with sql_session_scope(previous_urls[source]) as source_session:
+                    source_store = postgres_event_store(source_session)
+                    with sql_session_scope(shard_urls[target]) as target_session:
+                        target_store = postgres_event_store(target_session)
+                        try:
+                            copy_stream(aggregate_id, source_store, target_store)
+                        except NotFoundException:
+                            # Deleted from its previous shard after the copy, raises when it's in neither
+                            target_store.load_stream(aggregate_id, from_version=1)
+                            continue
+                    source_store.delete_stream(aggregate_id)
+                moved += 1
+    return moved
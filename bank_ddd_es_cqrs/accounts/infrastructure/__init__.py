@@ -1,4 +1,9 @@
 from .repos import ESAccountRepository, ESClientRepository
 from .sql import *
+from .memory import InMemoryEventStore
+from .segment import SegmentEventStore
+from .sharded import ShardedEventStore, HashRing
+from .registry import EventTypeRegistry, event_types
+from .codecs import EventCodec, JsonEventCodec, StructEventCodec, EventSerializer
 from .event_manager import PyDispatcherEventManager
 from .kafka import start_kafka_consumer
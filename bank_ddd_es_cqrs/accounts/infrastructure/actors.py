@@ -0,0 +1,155 @@
+import queue
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, ContextManager, Optional, Any, List, Tuple, Generic, TypeVar
+from bank_ddd_es_cqrs.shared.metrics import metrics
+from bank_ddd_es_cqrs.shared.model import AggregateRoot, UniqueID
+from bank_ddd_es_cqrs.shared.model.repo import WriteRepository, SingleAggregateRepository
+from bank_ddd_es_cqrs.shared.retry import RetryingCommandExecutor
+from .cache import estimate_size
+from .repos import EventSourcedRepository
+
+T = TypeVar('T', bound=AggregateRoot)
+
+Command = Callable[[WriteRepository[Any]], Any]
+
+
+def aggregate_hash(aggregate_id: UniqueID) -> int:
+    """
+    Same for an aggregate in every process, unlike `hash` of a string.
+    """
+    return zlib.crc32(str(aggregate_id).encode('utf-8'))
+
+
+class _Worker(Generic[T]):
+    def __init__(self, system: 'ActorSystem[T]', index: int) -> None:
+        self.system = system
+        self.mailbox: 'queue.Queue[Optional[Tuple[UniqueID, Command, Future[Any]]]]' = queue.Queue()
+        # Hydrated aggregates and their estimated size, the least recently used first
+        self.actors: 'OrderedDict[str, Tuple[T, int]]' = OrderedDict()
+        self.bytes = 0
+        self.thread = threading.Thread(target=self.run, name=f'{system.name}-actors-{index}', daemon=True)
+
+    def run(self) -> None:
+        while True:
+            message = self.mailbox.get()
+            if message is None:
+                return
+            aggregate_id, command, future = message
+            try:
+                future.set_result(self.handle(aggregate_id, command))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def handle(self, aggregate_id: UniqueID, command: Command) -> Any:
+        if self.system.executor:
+            return self.system.executor.execute(lambda: self.handle_once(aggregate_id, command))
+        return self.handle_once(aggregate_id, command)
+
+    def handle_once(self, aggregate_id: UniqueID, command: Command) -> Any:
+        key = str(aggregate_id)
+        # Taken out while the command runs, it is put back only when its changes are saved, so a failed
+        # command or save leaves the aggregate to be loaded again from the event store
+        aggregate_root = self.take(key)
+        with self.system.open_repository() as repository:
+            if aggregate_root is None:
+                aggregate_root = repository.get_by_id(aggregate_id)
+                self.system.hydrations += 1
+            elif isinstance(repository, EventSourcedRepository):
+                repository.attach(aggregate_id, aggregate_root)
+            result = command(SingleAggregateRepository(aggregate_id, aggregate_root))
+            if aggregate_root.uncommitted_changes:
+                repository.save(aggregate_root)
+        self.keep(key, aggregate_root)
+        return result
+
+    def take(self, key: str) -> Optional[T]:
+        entry = self.actors.pop(key, None)
+        if entry is None:
+            return None
+        self.bytes -= entry[1]
+        return entry[0]
+
+    def keep(self, key: str, aggregate_root: T) -> None:
+        size = estimate_size(aggregate_root)
+        self.actors[key] = (aggregate_root, size)
+        self.bytes += size
+        while len(self.actors) > 1 and (
+                len(self.actors) > self.system.max_actors_per_worker or
+                self.system.max_bytes_per_worker is not None and self.bytes > self.system.max_bytes_per_worker):
+            _, (_, evicted_size) = self.actors.popitem(last=False)
+            self.bytes -= evicted_size
+            self.system.passivations += 1
+
+
+class ActorSystem(Generic[T]):
+    """
+    Runs the commands of every aggregate one after the other in a worker thread that owns the aggregate, and
+    keeps the aggregates hydrated in memory between their commands, so they are not loaded again and the
+    commands of an aggregate never conflict with each other.
+
+    When several processes run the system, every process owns the aggregates that `owns` says it does and the
+    commands must be routed to their owner, commands of aggregates that are not owned are not to be sent here.
+    An aggregate that was changed by another writer still fails to save, it is then loaded again and the
+    command retried by `executor`.
+
+    Idle aggregates are passivated, dropped from memory, the least recently used first, when a worker holds more
+    than its share of `max_actors` or of `max_bytes` by `estimate_size`.
+    """
+
+    def __init__(self, name: str, open_repository: Callable[[], ContextManager[WriteRepository[Any]]],
+                 workers: int = 4, max_actors: int = 10000, max_bytes: Optional[int] = None,
+                 executor: Optional[RetryingCommandExecutor] = None, process_index: int = 0,
+                 process_count: int = 1) -> None:
+        """
+        :param open_repository: opens the repository aggregates are loaded from and saved to, it commits on exit.
+        :param process_index: index of this process out of the `process_count` processes that own aggregates.
+        """
+        if workers < 1 or max_actors < workers:
+            raise ValueError('An actor system needs at least one worker and one actor per worker')
+        if not 0 <= process_index < process_count:
+            raise ValueError(f'Process index {process_index} is not one of {process_count} processes')
+        self.name = name
+        self.open_repository = open_repository
+        self.max_actors_per_worker = max_actors // workers
+        self.max_bytes_per_worker = max_bytes // workers if max_bytes is not None else None
+        self.executor = executor
+        self.process_index = process_index
+        self.process_count = process_count
+        self.hydrations = 0
+        self.passivations = 0
+        self._workers: List[_Worker[T]] = [_Worker(self, index) for index in range(workers)]
+        for worker in self._workers:
+            worker.thread.start()
+        metrics.register_gauge(f'actors.{name}.active', lambda: sum(len(w.actors) for w in self._workers))
+        metrics.register_gauge(f'actors.{name}.bytes', lambda: sum(w.bytes for w in self._workers))
+        metrics.register_gauge(f'actors.{name}.mailbox', lambda: sum(w.mailbox.qsize() for w in self._workers))
+        metrics.register_gauge(f'actors.{name}.hydrations', lambda: self.hydrations)
+        metrics.register_gauge(f'actors.{name}.passivations', lambda: self.passivations)
+
+    def owns(self, aggregate_id: UniqueID) -> bool:
+        return aggregate_hash(aggregate_id) % self.process_count == self.process_index
+
+    def send(self, aggregate_id: UniqueID, command: Command) -> 'Future[Any]':
+        """
+        Put `command` in the mailbox of the aggregate, the future has what the command returns or raises.
+        """
+        future: 'Future[Any]' = Future()
+        # Divided by the amount of processes first, all the aggregates of this process have the same remainder
+        worker = self._workers[aggregate_hash(aggregate_id) // self.process_count % len(self._workers)]
+        worker.mailbox.put((aggregate_id, command, future))
+        return future
+
+    def execute(self, aggregate_id: UniqueID, command: Command) -> Any:
+        return self.send(aggregate_id, command).result()
+
+    def close(self) -> None:
+        """
+        Stop the workers once they are done with the commands already in their mailboxes.
+        """
+        for worker in self._workers:
+            worker.mailbox.put(None)
+        for worker in self._workers:
+            worker.thread.join()
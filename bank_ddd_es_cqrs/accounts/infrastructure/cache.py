@@ -0,0 +1,114 @@
+import sys
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Generic, TypeVar, Optional, Any, Set, Tuple, List
+from bank_ddd_es_cqrs.shared.model import AggregateRoot, UniqueID
+from bank_ddd_es_cqrs.shared.metrics import metrics
+
+T = TypeVar('T', bound=AggregateRoot)
+
+
+# Containers larger than this are estimated out of their first items, so estimating
+# the size of an aggregate doesn't take longer as its operations pile up
+SAMPLED_ITEMS = 32
+
+
+def estimate_size(value: Any, seen: Optional[Set[int]] = None) -> int:
+    """
+    Rough amount of bytes held by `value`, the objects and containers it references are counted once each.
+    """
+    seen = seen if seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, dict):
+        items = [item for pair in islice(value.items(), SAMPLED_ITEMS) for item in pair]
+        return size + _estimate_items(items, len(value) * 2, seen)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + _estimate_items(list(islice(value, SAMPLED_ITEMS)), len(value), seen)
+    if hasattr(value, '__dict__'):
+        size += estimate_size(vars(value), seen)
+    for cls in type(value).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if hasattr(value, slot):
+                size += estimate_size(getattr(value, slot), seen)
+    return size
+
+
+def _estimate_items(sample: List[Any], count: int, seen: Set[int]) -> int:
+    if not sample:
+        return 0
+    return sum(estimate_size(item, seen) for item in sample) * count // len(sample)
+
+
+class AggregateCache(Generic[T]):
+    """
+    Hydrated aggregates of one type, the least recently used ones are evicted when there are more than
+    `max_entries` of them or they take more than `max_bytes` by `estimate_size`.
+
+    An aggregate is taken out of the cache by the command that uses it, so two commands never share one,
+    and it is put back once its changes are committed.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1000, max_bytes: Optional[int] = None) -> None:
+        if max_entries < 1:
+            raise ValueError('An aggregate cache must hold at least one aggregate')
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[T, int]]' = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        metrics.register_gauge(f'cache.{name}.hits', lambda: self.hits)
+        metrics.register_gauge(f'cache.{name}.misses', lambda: self.misses)
+        metrics.register_gauge(f'cache.{name}.evictions', lambda: self.evictions)
+        metrics.register_gauge(f'cache.{name}.entries', lambda: len(self))
+        metrics.register_gauge(f'cache.{name}.bytes', lambda: self.bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def take(self, aggregate_id: UniqueID) -> Optional[T]:
+        with self._lock:
+            entry = self._entries.pop(str(aggregate_id), None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            aggregate_root, size = entry
+            self._bytes -= size
+            return aggregate_root
+
+    def put(self, aggregate_id: UniqueID, aggregate_root: T) -> None:
+        size = estimate_size(aggregate_root)
+        with self._lock:
+            previous = self._entries.pop(str(aggregate_id), None)
+            if previous:
+                self._bytes -= previous[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.evictions += 1
+                return
+            self._entries[str(aggregate_id)] = (aggregate_root, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def discard(self, aggregate_id: UniqueID) -> None:
+        with self._lock:
+            entry = self._entries.pop(str(aggregate_id), None)
+            if entry:
+                self._bytes -= entry[1]
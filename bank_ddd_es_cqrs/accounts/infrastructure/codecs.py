@@ -0,0 +1,124 @@
+import json
+import struct
+from abc import ABC, abstractmethod
+from typing import Dict, Type, Optional, Tuple, Union
+from attr import asdict
+from bank_ddd_es_cqrs.shared.model import BaseEvent
+from ..model import AccountCredited, AccountDebited
+from .registry import EventTypeRegistry, EventData, event_types
+
+Buffer = Union[bytes, memoryview]
+
+
+class EventCodec(ABC):
+    # Written as the first byte of every payload, tells which codec decodes it
+    codec_id: int
+
+    @abstractmethod
+    def encode(self, event: BaseEvent) -> Optional[bytes]:
+        """
+        Returns `None` when the event can't be encoded by this codec, it is then encoded as JSON.
+        """
+        pass
+
+    @abstractmethod
+    def decode(self, event_class: Type[BaseEvent], data: Buffer) -> EventData:
+        """
+        Returns the data of the event as it was encoded, the event is created out of it by the registry.
+        """
+        pass
+
+
+class JsonEventCodec(EventCodec):
+    codec_id = 0
+
+    def encode(self, event: BaseEvent) -> Optional[bytes]:
+        return json.dumps(asdict(event, recurse=False), separators=(',', ':')).encode('utf-8')
+
+    def decode(self, event_class: Type[BaseEvent], data: Buffer) -> EventData:
+        return json.loads(str(data, 'utf-8'))
+
+
+class StructEventCodec(EventCodec):
+    """
+    Fixed size records for the events that are saved the most, the ids are packed as the 16 bytes of their uuid.
+    Other events, and ids that are not in the canonical uuid format or numbers that don't fit, are left to JSON.
+    """
+    codec_id = 1
+
+    # operation id, version, dollars, cents, account id
+    MONEY_MOVED = struct.Struct('<16sIqh16s')
+    layouts: Dict[Type[BaseEvent], struct.Struct] = {
+        AccountCredited: MONEY_MOVED,
+        AccountDebited: MONEY_MOVED
+    }
+
+    def encode(self, event: BaseEvent) -> Optional[bytes]:
+        layout = self.layouts.get(type(event))
+        if layout is None:
+            return None
+        try:
+            return layout.pack(
+                self._uuid_bytes(event.operation_id), event.version, event.dollars, event.cents,  # type: ignore
+                self._uuid_bytes(event.account_id)  # type: ignore
+            )
+        except (ValueError, TypeError, struct.error):
+            return None
+
+    def decode(self, event_class: Type[BaseEvent], data: Buffer) -> EventData:
+        operation_id, version, dollars, cents, account_id = self.layouts[event_class].unpack(data)
+        return {
+            'operation_id': self._uuid_string(operation_id),
+            'version': version,
+            'dollars': dollars,
+            'cents': cents,
+            'account_id': self._uuid_string(account_id)
+        }
+
+    # Packed and unpacked by hand, going through `uuid.UUID` takes longer than the whole JSON encoding
+    @staticmethod
+    def _uuid_bytes(value: str) -> bytes:
+        if len(value) != 36 or value[8] != '-' or value[13] != '-' or value[18] != '-' or value[23] != '-' or \
+                not value.islower() and not value.replace('-', '').isdigit():
+            raise ValueError(f'{value} is not a canonical uuid')
+        packed = bytes.fromhex(value[:8] + value[9:13] + value[14:18] + value[19:23] + value[24:])
+        if len(packed) != 16:
+            raise ValueError(f'{value} is not a canonical uuid')
+        return packed
+
+    @staticmethod
+    def _uuid_string(packed: bytes) -> str:
+        value = packed.hex()
+        return f'{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}'
+
+
+codecs: Dict[int, EventCodec] = {codec.codec_id: codec for codec in (JsonEventCodec(), StructEventCodec())}
+
+
+class EventSerializer:
+    """
+    Turns an event into the numeric id of its type and a payload, the first byte of the payload is the id of
+    the codec that encoded it, so payloads of every codec can be read whatever codec is used for writing.
+    """
+
+    def __init__(self, codec: Optional[EventCodec] = None, registry: EventTypeRegistry = event_types) -> None:
+        self.codec = codec or codecs[JsonEventCodec.codec_id]
+        self.registry = registry
+
+    def serialize(self, event: BaseEvent) -> Tuple[int, bytes]:
+        codec = self.codec
+        data = codec.encode(event)
+        if data is None:
+            codec = codecs[JsonEventCodec.codec_id]
+            data = codec.encode(event)
+        return self.registry.type_id(type(event)), bytes((codec.codec_id,)) + data  # type: ignore
+
+    def deserialize(self, type_id: int, payload: Buffer) -> BaseEvent:
+        return self.registry.create(*self.deserialize_data(type_id, payload))
+
+    def deserialize_data(self, type_id: int, payload: Buffer) -> Tuple[str, EventData]:
+        """
+        Name of the event and its data as it was saved, before it is upcasted.
+        """
+        event_class = self.registry.event_class(type_id)
+        return event_class.__name__, codecs[payload[0]].decode(event_class, payload[1:])
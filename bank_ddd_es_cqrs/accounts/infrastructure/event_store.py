@@ -0,0 +1,95 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional, Iterator, Dict, Sequence, Type
+from bank_ddd_es_cqrs.shared.model import BaseEvent, EventStream, LazyEventStream, RecordedEvent, UniqueID, \
+    AppException, StatusCodes, Snapshot
+
+
+class ConcurrencyException(AppException):
+    def __init__(self, msg: str) -> None:
+        super(ConcurrencyException, self).__init__(msg, StatusCodes.CONFLICT_WITH_CURRENT_STATE.value)
+
+
+class NotFoundException(AppException):
+    def __init__(self, msg: str) -> None:
+        super(NotFoundException, self).__init__(msg, StatusCodes.NOT_FOUND.value)
+
+
+class EventStore(ABC):
+    @abstractmethod
+    def save_events(self, aggregate_id: UniqueID, events: List[BaseEvent],
+                    expected_version: Optional[int] = None) -> None:
+        pass
+
+    @abstractmethod
+    def load_stream(self, aggregate_id: UniqueID, from_version: Optional[int] = None,
+                    to_version: Optional[int] = None) -> EventStream:
+        """
+        Load the events of the stream with sequence numbers between `from_version` and `to_version` (both inclusive).
+        When no range is passed the latest snapshot of the aggregate is used, if there is one,
+        together with the events that came after it.
+        """
+        pass
+
+    def iter_stream(self, aggregate_id: UniqueID, batch_size: int = 1000) -> LazyEventStream:
+        """
+        Same as `load_stream` without a range, but the events are read in batches of `batch_size` while they
+        are iterated over, so long streams can be replayed in flat memory.
+        Stores that can't read in batches keep the default of loading the whole stream.
+        """
+        event_stream = self.load_stream(aggregate_id)
+        return LazyEventStream(iter(event_stream.events), event_stream.version, event_stream.snapshot)
+
+    @abstractmethod
+    def load_streams(self, aggregate_ids: Sequence[UniqueID]) -> Dict[UniqueID, EventStream]:
+        """
+        Load the streams of many aggregates at once, same as calling `load_stream` for each of them.
+        Raises `NotFoundException` with the ids that have no stream if there are any.
+        """
+        pass
+
+    @abstractmethod
+    def save_snapshot(self, aggregate_id: UniqueID, snapshot: Snapshot) -> None:
+        pass
+
+    def delete_stream(self, aggregate_id: UniqueID) -> None:
+        """
+        Remove the events and the snapshot of the aggregate, used to move a stream to another store.
+        Stores that are append only can't delete streams.
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not delete streams')
+
+    def has_operation(self, aggregate_id: UniqueID, operation_id: str) -> bool:
+        """
+        Whether an event of the aggregate was committed by the operation, asked by the aggregates that don't
+        remember all their operations. Stores without an index of the operations look through the stream.
+        """
+        events = self.load_stream(aggregate_id, from_version=1).events
+        return any(event.operation_id == operation_id for event in events)
+
+    def operation_events(self, aggregate_id: UniqueID, operation_id: str) -> Optional[List[BaseEvent]]:
+        """
+        The events of the aggregate committed by the operation, `None` when the operation was not committed,
+        so a command that is performed again can be answered without loading the aggregate.
+        Stores without an index of the operations look through the stream.
+        """
+        events = [
+            event for event in self.load_stream(aggregate_id, from_version=1).events
+            if event.operation_id == operation_id
+        ]
+        return events or None
+
+    @abstractmethod
+    def read_all(self, from_position: int = 0, batch_size: int = 1000) -> Iterator[List[RecordedEvent]]:
+        """
+        Events of all the streams, in batches of up to `batch_size`, ordered by their position, starting after
+        `from_position`. Passing the position of the last event handled resumes the feed where it stopped.
+        """
+        pass
+
+    @abstractmethod
+    def stream_ids(self, first_event: Type[BaseEvent]) -> Iterator[UniqueID]:
+        """
+        Ids of all the streams that contain an event of type `first_event`, meant to be used with the event that
+        creates an aggregate to find all the aggregates of a certain type.
+        """
+        pass
@@ -1,24 +1,34 @@
-from typing import Callable, Type
+from typing import Callable
+import base64
 import json
 from threading import Thread
 from kafka import KafkaConsumer
 from ...shared.model import BaseEvent
-from ..model import events as account_module_events
+from .codecs import EventSerializer
 
 
 class KafkaEventConsumer:
     def __init__(self, bootstrap_servers: str, topic: str, consumer_group_id: str):
         self.consumer = KafkaConsumer(topic, bootstrap_servers=bootstrap_servers, group_id=consumer_group_id)
+        self.serializer = EventSerializer()
 
     def _event_model_to_core(self, event_msg) -> BaseEvent:
-        class_name = event_msg['name']
-        kwargs = json.loads(event_msg['data'])
-        event_class: Type[BaseEvent] = getattr(account_module_events, class_name)
-        return event_class(**kwargs)
+        if event_msg.get('payload') is not None:
+            # Debezium sends `bytea` columns encoded in base64
+            return self.serializer.deserialize(event_msg['type_id'], base64.b64decode(event_msg['payload']))
+        return self.serializer.registry.create(event_msg['name'], json.loads(event_msg['data']))
 
     def read(self, trigger: Callable[[BaseEvent], None]):
         for kafka_msg in self.consumer:
-            event_data = json.loads(kafka_msg.value)['payload']['after']
+            # Deleting a row is followed by a tombstone without a value, for the compaction of the topic
+            if kafka_msg.value is None:
+                continue
+            change = json.loads(kafka_msg.value)['payload']
+            # Events are only updated when they are rewritten by the upcast migration, they were already handled,
+            # and only deleted when their stream is moved to another shard
+            if change.get('op') in ('u', 'd'):
+                continue
+            event_data = change['after']
             core_event = self._event_model_to_core(event_data)
             trigger(core_event)
 
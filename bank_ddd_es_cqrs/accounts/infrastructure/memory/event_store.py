@@ -0,0 +1,106 @@
+import threading
+from typing import List, Type, Optional, Iterator, Dict, Sequence, Tuple
+from bank_ddd_es_cqrs.shared.model import BaseEvent, EventStream, RecordedEvent, UniqueID, Snapshot
+from ..event_store import EventStore, ConcurrencyException, NotFoundException
+
+
+class InMemoryEventStore(EventStore):
+    """
+    Keeps the streams in append-only lists in the memory of the process, meant for tests and for measuring the
+    domain and the use cases without the overhead of a database.
+    Has the same optimistic concurrency semantics as `PostgresEventStore`, every method holds one lock, so
+    it can be shared between threads.
+    Events are immutable, so the lists hold the same event objects that were saved and that are loaded.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        self._streams: Dict[str, List[BaseEvent]] = {}
+        self._versions: Dict[str, int] = {}
+        self._snapshots: Dict[str, Snapshot] = {}
+        # Every event of every stream in the order they were saved, the position of an event is its index + 1
+        self._log: List[Optional[Tuple[str, int, BaseEvent]]] = []
+
+    def save_events(self, aggregate_id: UniqueID, events: List[BaseEvent],
+                    expected_version: Optional[int] = None) -> None:
+        key = str(aggregate_id)
+        with self._lock:
+            if expected_version and expected_version != -1:
+                if self._versions.get(key) != expected_version:
+                    raise ConcurrencyException(
+                        f'Found no aggregate with id {aggregate_id} and version {expected_version}'
+                    )
+                self._versions[key] = expected_version + len(events)
+            else:
+                if key in self._versions:
+                    raise ConcurrencyException(f'Aggregate with id {aggregate_id} already exists')
+                self._versions[key] = len(events)
+                self._streams[key] = []
+            stream = self._streams[key]
+            last_sequence = len(stream)
+            stream.extend(events)
+            self._log.extend((key, sequence, event) for sequence, event in enumerate(events, start=last_sequence + 1))
+
+    def load_stream(self, aggregate_id: UniqueID, from_version: Optional[int] = None,
+                    to_version: Optional[int] = None) -> EventStream:
+        key = str(aggregate_id)
+        with self._lock:
+            if key not in self._versions:
+                raise NotFoundException(f'No aggregate with id {aggregate_id}')
+            return self._event_stream(key, from_version, to_version)
+
+    def load_streams(self, aggregate_ids: Sequence[UniqueID]) -> Dict[UniqueID, EventStream]:
+        with self._lock:
+            missing = [str(aggregate_id) for aggregate_id in aggregate_ids if str(aggregate_id) not in self._versions]
+            if missing:
+                raise NotFoundException(f'No aggregates with ids {", ".join(missing)}')
+            return {aggregate_id: self._event_stream(str(aggregate_id)) for aggregate_id in aggregate_ids}
+
+    def _event_stream(self, key: str, from_version: Optional[int] = None,
+                      to_version: Optional[int] = None) -> EventStream:
+        snapshot = None
+        if from_version is None and to_version is None:
+            snapshot = self._snapshots.get(key)
+            if snapshot:
+                from_version = snapshot.stream_version + 1
+        # Sequences start at 1, the event with sequence n is at index n - 1
+        start = max(from_version - 1, 0) if from_version is not None else 0
+        end = max(to_version, 0) if to_version is not None else None
+        return EventStream(self._streams[key][start:end], self._versions[key], snapshot)
+
+    def save_snapshot(self, aggregate_id: UniqueID, snapshot: Snapshot) -> None:
+        with self._lock:
+            self._snapshots[str(aggregate_id)] = snapshot
+
+    def delete_stream(self, aggregate_id: UniqueID) -> None:
+        key = str(aggregate_id)
+        with self._lock:
+            if key not in self._versions:
+                raise NotFoundException(f'No aggregate with id {aggregate_id}')
+            del self._streams[key], self._versions[key]
+            self._snapshots.pop(key, None)
+            # Left in the log as gaps, so the positions of the other events stay the same
+            self._log = [entry if entry is not None and entry[0] != key else None for entry in self._log]
+
+    def read_all(self, from_position: int = 0, batch_size: int = 1000) -> Iterator[List[RecordedEvent]]:
+        while True:
+            with self._lock:
+                entries = self._log[from_position:from_position + batch_size]
+            if not entries:
+                return
+            batch = [
+                RecordedEvent(position, entry[0], entry[1], entry[2])
+                for position, entry in enumerate(entries, start=from_position + 1) if entry is not None
+            ]
+            if batch:
+                yield batch
+            if len(entries) < batch_size:
+                return
+            from_position += len(entries)
+
+    def stream_ids(self, first_event: Type[BaseEvent]) -> Iterator[UniqueID]:
+        with self._lock:
+            keys = [key for key, events in self._streams.items() if any(type(e) is first_event for e in events)]
+        for key in keys:
+            yield UniqueID(key)
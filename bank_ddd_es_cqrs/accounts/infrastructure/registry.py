@@ -0,0 +1,123 @@
+from types import MemberDescriptorType
+from typing import Dict, Type, Callable, Any, Tuple
+import attr
+from bank_ddd_es_cqrs.shared.model import BaseEvent
+from ..model import AccountCreated, AccountCredited, AccountDebited, AccountMaximumDebtChanged, TransactionCreated, \
+    TransactionCompleted, ClientCreated, AccountAddedToClient, AccountRemovedFromClient
+
+EventData = Dict[str, Any]
+Upcaster = Callable[[EventData], EventData]
+
+
+def compile_constructor(event_class: Type[BaseEvent]) -> Callable[[EventData], BaseEvent]:
+    """
+    Builds a function that creates an event of `event_class` out of its data by filling a new instance directly,
+    the whole `__dict__` at once and every slot through its descriptor, instead of unpacking the data as
+    keyword arguments into the `__init__` of attrs.
+    Classes with converters, validators or fields that are not in `__init__` keep using their `__init__`.
+    """
+    fields = attr.fields(event_class)
+    if any(field.converter or field.validator or not field.init for field in fields):
+        return lambda data: event_class(**data)
+    # Everything the function uses is bound to its default arguments, so it is looked up as a local
+    arguments: Dict[str, Any] = {'_new': object.__new__, '_class': event_class}
+    values = []
+    for index, field in enumerate(fields):
+        if field.default is attr.NOTHING:
+            values.append(f"data['{field.name}']")
+        elif isinstance(field.default, attr.Factory):  # type: ignore
+            arguments[f'_default_{index}'] = field.default.factory  # type: ignore
+            values.append(f"data['{field.name}'] if '{field.name}' in data else _default_{index}()")
+        else:
+            arguments[f'_default_{index}'] = field.default
+            values.append(f"data.get('{field.name}', _default_{index})")
+    slots = [
+        (index, field, value) for index, (field, value) in enumerate(zip(fields, values))
+        if isinstance(getattr(event_class, field.name, None), MemberDescriptorType)
+    ]
+    slot_names = {field.name for _, field, _ in slots}
+    in_dict = [(field, value) for field, value in zip(fields, values) if field.name not in slot_names]
+    body = []
+    if in_dict:
+        arguments['_set_dict'] = object.__setattr__
+        body += ['    _set_dict(event, "__dict__", {']
+        body += [f"        '{field.name}': {value}," for field, value in in_dict]
+        body += ['    })']
+    for index, field, value in slots:
+        arguments[f'_set_{index}'] = getattr(event_class, field.name).__set__
+        body.append(f'    _set_{index}(event, {value})')
+    source = '\n'.join([
+        f"def construct(data, {', '.join(f'{name}={name}' for name in arguments)}):",
+        '    event = _new(_class)',
+        *body,
+        '    return event'
+    ])
+    namespace: Dict[str, Any] = dict(arguments)
+    exec(source, namespace)
+    return namespace['construct']
+
+
+class EventTypeRegistry:
+    """
+    Numeric ids of the event types, an id is stored with every encoded event instead of the name of its class,
+    so ids must never be reused or changed once events were saved with them.
+
+    Also upcasts the data of events that were saved by an older version of their class, an upcaster takes the
+    data of version n of an event and returns the data of version n + 1. When adding an upcaster the default of
+    `version` of the event class must be raised to the new version.
+    """
+
+    def __init__(self) -> None:
+        self._classes: Dict[int, Type[BaseEvent]] = {}
+        self._ids: Dict[Type[BaseEvent], int] = {}
+        self._constructors: Dict[str, Callable[[EventData], BaseEvent]] = {}
+        self._upcasters: Dict[Tuple[str, int], Upcaster] = {}
+
+    def register(self, type_id: int, event_class: Type[BaseEvent]) -> None:
+        if type_id in self._classes or event_class in self._ids:
+            raise ValueError(f'Event type {event_class.__name__} or id {type_id} is already registered')
+        self._classes[type_id] = event_class
+        self._ids[event_class] = type_id
+        self._constructors[event_class.__name__] = compile_constructor(event_class)
+
+    def register_upcaster(self, name: str, version: int, upcaster: Upcaster) -> None:
+        if (name, version) in self._upcasters:
+            raise ValueError(f'Upcaster of {name} version {version} is already registered')
+        self._upcasters[(name, version)] = upcaster
+
+    def type_id(self, event_class: Type[BaseEvent]) -> int:
+        return self._ids[event_class]
+
+    def event_class(self, type_id: int) -> Type[BaseEvent]:
+        return self._classes[type_id]
+
+    def upcast(self, name: str, data: EventData) -> EventData:
+        """
+        Runs the chain of upcasters of the event from the version of `data`, returns `data` itself when
+        it is already of the latest version.
+        """
+        upcaster = self._upcasters.get((name, data.get('version', 1)))
+        while upcaster:
+            data = upcaster(data)
+            upcaster = self._upcasters.get((name, data.get('version', 1)))
+        return data
+
+    def create(self, name: str, data: EventData) -> BaseEvent:
+        if self._upcasters:
+            data = self.upcast(name, data)
+        return self._constructors[name](data)
+
+
+event_types = EventTypeRegistry()
+for _type_id, _event_class in enumerate([
+    AccountCreated,
+    AccountCredited,
+    AccountDebited,
+    AccountMaximumDebtChanged,
+    TransactionCreated,
+    TransactionCompleted,
+    ClientCreated,
+    AccountAddedToClient,
+    AccountRemovedFromClient
+], start=1):
+    event_types.register(_type_id, _event_class)
@@ -1,40 +1,120 @@
-from .sql import EventStore
-from bank_ddd_es_cqrs.shared.model import UniqueID
+from abc import abstractmethod
+from typing import Generic, TypeVar, Type, Optional, List, Sequence, Dict
+from .event_store import EventStore
+from .cache import AggregateCache
+from bank_ddd_es_cqrs.shared.model import UniqueID, AggregateRoot, SnapshotPolicy
 from ..model import AccountWriteRepository, ClientWriteRepository, Account, Client
 
+T = TypeVar('T', bound=AggregateRoot)
 
-class ESAccountRepository(AccountWriteRepository):
-    def __init__(self, event_store: EventStore):
+
+class EventSourcedRepository(Generic[T]):
+    aggregate_class: Type[T]
+
+    def __init__(self, event_store: EventStore, snapshot_policy: Optional[SnapshotPolicy] = None,
+                 stream_batch_size: Optional[int] = None, cache: Optional[AggregateCache[T]] = None):
+        """
+        :param stream_batch_size: when passed, aggregates are replayed while their events are read in batches
+            of this size instead of loading the whole stream first.
+        :param cache: when passed, aggregates are taken from it and only the events that came after them are
+            loaded. Saved aggregates are put in it by `cache_saved`, which is to be called once the changes
+            are committed.
+        """
         self._event_store = event_store
+        self._snapshot_policy = snapshot_policy
+        self._stream_batch_size = stream_batch_size
+        self._cache = cache
+        self._saved: Dict[str, T] = {}
+
+    @abstractmethod
+    def _aggregate_id(self, aggregate_root: T) -> UniqueID:
+        pass
 
-    def save(self, aggregate_root: Account) -> Account:
+    def save(self, aggregate_root: T) -> T:
+        previous_stream_version = aggregate_root.stream_version
         self._event_store.save_events(
-            aggregate_id=aggregate_root.account_id,
+            aggregate_id=self._aggregate_id(aggregate_root),
             events=aggregate_root.uncommitted_changes,
             expected_version=aggregate_root.version
         )
         aggregate_root.mark_changes_as_committed()
+        if self._snapshot_policy and \
+                self._snapshot_policy.should_snapshot(previous_stream_version, aggregate_root.stream_version):
+            self._event_store.save_snapshot(self._aggregate_id(aggregate_root), aggregate_root.snapshot())
+        if self._cache is not None:
+            self._saved[str(self._aggregate_id(aggregate_root))] = aggregate_root
         return aggregate_root
 
-    def get_by_id(self, aggregate_id: UniqueID) -> Account:
-        event_stream = self._event_store.load_stream(aggregate_id)
-        return Account(event_stream)
+    def cache_saved(self) -> None:
+        """
+        Put the aggregates saved through the repository in the cache, a transaction that is rolled back
+        must not call it, or the cache would hold changes the event store doesn't have.
+        """
+        if self._cache is not None:
+            for aggregate_id, aggregate_root in self._saved.items():
+                self._cache.put(UniqueID(aggregate_id), aggregate_root)
+        self._saved.clear()
 
-
-class ESClientRepository(ClientWriteRepository):
-    def __init__(self, event_store: EventStore):
-        self._event_store = event_store
-
-    def save(self, aggregate_root: Client) -> Client:
-        self._event_store.save_events(
-            aggregate_id=aggregate_root.client_id,
-            events=aggregate_root.uncommitted_changes,
-            expected_version=aggregate_root.version
+    def attach(self, aggregate_id: UniqueID, aggregate_root: T) -> T:
+        """
+        Let the aggregate look up the operations it doesn't remember in the event store of the repository,
+        aggregates that are kept between commands must be attached to the repository of every command.
+        """
+        event_store = self._event_store
+        aggregate_root.bind_operation_index(
+            lambda operation_id: event_store.has_operation(aggregate_id, operation_id)
         )
-        aggregate_root.mark_changes_as_committed()
         return aggregate_root
 
-    def get_by_id(self, aggregate_id: UniqueID) -> Client:
-        event_stream = self._event_store.load_stream(aggregate_id)
-        return Client(event_stream)
+    def get_by_id(self, aggregate_id: UniqueID) -> T:
+        if self._cache is not None:
+            aggregate_root = self._cache.take(aggregate_id)
+            if aggregate_root is not None:
+                event_stream = self._event_store.load_stream(
+                    aggregate_id, from_version=aggregate_root.stream_version + 1
+                )
+                # Events of other writers move the version by their amount, if that doesn't add up the cached
+                # copy is not the one the store has, it is dropped and the aggregate is loaded from scratch
+                if aggregate_root.version + len(event_stream.events) == event_stream.version:
+                    aggregate_root.catch_up(event_stream)
+                    return self.attach(aggregate_id, aggregate_root)
+        if self._stream_batch_size:
+            aggregate_root = self.aggregate_class(self._event_store.iter_stream(aggregate_id, self._stream_batch_size))
+        else:
+            aggregate_root = self.aggregate_class(self._event_store.load_stream(aggregate_id))
+        return self.attach(aggregate_id, aggregate_root)
+
+    def get_by_ids(self, aggregate_ids: Sequence[UniqueID]) -> List[T]:
+        event_streams = self._event_store.load_streams(aggregate_ids)
+        return [
+            self.attach(aggregate_id, self.aggregate_class(event_streams[aggregate_id]))
+            for aggregate_id in aggregate_ids
+        ]
+
+    def backfill_snapshots(self, aggregate_ids: Sequence[UniqueID]) -> int:
+        """
+        Snapshot every one of the given aggregates that is long enough by the snapshot policy.
+        Returns the amount of snapshots taken.
+        """
+        if not self._snapshot_policy:
+            return 0
+        taken = 0
+        for aggregate_id, aggregate_root in zip(aggregate_ids, self.get_by_ids(aggregate_ids)):
+            if aggregate_root.stream_version >= self._snapshot_policy.every:
+                self._event_store.save_snapshot(aggregate_id, aggregate_root.snapshot())
+                taken += 1
+        return taken
+
+
+class ESAccountRepository(EventSourcedRepository[Account], AccountWriteRepository):
+    aggregate_class = Account
+
+    def _aggregate_id(self, aggregate_root: Account) -> UniqueID:
+        return aggregate_root.account_id
+
+
+class ESClientRepository(EventSourcedRepository[Client], ClientWriteRepository):
+    aggregate_class = Client
 
+    def _aggregate_id(self, aggregate_root: Client) -> UniqueID:
+        return aggregate_root.client_id
@@ -0,0 +1,303 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import List, Type, Optional, Iterator, Dict, Sequence, Tuple, IO, Any
+from bank_ddd_es_cqrs.shared.model import BaseEvent, EventStream, RecordedEvent, UniqueID, Snapshot
+from ..event_store import EventStore, ConcurrencyException, NotFoundException
+from ..codecs import EventSerializer, StructEventCodec
+
+EVENT_RECORD = 0
+SNAPSHOT_RECORD = 1
+
+# Length of the body and crc32 of the body
+RECORD_HEADER = struct.Struct('<II')
+# Kind of the record, amount of records that follow it in the same batch, sequence of the event (stream version
+# for snapshots), length of the aggregate id and type id of the event, followed by the id and the payload.
+# Snapshots have no type id, their payload is JSON.
+BODY_HEADER = struct.Struct('<BIIBH')
+
+SEGMENT_FILE_NAME = 'segment-{:08d}.log'
+SEGMENT_FILE_PATTERN = re.compile(r'^segment-(\d{8})\.log$')
+
+ZERO_CHUNK_SIZE = 1024 * 1024
+
+
+class SegmentEventStore(EventStore):
+    """
+    Appends the events to segment files of a fixed size that are mapped to memory, and keeps the offsets of the
+    events of every aggregate in memory, so loading a stream reads its records straight from the mapped segments.
+
+    A record is written whole before the offsets are indexed, and every record says how many records of its
+    batch come after it. When opening the directory the segments are scanned to rebuild the index, and
+    anything after the last complete batch, like a record that was cut in the middle by a crash, is erased.
+    A batch that fails to be written is erased right away, so the next batch doesn't complete it.
+
+    Only one process may open a directory at a time.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, sync: bool = True,
+                 serializer: Optional[EventSerializer] = None) -> None:
+        """
+        :param segment_size: size in bytes of every segment file, a single record can't be larger than a segment.
+        :param sync: flush the written segments to disk before `save_events` and `save_snapshot` return.
+        :param serializer: encodes the events, by default with `StructEventCodec`.
+        """
+        super().__init__()
+        if segment_size < RECORD_HEADER.size + BODY_HEADER.size:
+            raise ValueError(f'Segment size must be at least {RECORD_HEADER.size + BODY_HEADER.size} bytes')
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync = sync
+        self.serializer = serializer or EventSerializer(StructEventCodec())
+        self._lock = threading.Lock()
+        self._files: List[IO[Any]] = []
+        self._segments: List[mmap.mmap] = []
+        self._views: List[memoryview] = []
+        # Offsets of the events of every aggregate, the event with sequence n is at index n - 1.
+        # An offset is global to the store: the number of the segment times the segment size plus the offset in it.
+        self._streams: Dict[str, 'array[int]'] = {}
+        self._snapshots: Dict[str, int] = {}
+        # Offsets of all the events in the order they were saved, the position of an event is its offset + 1
+        self._log = array('q')
+        self._end = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open_segments()
+        self._recover()
+
+    def close(self) -> None:
+        with self._lock:
+            for view in self._views:
+                view.release()
+            for segment in self._segments:
+                segment.close()
+            for segment_file in self._files:
+                segment_file.close()
+            self._views, self._segments, self._files = [], [], []
+
+    def _open_segments(self) -> None:
+        numbers = sorted(
+            int(match.group(1)) for match in map(SEGMENT_FILE_PATTERN.match, os.listdir(self.directory)) if match
+        )
+        if numbers != list(range(len(numbers))):
+            raise ValueError(f'Segments are missing in {self.directory}, found {numbers}')
+        for number in numbers:
+            self._open_segment(number, create=False)
+
+    def _open_segment(self, number: int, create: bool) -> None:
+        path = os.path.join(self.directory, SEGMENT_FILE_NAME.format(number))
+        segment_file = open(path, 'w+b' if create else 'r+b')
+        if create:
+            segment_file.truncate(self.segment_size)
+        elif os.fstat(segment_file.fileno()).st_size != self.segment_size:
+            segment_file.close()
+            raise ValueError(f'Segment {path} is not {self.segment_size} bytes long')
+        segment = mmap.mmap(segment_file.fileno(), self.segment_size)
+        self._files.append(segment_file)
+        self._segments.append(segment)
+        self._views.append(memoryview(segment))  # type: ignore
+
+    def _recover(self) -> None:
+        committed = 0
+        pending: List[Tuple[int, str, int]] = []
+        torn = False
+        offset = 0
+        while True:
+            number, local = divmod(offset, self.segment_size)
+            if number >= len(self._segments):
+                break
+            view = self._views[number]
+            if local + RECORD_HEADER.size > self.segment_size:
+                offset = (number + 1) * self.segment_size
+                continue
+            length, crc = RECORD_HEADER.unpack_from(view, local)
+            if length == 0 and crc == 0:
+                # Nothing was written in the rest of the segment, the record that followed didn't fit in it
+                offset = (number + 1) * self.segment_size
+                continue
+            body = local + RECORD_HEADER.size
+            if length < BODY_HEADER.size or body + length > self.segment_size or \
+                    zlib.crc32(view[body:body + length]) != crc:
+                torn = True
+                break
+            kind, remaining, _, key_length, _ = BODY_HEADER.unpack_from(view, body)
+            key_start = body + BODY_HEADER.size
+            pending.append((kind, str(view[key_start:key_start + key_length], 'utf-8'), offset))
+            offset += RECORD_HEADER.size + length
+            if remaining == 0:
+                for record_kind, key, record_offset in pending:
+                    self._index(record_kind, key, record_offset)
+                pending = []
+                committed = offset
+        self._end = committed
+        if torn or pending:
+            self._erase_from(committed)
+
+    def _erase_from(self, offset: int) -> None:
+        number, local = divmod(offset, self.segment_size)
+        while len(self._segments) > number + 1 or (local == 0 and len(self._segments) > number):
+            removed = len(self._segments) - 1
+            self._views.pop().release()
+            self._segments.pop().close()
+            self._files.pop().close()
+            os.remove(os.path.join(self.directory, SEGMENT_FILE_NAME.format(removed)))
+        if local == 0:
+            return
+        segment = self._segments[number]
+        for start in range(local, self.segment_size, ZERO_CHUNK_SIZE):
+            end = min(start + ZERO_CHUNK_SIZE, self.segment_size)
+            segment[start:end] = bytes(end - start)
+        segment.flush()
+
+    def _index(self, kind: int, key: str, offset: int) -> None:
+        if kind == SNAPSHOT_RECORD:
+            self._snapshots[key] = offset
+            return
+        self._streams.setdefault(key, array('q')).append(offset)
+        self._log.append(offset)
+
+    def _append(self, records: List[bytes]) -> List[int]:
+        for record in records:
+            if len(record) > self.segment_size:
+                raise ValueError(f'Record of {len(record)} bytes is larger than the segment size')
+        offsets = []
+        written = set()
+        start = self._end
+        try:
+            for record in records:
+                number, local = divmod(self._end, self.segment_size)
+                if local + len(record) > self.segment_size:
+                    number, local = number + 1, 0
+                    self._end = number * self.segment_size
+                if number == len(self._segments):
+                    self._open_segment(number, create=True)
+                self._segments[number][local:local + len(record)] = record
+                written.add(number)
+                offsets.append(self._end)
+                self._end += len(record)
+        except BaseException:
+            # The records of the batch that were written would be indexed with the next batch when recovering
+            self._erase_from(start)
+            self._end = start
+            raise
+        if self.sync:
+            for number in written:
+                self._segments[number].flush()
+        return offsets
+
+    @staticmethod
+    def _record(kind: int, remaining: int, sequence: int, key: str, type_id: int, payload: bytes) -> bytes:
+        key_bytes = key.encode('utf-8')
+        body = BODY_HEADER.pack(kind, remaining, sequence, len(key_bytes), type_id) + key_bytes + payload
+        return RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+    def _read(self, offset: int) -> Tuple[int, str, int, memoryview]:
+        """
+        Sequence, aggregate id, type id and payload of the record at `offset`, the payload is a slice of the segment
+        """
+        number, local = divmod(offset, self.segment_size)
+        view = self._views[number]
+        length, _ = RECORD_HEADER.unpack_from(view, local)
+        body = local + RECORD_HEADER.size
+        _, _, sequence, key_length, type_id = BODY_HEADER.unpack_from(view, body)
+        key_start = body + BODY_HEADER.size
+        payload_start = key_start + key_length
+        return sequence, str(view[key_start:payload_start], 'utf-8'), type_id, view[payload_start:body + length]
+
+    def _type_id(self, offset: int) -> int:
+        number, local = divmod(offset, self.segment_size)
+        return BODY_HEADER.unpack_from(self._views[number], local + RECORD_HEADER.size)[4]
+
+    def _read_event(self, offset: int) -> BaseEvent:
+        _, _, type_id, payload = self._read(offset)
+        return self.serializer.deserialize(type_id, payload)
+
+    def save_events(self, aggregate_id: UniqueID, events: List[BaseEvent],
+                    expected_version: Optional[int] = None) -> None:
+        key = str(aggregate_id)
+        with self._lock:
+            stream = self._streams.get(key)
+            if expected_version and expected_version != -1:
+                if stream is None or len(stream) != expected_version:
+                    raise ConcurrencyException(
+                        f'Found no aggregate with id {aggregate_id} and version {expected_version}'
+                    )
+            elif stream is not None:
+                raise ConcurrencyException(f'Aggregate with id {aggregate_id} already exists')
+            last_sequence = len(stream) if stream is not None else 0
+            records = [
+                self._record(
+                    EVENT_RECORD, len(events) - index - 1, last_sequence + index + 1, key,
+                    *self.serializer.serialize(event)
+                )
+                for index, event in enumerate(events)
+            ]
+            offsets = self._append(records)
+            if stream is None:
+                stream = self._streams[key] = array('q')
+            stream.extend(offsets)
+            self._log.extend(offsets)
+
+    def load_stream(self, aggregate_id: UniqueID, from_version: Optional[int] = None,
+                    to_version: Optional[int] = None) -> EventStream:
+        key = str(aggregate_id)
+        with self._lock:
+            if key not in self._streams:
+                raise NotFoundException(f'No aggregate with id {aggregate_id}')
+            return self._event_stream(key, from_version, to_version)
+
+    def load_streams(self, aggregate_ids: Sequence[UniqueID]) -> Dict[UniqueID, EventStream]:
+        with self._lock:
+            missing = [str(aggregate_id) for aggregate_id in aggregate_ids if str(aggregate_id) not in self._streams]
+            if missing:
+                raise NotFoundException(f'No aggregates with ids {", ".join(missing)}')
+            return {aggregate_id: self._event_stream(str(aggregate_id)) for aggregate_id in aggregate_ids}
+
+    def _event_stream(self, key: str, from_version: Optional[int] = None,
+                      to_version: Optional[int] = None) -> EventStream:
+        snapshot = None
+        if from_version is None and to_version is None and key in self._snapshots:
+            stream_version, _, _, state = self._read(self._snapshots[key])
+            snapshot = Snapshot(json.loads(str(state, 'utf-8')), stream_version)
+            from_version = stream_version + 1
+        stream = self._streams[key]
+        start = max(from_version - 1, 0) if from_version is not None else 0
+        end = max(to_version, 0) if to_version is not None else None
+        return EventStream([self._read_event(offset) for offset in stream[start:end]], len(stream), snapshot)
+
+    def save_snapshot(self, aggregate_id: UniqueID, snapshot: Snapshot) -> None:
+        key = str(aggregate_id)
+        with self._lock:
+            state = json.dumps(snapshot.state).encode('utf-8')
+            offset, = self._append([self._record(SNAPSHOT_RECORD, 0, snapshot.stream_version, key, 0, state)])
+            self._snapshots[key] = offset
+
+    def read_all(self, from_position: int = 0, batch_size: int = 1000) -> Iterator[List[RecordedEvent]]:
+        while True:
+            with self._lock:
+                start = bisect_left(self._log, from_position)
+                batch = []
+                for offset in self._log[start:start + batch_size]:
+                    sequence, aggregate_uuid, type_id, payload = self._read(offset)
+                    batch.append(RecordedEvent(
+                        offset + 1, aggregate_uuid, sequence, self.serializer.deserialize(type_id, payload)
+                    ))
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            from_position = batch[-1].position
+
+    def stream_ids(self, first_event: Type[BaseEvent]) -> Iterator[UniqueID]:
+        type_id = self.serializer.registry.type_id(first_event)
+        with self._lock:
+            # The event that creates an aggregate is the first of its stream, only that record is read
+            keys = [key for key, stream in self._streams.items() if self._type_id(stream[0]) == type_id]
+        for key in keys:
+            yield UniqueID(key)
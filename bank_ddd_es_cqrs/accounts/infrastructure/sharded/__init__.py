@@ -0,0 +1 @@
+from .event_store import ShardedEventStore, HashRing
@@ -0,0 +1,179 @@
+import hashlib
+import heapq
+from bisect import bisect
+from itertools import chain
+from typing import List, Type, Optional, Iterator, Dict, Sequence, Tuple, Mapping
+from bank_ddd_es_cqrs.shared.model import BaseEvent, EventStream, LazyEventStream, RecordedEvent, UniqueID, Snapshot
+from ..event_store import EventStore, NotFoundException
+
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hashing of aggregate ids to shard names, every shard is placed on the ring `virtual_nodes` times.
+    Adding or removing a shard only moves the aggregates that hash next to its points, about 1 / n of them.
+    """
+
+    def __init__(self, shards: Sequence[str], virtual_nodes: int = 100) -> None:
+        if not shards:
+            raise ValueError('A hash ring needs at least one shard')
+        if len(set(shards)) != len(shards):
+            raise ValueError(f'Shard names must be unique, got {", ".join(shards)}')
+        self.shards = list(shards)
+        points = sorted(
+            (_ring_hash(f'{shard}#{node}'), shard) for shard in self.shards for node in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard(self, aggregate_id: UniqueID) -> str:
+        index = bisect(self._hashes, _ring_hash(str(aggregate_id)))
+        return self._shards[index % len(self._shards)]
+
+
+class ShardedEventStore(EventStore):
+    """
+    Routes the stream of every aggregate to one of the stores by consistent hashing of its id, the streams of
+    all the aggregates together are read from every store.
+
+    `read_all` merges the stores by positions that are the position in the store times the amount of stores plus
+    the index of the store, so a position tells which store an event came from. Stores append at different
+    rates, an event of one store can show up behind a position that was already read from another,
+    feeds that must see every event should read every store on its own from `stores`.
+    """
+
+    def __init__(self, stores: Mapping[str, EventStore], ring: Optional[HashRing] = None) -> None:
+        """
+        :param stores: the stores by the name of their shard, the order of the names sets the positions.
+        :param ring: by default a ring of all the stores.
+        """
+        super().__init__()
+        self.stores = dict(stores)
+        self.ring = ring or HashRing(list(self.stores))
+        missing = set(self.ring.shards) - set(self.stores)
+        if missing:
+            raise ValueError(f'No stores for shards {", ".join(sorted(missing))}')
+        self._names = list(self.stores)
+
+    def store(self, aggregate_id: UniqueID) -> EventStore:
+        return self.stores[self.ring.shard(aggregate_id)]
+
+    def save_events(self, aggregate_id: UniqueID, events: List[BaseEvent],
+                    expected_version: Optional[int] = None) -> None:
+        self.store(aggregate_id).save_events(aggregate_id, events, expected_version)
+
+    def load_stream(self, aggregate_id: UniqueID, from_version: Optional[int] = None,
+                    to_version: Optional[int] = None) -> EventStream:
+        return self.store(aggregate_id).load_stream(aggregate_id, from_version, to_version)
+
+    def iter_stream(self, aggregate_id: UniqueID, batch_size: int = 1000) -> LazyEventStream:
+        return self.store(aggregate_id).iter_stream(aggregate_id, batch_size)
+
+    def load_streams(self, aggregate_ids: Sequence[UniqueID]) -> Dict[UniqueID, EventStream]:
+        by_shard: Dict[str, List[UniqueID]] = {}
+        for aggregate_id in aggregate_ids:
+            by_shard.setdefault(self.ring.shard(aggregate_id), []).append(aggregate_id)
+        streams: Dict[UniqueID, EventStream] = {}
+        missing: List[str] = []
+        for shard, shard_ids in by_shard.items():
+            try:
+                streams.update(self.stores[shard].load_streams(shard_ids))
+            except NotFoundException:
+                missing += [str(aggregate_id) for aggregate_id in self._missing(self.stores[shard], shard_ids)]
+        if missing:
+            raise NotFoundException(f'No aggregates with ids {", ".join(missing)}')
+        return streams
+
+    @staticmethod
+    def _missing(store: EventStore, aggregate_ids: Sequence[UniqueID]) -> List[UniqueID]:
+        missing = []
+        for aggregate_id in aggregate_ids:
+            try:
+                store.load_stream(aggregate_id, to_version=0)
+            except NotFoundException:
+                missing.append(aggregate_id)
+        return missing
+
+    def save_snapshot(self, aggregate_id: UniqueID, snapshot: Snapshot) -> None:
+        self.store(aggregate_id).save_snapshot(aggregate_id, snapshot)
+
+    def delete_stream(self, aggregate_id: UniqueID) -> None:
+        self.store(aggregate_id).delete_stream(aggregate_id)
+
+    def has_operation(self, aggregate_id: UniqueID, operation_id: str) -> bool:
+        return self.store(aggregate_id).has_operation(aggregate_id, operation_id)
+
+    def operation_events(self, aggregate_id: UniqueID, operation_id: str) -> Optional[List[BaseEvent]]:
+        return self.store(aggregate_id).operation_events(aggregate_id, operation_id)
+
+    def read_all(self, from_position: int = 0, batch_size: int = 1000) -> Iterator[List[RecordedEvent]]:
+        count = len(self._names)
+        feeds = []
+        for index, name in enumerate(self._names):
+            # Events of the store at or before `from_position` are the ones with a position up to this one
+            store_position = (from_position - index) // count if from_position >= index else 0
+            feeds.append(self._store_feed(self.stores[name], index, store_position, batch_size))
+        batch: List[RecordedEvent] = []
+        for recorded in heapq.merge(*feeds, key=lambda recorded: recorded.position):
+            if recorded.position <= from_position:
+                continue
+            batch.append(recorded)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _store_feed(self, store: EventStore, index: int, from_position: int,
+                    batch_size: int) -> Iterator[RecordedEvent]:
+        count = len(self._names)
+        for batch in store.read_all(from_position, batch_size):
+            for recorded in batch:
+                yield RecordedEvent(
+                    recorded.position * count + index, recorded.aggregate_id, recorded.sequence, recorded.event
+                )
+
+    def stream_ids(self, first_event: Type[BaseEvent]) -> Iterator[UniqueID]:
+        return chain.from_iterable(store.stream_ids(first_event) for store in self.stores.values())
+
+
+def copy_stream(aggregate_id: UniqueID, source: EventStore, target: EventStore) -> bool:
+    """
+    Save the events and the latest snapshot of the stream of the aggregate in `source` to `target`.
+    Returns `False` when `target` already has the whole stream, like when a move was stopped after the copy.
+    The stream must not be written to while it is copied.
+    """
+    stream = source.load_stream(aggregate_id, from_version=1)
+    try:
+        copied: Optional[EventStream] = target.load_stream(aggregate_id, from_version=1)
+    except NotFoundException:
+        copied = None
+    if copied is not None:
+        # The versions can differ, the copy has the number of its events as its version, but aggregates saved
+        # before the version counted events have the number of their commits
+        if copied.events != stream.events:
+            raise ValueError(
+                f'Aggregate {aggregate_id} has {len(copied.events)} events in the target, '
+                f'{len(stream.events)} in the source'
+            )
+        return False
+    target.save_events(aggregate_id, stream.events)
+    snapshot = source.load_stream(aggregate_id).snapshot
+    if snapshot:
+        target.save_snapshot(aggregate_id, snapshot)
+    return True
+
+
+def moved_streams(aggregate_ids: Sequence[UniqueID], previous: HashRing,
+                  ring: HashRing) -> Iterator[Tuple[UniqueID, str, str]]:
+    """
+    Aggregates that are in another shard by `ring` than by `previous`, with the name of the shard they are in
+    and the name of the shard they move to.
+    """
+    for aggregate_id in aggregate_ids:
+        source, target = previous.shard(aggregate_id), ring.shard(aggregate_id)
+        if source != target:
+            yield aggregate_id, source, target
@@ -1,2 +1,5 @@
-from .model import AggregateModel, EventModel, db as event_store_db, session_scope as sql_session_scope
+from .model import AggregateModel, EventModel, SnapshotModel, OperationModel, db as event_store_db, \
+    session_scope as sql_session_scope
+from .migrations import migrate_events_table, migrate_uuid_columns
 from .event_store import PostgresEventStore, EventStore, ConcurrencyException, NotFoundException
+from .engine import get_engine, database_url
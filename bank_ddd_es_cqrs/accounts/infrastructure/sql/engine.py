@@ -0,0 +1,60 @@
+import os
+import threading
+from typing import Any, Dict, Optional
+from sqlalchemy import create_engine, event  # type: ignore
+from sqlalchemy.engine import Engine  # type: ignore
+from sqlalchemy.pool import QueuePool  # type: ignore
+from bank_ddd_es_cqrs.shared.metrics import metrics
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def database_url() -> str:
+    return f"postgres://{os.environ['ACCOUNTS_DB_USER']}:{os.environ['ACCOUNTS_DB_PASSWORD']}@" \
+        f"{os.environ['ACCOUNTS_DB_HOST']}:{os.environ['ACCOUNTS_DB_PORT']}/{os.environ['ACCOUNTS_DB_NAME']}"
+
+
+def pool_options() -> Dict[str, Any]:
+    return {
+        'pool_size': int(os.environ.get('ACCOUNTS_DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('ACCOUNTS_DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('ACCOUNTS_DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('ACCOUNTS_DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('ACCOUNTS_DB_POOL_PRE_PING', 'true').lower() == 'true'
+    }
+
+
+def get_engine(url: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> Engine:
+    """
+    The engine of the process for `url`, the database of the environment by default. It is created on first use
+    with `options`, and with the pool settings of the environment for databases other than sqlite, every
+    later call for the same url gets the same engine and its connection pool.
+    """
+    url = url or database_url()
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            options = dict(options or {})
+            if not url.startswith('sqlite'):
+                options.update(pool_options())
+            engine = _engines[url] = create_engine(url, **options)
+            _count_pool_events(engine)
+        return engine
+
+
+def _count_pool_events(engine: Engine) -> None:
+    event.listen(engine, 'connect', lambda *args: metrics.increment('db.pool.connects'))
+    event.listen(engine, 'checkout', lambda *args: metrics.increment('db.pool.checkouts'))
+    event.listen(engine, 'checkin', lambda *args: metrics.increment('db.pool.checkins'))
+    event.listen(engine, 'invalidate', lambda *args: metrics.increment('db.pool.invalidations'))
+
+
+def _queue_pools() -> Any:
+    with _engines_lock:
+        return [engine.pool for engine in _engines.values() if isinstance(engine.pool, QueuePool)]
+
+
+metrics.register_gauge('db.pool.size', lambda: sum(pool.size() for pool in _queue_pools()))
+metrics.register_gauge('db.pool.checked_out', lambda: sum(pool.checkedout() for pool in _queue_pools()))
+metrics.register_gauge('db.pool.overflow', lambda: sum(max(pool.overflow(), 0) for pool in _queue_pools()))
@@ -1,38 +1,76 @@
+import csv
+import io
+import json
+import re
+import uuid
 from attr import asdict
-from typing import List, Type, Optional
-from abc import ABC, abstractmethod
+from itertools import groupby, takewhile
+from typing import List, Type, Optional, Iterator, Generator, Dict, Any, Sequence, Tuple
+from sqlalchemy import func, and_, or_, select, bindparam  # type: ignore
+from sqlalchemy.exc import IntegrityError  # type: ignore
 from sqlalchemy.orm.session import Session  # type: ignore
-from ...model import events as account_module_events
-from bank_ddd_es_cqrs.shared.model import BaseEvent, EventStream, UniqueID, AppException, StatusCodes
-from .model import AggregateModel, EventModel
+from bank_ddd_es_cqrs.shared.model import BaseEvent, EventStream, LazyEventStream, RecordedEvent, UniqueID, \
+    Snapshot, OperationDuplicate
+from bank_ddd_es_cqrs.shared.model.operations import compact_operation_id
+from ..event_store import EventStore, ConcurrencyException, NotFoundException
+from ..codecs import EventSerializer
+from .model import AggregateModel, EventModel, SnapshotModel, OperationModel
+from .migrations import CANONICAL_UUID
 
+_canonical_uuid = re.compile(CANONICAL_UUID)
 
-class ConcurrencyException(AppException):
-    def __init__(self, msg: str) -> None:
-        super(ConcurrencyException, self).__init__(msg, StatusCodes.CONFLICT_WITH_CURRENT_STATE.value)
 
+class PostgresEventStore(EventStore):
+    # Keeps every multi-row insert below the bind parameters limit of the database
+    INSERT_CHUNK_SIZE = 1000
 
-class NotFoundException(AppException):
-    def __init__(self, msg: str) -> None:
-        super(NotFoundException, self).__init__(msg, StatusCodes.NOT_FOUND.value)
+    def __init__(self, session: Session, copy_threshold: Optional[int] = None,
+                 serializer: Optional[EventSerializer] = None, index_operations: bool = False) -> None:
+        """
+        :param copy_threshold: appends of at least this many events are loaded with `COPY` instead of `INSERT`,
+            only when running on postgres.
+        :param serializer: when passed, events are saved as the type id and payload it encodes them into
+            instead of JSON. Events are loaded the same way they were saved either way.
+        :param index_operations: save the operations of the events to the `operations` table and look them up
+            there in `has_operation`, the events saved before must be indexed by `backfill_operations` first.
+        """
+        super().__init__()
+        self.session: Session = session
+        self.copy_threshold = copy_threshold
+        self.serializer = serializer
+        self.index_operations = index_operations
+        self._deserializer = serializer or EventSerializer()
 
+    def load_stream(self, aggregate_id: UniqueID, from_version: Optional[int] = None,
+                    to_version: Optional[int] = None) -> EventStream:
+        _check_aggregate_id(aggregate_id)
+        aggregate = self.session.query(AggregateModel).filter(
+            AggregateModel.uuid == str(aggregate_id)
+        ).first()
 
-class EventStore(ABC):
-    @abstractmethod
-    def save_events(self, aggregate_id: UniqueID, events: List[BaseEvent], expected_version: int) -> None:
-        pass
+        if not aggregate:
+            raise NotFoundException(f'No aggregate with id {aggregate_id}')
 
-    @abstractmethod
-    def load_stream(self, aggregate_id: UniqueID) -> EventStream:
-        pass
+        snapshot = None
+        if from_version is None and to_version is None:
+            snapshot = self._load_snapshot(aggregate_id)
+            if snapshot:
+                from_version = snapshot.stream_version + 1
 
+        query = self.session.query(EventModel).filter(EventModel.aggregate_uuid == str(aggregate_id))
+        if from_version is not None:
+            query = query.filter(EventModel.sequence >= from_version)
+        if to_version is not None:
+            query = query.filter(EventModel.sequence <= to_version)
 
-class PostgresEventStore(EventStore):
-    def __init__(self, session: Session) -> None:
-        super().__init__()
-        self.session: Session = session
+        # translate all events models to proper event objects (see part 1)
+        events_objects = [self._event_model_to_core(model) for model in query.order_by(EventModel.sequence)]
+        version = aggregate.version
 
-    def load_stream(self, aggregate_id: UniqueID) -> EventStream:
+        return EventStream(events_objects, version, snapshot)
+
+    def iter_stream(self, aggregate_id: UniqueID, batch_size: int = 1000) -> LazyEventStream:
+        _check_aggregate_id(aggregate_id)
         aggregate = self.session.query(AggregateModel).filter(
             AggregateModel.uuid == str(aggregate_id)
         ).first()
@@ -40,44 +78,373 @@ class PostgresEventStore(EventStore):
         if not aggregate:
             raise NotFoundException(f'No aggregate with id {aggregate_id}')
 
-        # translate all events models to proper event objects (see part 1)
-        events_objects = [self._event_model_to_core(model) for model in aggregate.events]
-        version = aggregate.version
+        snapshot = self._load_snapshot(aggregate_id)
+        from_version = snapshot.stream_version + 1 if snapshot else 1
+        return LazyEventStream(self._iter_events(aggregate_id, from_version, batch_size), aggregate.version, snapshot)
+
+    def _iter_events(self, aggregate_id: UniqueID, from_version: int,
+                     batch_size: int) -> Generator[BaseEvent, None, None]:
+        """
+        Reads the rows through a server side cursor (`stream_results`) on postgres, and without the ORM,
+        so no row is kept around after its event was handed out.
+        """
+        events = EventModel.__table__
+        result = self.session.execute(
+            select([events.c.name, events.c.data, events.c.type_id, events.c.payload]).where(
+                (events.c.aggregate_uuid == str(aggregate_id)) & (events.c.sequence >= from_version)
+            ).order_by(events.c.sequence).execution_options(stream_results=True)
+        )
+        try:
+            rows = result.fetchmany(batch_size)
+            while rows:
+                for row in rows:
+                    yield self._event_model_to_core(row)
+                rows = result.fetchmany(batch_size)
+        finally:
+            result.close()
+
+    def load_streams(self, aggregate_ids: Sequence[UniqueID]) -> Dict[UniqueID, EventStream]:
+        uuids = [str(aggregate_id) for aggregate_id in aggregate_ids]
+        invalid = [aggregate_id for aggregate_id in uuids if not _is_canonical_uuid(aggregate_id)]
+        if invalid:
+            raise NotFoundException(f'No aggregates with ids {", ".join(invalid)}')
+        aggregates = self.session.query(
+            AggregateModel.uuid, AggregateModel.version, SnapshotModel.stream_version, SnapshotModel.data
+        ).outerjoin(
+            SnapshotModel, SnapshotModel.aggregate_uuid == AggregateModel.uuid
+        ).filter(AggregateModel.uuid.in_(uuids)).all()
+
+        found = {row.uuid for row in aggregates}
+        missing = [aggregate_id for aggregate_id in uuids if aggregate_id not in found]
+        if missing:
+            raise NotFoundException(f'No aggregates with ids {", ".join(missing)}')
+
+        snapshots = {
+            row.uuid: Snapshot(row.data, row.stream_version) for row in aggregates if row.stream_version is not None
+        }
+        # The stream versions of the snapshots read above are used, and not a join with the snapshots table,
+        # so a snapshot saved in between the two queries cannot make us skip events
+        event_models = self.session.query(EventModel).filter(
+            or_(
+                EventModel.aggregate_uuid.in_([uuid for uuid in uuids if uuid not in snapshots]),
+                *[
+                    and_(EventModel.aggregate_uuid == uuid, EventModel.sequence > snapshot.stream_version)
+                    for uuid, snapshot in snapshots.items()
+                ]
+            )
+        ).order_by(EventModel.aggregate_uuid, EventModel.sequence)
+        events = {
+            uuid: [self._event_model_to_core(model) for model in models]
+            for uuid, models in groupby(event_models, key=lambda model: model.aggregate_uuid)
+        }
+
+        versions = {row.uuid: row.version for row in aggregates}
+        return {
+            aggregate_id: EventStream(
+                events.get(str(aggregate_id), []), versions[str(aggregate_id)], snapshots.get(str(aggregate_id))
+            )
+            for aggregate_id in aggregate_ids
+        }
+
+    def _load_snapshot(self, aggregate_id: UniqueID) -> Optional[Snapshot]:
+        snapshot_model = self.session.query(SnapshotModel).filter(
+            SnapshotModel.aggregate_uuid == str(aggregate_id)
+        ).first()
+        if not snapshot_model:
+            return None
+        return Snapshot(snapshot_model.data, snapshot_model.stream_version)
 
-        return EventStream(events_objects, version)
+    def save_snapshot(self, aggregate_id: UniqueID, snapshot: Snapshot) -> None:
+        self.session.merge(
+            SnapshotModel(
+                aggregate_uuid=str(aggregate_id),
+                stream_version=snapshot.stream_version,
+                data=snapshot.state
+            )
+        )
+
+    def read_all(self, from_position: int = 0, batch_size: int = 1000) -> Iterator[List[RecordedEvent]]:
+        """
+        Every batch is its own keyset query over the primary key, so no cursor is held open between batches.
+        Note that positions are handed out on insert, not on commit, a transaction that commits after
+        another one with higher positions can make events show up behind a position that was already read.
+        """
+        events = EventModel.__table__
+        while True:
+            rows = self.session.execute(
+                select([
+                    events.c.position, events.c.aggregate_uuid, events.c.sequence,
+                    events.c.name, events.c.data, events.c.type_id, events.c.payload
+                ])
+                .where(events.c.position > from_position)
+                .order_by(events.c.position)
+                .limit(batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [
+                RecordedEvent(row.position, row.aggregate_uuid, row.sequence, self._event_model_to_core(row))
+                for row in rows
+            ]
+            if len(rows) < batch_size:
+                return
+            from_position = rows[-1].position
+
+    def rewrite_upcasted_events(self, from_position: int = 0, batch_size: int = 1000) -> Tuple[int, int]:
+        """
+        Reads up to `batch_size` events after `from_position`, and saves back the upcasted data of the ones that
+        are upcasted on read, each in the format it was saved with, so they are not upcasted on every replay.
+        Returns the position of the last event read, which is `from_position` when there are no more events,
+        and the amount of events rewritten.
+        """
+        events = EventModel.__table__
+        registry = self._deserializer.registry
+        rows = self.session.execute(
+            select([events.c.position, events.c.name, events.c.data, events.c.type_id, events.c.payload])
+            .where(events.c.position > from_position)
+            .order_by(events.c.position)
+            .limit(batch_size)
+        ).fetchall()
+        data_updates = []
+        payload_updates = []
+        for row in rows:
+            if row.payload is not None:
+                name, data = self._deserializer.deserialize_data(row.type_id, row.payload)
+            else:
+                name, data = row.name, row.data
+            upcasted = registry.upcast(name, data)
+            if upcasted is data:
+                continue
+            if row.payload is not None:
+                _, payload = self._deserializer.serialize(registry.create(name, upcasted))
+                payload_updates.append({'event_position': row.position, 'event_payload': payload})
+            else:
+                data_updates.append({'event_position': row.position, 'event_data': upcasted})
+        if data_updates:
+            self.session.execute(
+                events.update().where(events.c.position == bindparam('event_position'))
+                .values(data=bindparam('event_data', type_=events.c.data.type)),
+                data_updates
+            )
+        if payload_updates:
+            self.session.execute(
+                events.update().where(events.c.position == bindparam('event_position'))
+                .values(payload=bindparam('event_payload', type_=events.c.payload.type)),
+                payload_updates
+            )
+        last_position = rows[-1].position if rows else from_position
+        return last_position, len(data_updates) + len(payload_updates)
+
+    def stream_ids(self, first_event: Type[BaseEvent]) -> Iterator[UniqueID]:
+        """
+        Ids of all the streams that contain an event of type `first_event`, meant to be used with the event that
+        creates an aggregate to find all the aggregates of a certain type.
+        """
+        rows = self.session.query(EventModel.aggregate_uuid).filter(
+            EventModel.name == first_event.__name__
+        )
+        for row in rows:
+            yield UniqueID(row.aggregate_uuid)
+
+    def delete_stream(self, aggregate_id: UniqueID) -> None:
+        aggregate_uuid = str(aggregate_id)
+        self.session.query(SnapshotModel).filter(SnapshotModel.aggregate_uuid == aggregate_uuid).delete()
+        self.session.query(OperationModel).filter(OperationModel.aggregate_uuid == aggregate_uuid).delete()
+        self.session.query(EventModel).filter(EventModel.aggregate_uuid == aggregate_uuid).delete()
+        deleted = self.session.query(AggregateModel).filter(AggregateModel.uuid == aggregate_uuid).delete()
+        if not deleted:
+            raise NotFoundException(f'No aggregate with id {aggregate_id}')
 
     def _event_model_to_core(self, event_model: EventModel) -> BaseEvent:
-        class_name = event_model.name
-        kwargs = event_model.data
-        event_class: Type[BaseEvent] = getattr(account_module_events, class_name)
-        return event_class(**kwargs)
+        if event_model.payload is not None:
+            return self._deserializer.deserialize(event_model.type_id, event_model.payload)
+        return self._deserializer.registry.create(event_model.name, event_model.data)
 
     def save_events(self, aggregate_id: UniqueID, events: List[BaseEvent],
                     expected_version: Optional[int] = None) -> None:
         if expected_version and expected_version != -1:
-            self._update_aggregate_version_check(aggregate_id, expected_version)
+            self._update_aggregate_version_check(aggregate_id, expected_version, len(events))
+            last_sequence = self._last_sequence(aggregate_id)
+        else:
+            self._create_aggregate(aggregate_id, len(events))
+            last_sequence = 0
+        rows = self._event_rows(aggregate_id, events, last_sequence)
+        if self.copy_threshold is not None and len(rows) >= self.copy_threshold and \
+                self.session.get_bind().dialect.name == 'postgresql':
+            self._copy_events(rows)
         else:
-            self._create_aggregate(aggregate_id)
-        for event in events:
-            self.session.add(
-                EventModel(
-                    uuid=str(UniqueID()),
-                    aggregate_uuid=str(aggregate_id),
-                    name=event.__class__.__name__,
-                    data=asdict(event)
-                )
+            self._insert_events(rows)
+        if self.index_operations:
+            self._insert_operations(aggregate_id, events, last_sequence)
+
+    def _insert_operations(self, aggregate_id: UniqueID, events: List[BaseEvent], last_sequence: int) -> None:
+        # The events of one command share its operation id, every operation is inserted once with its first event
+        operations: Dict[bytes, int] = {}
+        for sequence, event in enumerate(events, start=last_sequence + 1):
+            operations.setdefault(compact_operation_id(event.operation_id), sequence)
+        if not operations:
+            # An `INSERT` with an empty list of parameters inserts a row of defaults
+            return
+        try:
+            self.session.execute(OperationModel.__table__.insert(), [
+                {'aggregate_uuid': str(aggregate_id), 'operation_id': operation_id, 'sequence': sequence}
+                for operation_id, sequence in operations.items()
+            ])
+        except IntegrityError as e:
+            if not _is_unique_violation(e):
+                raise
+            raise OperationDuplicate()
+
+    def has_operation(self, aggregate_id: UniqueID, operation_id: str) -> bool:
+        if not self.index_operations:
+            return super().has_operation(aggregate_id, operation_id)
+        if not _is_canonical_uuid(str(aggregate_id)):
+            return False
+        return self.session.query(
+            self.session.query(OperationModel).filter(
+                (OperationModel.aggregate_uuid == str(aggregate_id)) &
+                (OperationModel.operation_id == compact_operation_id(operation_id))
+            ).exists()
+        ).scalar()
+
+    def operation_events(self, aggregate_id: UniqueID, operation_id: str) -> Optional[List[BaseEvent]]:
+        if not self.index_operations:
+            return super().operation_events(aggregate_id, operation_id)
+        if not _is_canonical_uuid(str(aggregate_id)):
+            return None
+        sequence = self.session.query(OperationModel.sequence).filter(
+            (OperationModel.aggregate_uuid == str(aggregate_id)) &
+            (OperationModel.operation_id == compact_operation_id(operation_id))
+        ).scalar()
+        if sequence is None:
+            return None
+        # Read in small batches, the events that follow the operation are not needed
+        events = self._iter_events(aggregate_id, sequence, batch_size=10)
+        try:
+            return list(takewhile(lambda event: event.operation_id == operation_id, events))
+        finally:
+            events.close()
+
+    def backfill_operations(self, from_position: int = 0, batch_size: int = 1000) -> Tuple[int, int]:
+        """
+        Index the operations of up to `batch_size` events after `from_position` that are not indexed yet.
+        Returns the position of the last event read, which is `from_position` when there are no more events,
+        and the amount of operations indexed.
+        """
+        batch: List[RecordedEvent] = next(self.read_all(from_position, batch_size), [])
+        # Events are read in the order of their positions, the first event of an operation comes first
+        first_sequences: Dict[Tuple[str, bytes], int] = {}
+        for recorded in batch:
+            first_sequences.setdefault(
+                (recorded.aggregate_id, compact_operation_id(recorded.event.operation_id)), recorded.sequence
             )
+        operations = set(first_sequences)
+        if not operations:
+            return from_position, 0
+        indexed = {
+            (row.aggregate_uuid, bytes(row.operation_id)) for row in self.session.query(OperationModel).filter(
+                OperationModel.aggregate_uuid.in_({aggregate_uuid for aggregate_uuid, _ in operations}) &
+                OperationModel.operation_id.in_({operation_id for _, operation_id in operations})
+            )
+        }
+        missing = operations - indexed
+        if missing:
+            self.session.execute(OperationModel.__table__.insert(), [
+                {'aggregate_uuid': aggregate_uuid, 'operation_id': operation_id,
+                 'sequence': first_sequences[(aggregate_uuid, operation_id)]}
+                for aggregate_uuid, operation_id in missing
+            ])
+        return batch[-1].position, len(missing)
+
+    def _event_rows(self, aggregate_id: UniqueID, events: List[BaseEvent], last_sequence: int) -> List[Dict[str, Any]]:
+        aggregate_uuid = str(aggregate_id)
+        rows = []
+        for sequence, event in enumerate(events, start=last_sequence + 1):
+            row = {
+                'uuid': str(uuid.uuid4()),
+                'aggregate_uuid': aggregate_uuid,
+                'sequence': sequence,
+                'name': event.__class__.__name__,
+                'data': None,
+                'type_id': None,
+                'payload': None
+            }
+            if self.serializer:
+                row['type_id'], row['payload'] = self.serializer.serialize(event)
+            else:
+                row['data'] = asdict(event, recurse=False)
+            rows.append(row)
+        return rows
+
+    def _insert_events(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Core multi-row `INSERT`, skips the unit of work bookkeeping of the ORM and writes the events
+        of a commit in one statement.
+        """
+        for start in range(0, len(rows), self.INSERT_CHUNK_SIZE):
+            self.session.execute(EventModel.__table__.insert().values(rows[start:start + self.INSERT_CHUNK_SIZE]))
+
+    def _copy_events(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Streams the rows with `COPY` over the connection of the session, so they are part of the same transaction.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                row['uuid'], row['aggregate_uuid'], row['sequence'], row['name'],
+                # An unquoted empty field is NULL in the csv format of `COPY`
+                json.dumps(row['data']) if row['data'] is not None else None,
+                row['type_id'],
+                '\\x' + row['payload'].hex() if row['payload'] is not None else None
+            ])
+        buffer.seek(0)
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                'COPY events (uuid, aggregate_uuid, sequence, name, data, type_id, payload) FROM STDIN '
+                'WITH (FORMAT csv)', buffer
+            )
+        finally:
+            cursor.close()
+
+    def _last_sequence(self, aggregate_id: UniqueID) -> int:
+        last_sequence = self.session.query(func.max(EventModel.sequence)).filter(
+            EventModel.aggregate_uuid == str(aggregate_id)
+        ).scalar()
+        return last_sequence or 0
 
-    def _create_aggregate(self, aggregate_id: UniqueID) -> None:
-        aggregate = AggregateModel(uuid=str(aggregate_id))
-        self.session.add(aggregate)
+    def _create_aggregate(self, aggregate_id: UniqueID, version: int) -> None:
+        # Inserted right away and not through the session, the events rows that follow reference it
+        try:
+            self.session.execute(AggregateModel.__table__.insert().values(uuid=str(aggregate_id), version=version))
+        except IntegrityError:
+            raise ConcurrencyException(f'Aggregate with id {aggregate_id} already exists')
 
-    def _update_aggregate_version_check(self, aggregate_id: UniqueID, expected_version: Optional[int]) -> None:
-        aggregates = self.session.query(AggregateModel).filter(
+    def _update_aggregate_version_check(self, aggregate_id: UniqueID, expected_version: Optional[int],
+                                        appended: int) -> None:
+        """
+        Compare and swap of the version in a single `UPDATE`, the database locks the row while checking the
+        expected version, so out of concurrent writers with the same expected version only one updates a row.
+        """
+        updated = self.session.query(AggregateModel).filter(
             (AggregateModel.version == expected_version) &
             (AggregateModel.uuid == str(aggregate_id))
-        ).all()
-        if len(aggregates) != 1:
+        ).update({AggregateModel.version: AggregateModel.version + appended})
+        if updated != 1:
             raise ConcurrencyException(f'Found no aggregate with id {aggregate_id} and version {expected_version}')
-        target_aggregate = aggregates[0]
-        target_aggregate.version = expected_version + 1
+
+
+def _is_unique_violation(error: IntegrityError) -> bool:
+    # `unique_violation` of postgres, sqlite only tells by its message
+    return getattr(error.orig, 'pgcode', None) == '23505' or 'UNIQUE constraint failed' in str(error.orig)
+
+
+def _is_canonical_uuid(aggregate_id: str) -> bool:
+    return _canonical_uuid.match(aggregate_id) is not None
+
+
+def _check_aggregate_id(aggregate_id: UniqueID) -> None:
+    # Ids come straight from the urls, postgres raises on anything that can't be in a `UUID` column
+    if not _is_canonical_uuid(str(aggregate_id)):
+        raise NotFoundException(f'No aggregate with id {aggregate_id}')
@@ -0,0 +1,114 @@
+from typing import List, Optional, Tuple
+from sqlalchemy import text  # type: ignore
+from sqlalchemy.orm.session import Session  # type: ignore
+
+# Columns of aggregate and event ids, the referenced column comes first
+UUID_COLUMNS: List[Tuple[str, str]] = [
+    ('aggregates', 'uuid'),
+    ('events', 'uuid'),
+    ('events', 'aggregate_uuid'),
+    ('snapshots', 'aggregate_uuid'),
+    ('operations', 'aggregate_uuid')
+]
+# Columns that reference `aggregates.uuid`, postgres names their constraints `<table>_<column>_fkey`
+FOREIGN_KEYS: List[Tuple[str, str]] = [
+    ('events', 'aggregate_uuid'),
+    ('snapshots', 'aggregate_uuid'),
+    ('operations', 'aggregate_uuid')
+]
+# Only ids in this format come back as the same string out of a `UUID` column
+CANONICAL_UUID = '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+
+
+def migrate_events_table(session: Session) -> List[str]:
+    """
+    Add the columns that the `events` table of a postgres database created before them is missing, in the
+    transaction of `session`. It must run before anything else reads or writes the events.
+    `position` is the position of every event across all the streams and becomes the primary key, `uuid` stays
+    unique. `sequence` is the position of every event in its stream, with a unique index on it. The old primary key
+    is a random uuid, so the events are numbered in the order their rows are stored in, the order they were replayed
+    in. Columns that already exist are skipped. Returns the added columns as `table.column`.
+    """
+    if session.get_bind().dialect.name != 'postgresql':
+        raise ValueError('The events table can only be migrated on postgres')
+    added: List[str] = []
+    if _data_type(session, 'events', 'position') is None:
+        session.execute(text('CREATE SEQUENCE events_position_seq'))
+        session.execute(text('ALTER TABLE events ADD COLUMN position bigint'))
+        session.execute(text(
+            'UPDATE events SET position = numbered.position FROM ('
+            'SELECT ctid AS row_id, row_number() OVER (ORDER BY ctid) AS position FROM events) AS numbered '
+            'WHERE events.ctid = numbered.row_id'
+        ))
+        session.execute(text(
+            "SELECT setval('events_position_seq', COALESCE(max(position), 0) + 1, false) FROM events"
+        ))
+        session.execute(text(
+            "ALTER TABLE events ALTER COLUMN position SET DEFAULT nextval('events_position_seq'), "
+            'ALTER COLUMN position SET NOT NULL'
+        ))
+        session.execute(text('ALTER SEQUENCE events_position_seq OWNED BY events.position'))
+        session.execute(text(
+            'ALTER TABLE events DROP CONSTRAINT events_pkey, ADD CONSTRAINT events_pkey PRIMARY KEY (position), '
+            'ADD CONSTRAINT events_uuid_key UNIQUE (uuid)'
+        ))
+        added.append('events.position')
+    if _data_type(session, 'events', 'sequence') is None:
+        session.execute(text('ALTER TABLE events ADD COLUMN sequence integer'))
+        # The update above moved the rows, from here on `position` holds the order they were stored in
+        session.execute(text(
+            'UPDATE events SET sequence = numbered.sequence FROM ('
+            'SELECT position AS row_position, '
+            'row_number() OVER (PARTITION BY aggregate_uuid ORDER BY position) AS sequence FROM events) AS numbered '
+            'WHERE events.position = numbered.row_position'
+        ))
+        session.execute(text('ALTER TABLE events ALTER COLUMN sequence SET NOT NULL'))
+        session.execute(text(
+            'CREATE UNIQUE INDEX events_aggregate_uuid_sequence_idx ON events (aggregate_uuid, sequence)'
+        ))
+        added.append('events.sequence')
+    return added
+
+
+def migrate_uuid_columns(session: Session) -> List[str]:
+    """
+    Convert the `VARCHAR(36)` id columns of a postgres database to its 16 bytes `UUID` type, in the transaction
+    of `session`. The tables are rewritten and locked while they are converted, and their indexes rebuilt.
+    Columns that are already of the `UUID` type and tables that don't exist are skipped.
+    Raises `ValueError` when an id is not a uuid in the canonical format, before anything is converted.
+    Returns the converted columns as `table.column`.
+    """
+    if session.get_bind().dialect.name != 'postgresql':
+        raise ValueError('Id columns can only be converted to UUID on postgres')
+    types = {(table, column): _data_type(session, table, column) for table, column in UUID_COLUMNS}
+    columns = [(table, column) for table, column in UUID_COLUMNS if types[(table, column)] not in (None, 'uuid')]
+    if not columns:
+        return []
+    for table, column in columns:
+        invalid = session.execute(
+            text(f'SELECT {column} FROM {table} WHERE {column} !~ :pattern LIMIT 1'), {'pattern': CANONICAL_UUID}
+        ).scalar()
+        if invalid is not None:
+            raise ValueError(f'{table}.{column} has {invalid}, which is not a uuid in the canonical format')
+    foreign_keys = [(table, column) for table, column in FOREIGN_KEYS if types[(table, column)] is not None]
+    # The referenced and the referencing columns can't have different types, the constraints are added back after
+    for table, column in foreign_keys:
+        session.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_{column}_fkey'))
+    for table, column in columns:
+        session.execute(text(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE uuid USING {column}::uuid'))
+    for table, column in foreign_keys:
+        session.execute(text(
+            f'ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column}) '
+            f'REFERENCES aggregates (uuid)'
+        ))
+    return [f'{table}.{column}' for table, column in columns]
+
+
+def _data_type(session: Session, table: str, column: str) -> Optional[str]:
+    return session.execute(
+        text(
+            'SELECT data_type FROM information_schema.columns '
+            'WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column'
+        ),
+        {'table': table, 'column': column}
+    ).scalar()
@@ -1,51 +1,116 @@
-import os
 from contextlib import contextmanager
-from typing import Any, Iterator
+from typing import Any, Iterator, Dict, Optional
 
 from flask_sqlalchemy import SQLAlchemy  # type: ignore
-from sqlalchemy import MetaData, Column, Integer, ForeignKey, VARCHAR, JSON, create_engine  # type: ignore
+from sqlalchemy import (  # type: ignore
+    MetaData, Column, Integer, BigInteger, SmallInteger, ForeignKey, VARCHAR, JSON, Index, LargeBinary
+)
+from sqlalchemy.dialects import postgresql  # type: ignore
+from sqlalchemy.types import TypeDecorator  # type: ignore
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session, relationship  # type: ignore
+from sqlalchemy.orm import Session, relationship, backref  # type: ignore
+from .engine import get_engine
 
 metadata = MetaData()
 Base = declarative_base(metadata=metadata)
 
 
+class UUIDString(TypeDecorator):
+    """
+    Ids as the 16 bytes of the `UUID` type on postgres, and as `VARCHAR(36)` on other databases. They are bound
+    and read as their canonical string either way, so the code works the same on tables that still have
+    `VARCHAR(36)` columns, until they are converted by `migrate_uuid_columns`.
+    """
+    impl = VARCHAR
+
+    def load_dialect_impl(self, dialect: Any) -> Any:
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(VARCHAR(36))
+
+
 class AggregateModel(Base):
     __tablename__ = 'aggregates'
 
-    uuid = Column(VARCHAR(36), primary_key=True)
+    uuid = Column(UUIDString(), primary_key=True)
     version = Column(Integer, default=1)
 
 
 class EventModel(Base):
+    """
+    `sequence` is the position of the event inside the stream of its aggregate, starting from 1.
+    `position` is the position of the event across all the streams, it only grows as events are inserted.
+    An event is either stored as JSON in `data`, or encoded by an `EventSerializer` into `type_id` and `payload`.
+    """
     __tablename__ = 'events'
+    __table_args__ = (
+        Index('events_aggregate_uuid_sequence_idx', 'aggregate_uuid', 'sequence', unique=True),
+    )
 
-    uuid = Column(VARCHAR(36), primary_key=True)
-    aggregate_uuid = Column(VARCHAR(36), ForeignKey('aggregates.uuid'))
+    # sqlite only auto increments an `INTEGER PRIMARY KEY`
+    position = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    uuid = Column(UUIDString(), nullable=False, unique=True)
+    aggregate_uuid = Column(UUIDString(), ForeignKey('aggregates.uuid'))
+    sequence = Column(Integer, nullable=False)
     name = Column(VARCHAR(50))
+    data = Column(JSON(none_as_null=True))
+    type_id = Column(SmallInteger)
+    payload = Column(LargeBinary)
+
+    aggregate = relationship(AggregateModel, uselist=False, backref=backref('events', order_by=sequence))
+
+
+class SnapshotModel(Base):
+    """
+    Latest snapshot of an aggregate, `stream_version` is the number of events of the stream folded into `data`.
+    """
+    __tablename__ = 'snapshots'
+
+    aggregate_uuid = Column(UUIDString(), ForeignKey('aggregates.uuid'), primary_key=True)
+    stream_version = Column(Integer, nullable=False)
     data = Column(JSON)
 
-    aggregate = relationship(AggregateModel, uselist=False, backref='events')
 
+class OperationModel(Base):
+    """
+    Operations committed by every aggregate, `operation_id` is the 16 bytes of `compact_operation_id`.
+    Aggregates that remember only their latest operations look up the older ones here, and a retried command
+    is found here before its aggregate is loaded. `sequence` is the sequence of the first event of the operation,
+    the events of an operation are saved together, right after it.
+    """
+    __tablename__ = 'operations'
+
+    aggregate_uuid = Column(UUIDString(), ForeignKey('aggregates.uuid'), primary_key=True)
+    operation_id = Column(LargeBinary(16), primary_key=True)
+    sequence = Column(Integer)
+
+
+class SharedEngineSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with the engine of the process, so the app and `session_scope` outside of it share a pool.
+    """
+
+    def create_engine(self, sa_url: Any, engine_opts: Dict[str, Any]) -> Any:
+        return get_engine(str(sa_url), engine_opts)
 
-db: Any = SQLAlchemy(metadata=metadata)
+
+db: Any = SharedEngineSQLAlchemy(metadata=metadata)
 
 
 @contextmanager
-def session_scope() -> Iterator[Any]:
+def session_scope(url: Optional[str] = None) -> Iterator[Any]:
     """
     Provide a transactional scope around a series of operations.
-    If inside a context of flask app, will return the session from the `db`, otherwise will create a new session.
+    If inside a context of flask app, will return the session from the `db`, otherwise will create a new session
+    on the engine of the process. A session of another database, like one of the shards, is asked for by `url`.
     """
-    try:
-        session = db.session()
-    except Exception:
-        engine = create_engine(
-            f"postgres://{os.environ['ACCOUNTS_DB_USER']}:{os.environ['ACCOUNTS_DB_PASSWORD']}@{os.environ['ACCOUNTS_DB_HOST']}:" \
-            f"{os.environ['ACCOUNTS_DB_PORT']}/{os.environ['ACCOUNTS_DB_NAME']}"
-        )
-        session = Session(engine)
+    if url is not None:
+        session = Session(get_engine(url))
+    else:
+        try:
+            session = db.session()
+        except Exception:
+            session = Session(get_engine())
     try:
         yield session
         session.commit()
@@ -1,9 +1,19 @@
-from bank_ddd_es_cqrs.shared.model import AggregateRoot, UniqueID, EventStream
+from itertools import islice
+from typing import Dict, Any, Iterable, List, Type
+from bank_ddd_es_cqrs.shared.model import AggregateRoot, UniqueID, EventStream, BaseEvent, applies
 from .events import AccountCreated, AccountDebited, AccountCredited, AccountMaximumDebtChanged
 from .amount import Amount
+from .balance_fold import fold_cents
+
+MONEY_SIGNS: Dict[Type[BaseEvent], int] = {AccountCredited: 1, AccountDebited: -1}
 
 
 class Account(AggregateRoot):
+    # Set by the composition root, the credits and debits of replayed streams are then summed in chunks of
+    # `FOLD_CHUNK_SIZE` events instead of applied one by one
+    fold_balance = False
+    FOLD_CHUNK_SIZE = 4096
+
     @staticmethod
     def create(client_id: UniqueID, account_id: UniqueID, operation_id: UniqueID, account_name: str) -> 'Account':
         """
@@ -21,14 +31,30 @@ class Account(AggregateRoot):
         account._initialize([created_event])
         return account
 
-    @AggregateRoot.apply.register
-    def _(self, event: AccountCreated) -> None:
+    @applies
+    def _apply_created(self, event: AccountCreated) -> None:
         self._account_id = event.account_id
         self._client_id = event.client_id
         self._account_name = event.account_name
         self._balance = Amount(0, 0)
         self._maximum_debt = Amount(0, 0)
 
+    def _snapshot_state(self) -> Dict[str, Any]:
+        return {
+            'account_id': self._account_id,
+            'client_id': self._client_id,
+            'account_name': self._account_name,
+            'balance': {'dollars': self._balance.dollars, 'cents': self._balance.cents},
+            'maximum_debt': {'dollars': self._maximum_debt.dollars, 'cents': self._maximum_debt.cents}
+        }
+
+    def _restore_snapshot_state(self, state: Dict[str, Any]) -> None:
+        self._account_id = state['account_id']
+        self._client_id = state['client_id']
+        self._account_name = state['account_name']
+        self._balance = Amount(**state['balance'])
+        self._maximum_debt = Amount(**state['maximum_debt'])
+
     @property
     def client_id(self) -> UniqueID:
         return UniqueID(self._client_id)
@@ -37,18 +63,47 @@ class Account(AggregateRoot):
     def account_id(self) -> UniqueID:
         return UniqueID(self._account_id)
 
-    @AggregateRoot.apply.register  # type: ignore
-    def _(self, event: AccountDebited) -> None:
+    @applies
+    def _apply_debited(self, event: AccountDebited) -> None:
         self._balance -= Amount(event.dollars, event.cents)
 
-    @AggregateRoot.apply.register  # type: ignore
-    def _(self, event: AccountCredited) -> None:
+    @applies
+    def _apply_credited(self, event: AccountCredited) -> None:
         self._balance += Amount(event.dollars, event.cents)
 
-    @AggregateRoot.apply.register  # type: ignore
-    def _(self, event: AccountMaximumDebtChanged) -> None:
+    @applies
+    def _apply_maximum_debt_changed(self, event: AccountMaximumDebtChanged) -> None:
         self._maximum_debt = Amount(event.dollars, event.cents)
 
+    def apply_events(self, events: Iterable[BaseEvent]) -> None:
+        if not self.fold_balance:
+            super().apply_events(events)
+            return
+        # Taken in chunks, so lazily read streams still don't have to be in memory all at once
+        iterator = iter(events)
+        chunk = list(islice(iterator, self.FOLD_CHUNK_SIZE))
+        while chunk:
+            self._fold_events(chunk)
+            chunk = list(islice(iterator, self.FOLD_CHUNK_SIZE))
+
+    def _fold_events(self, events: List[BaseEvent]) -> None:
+        """
+        The other events don't read the balance, and the created event that sets it is the first of the stream,
+        so they are applied first and the sum of the credits and debits is added to the balance after them.
+        """
+        for event in events:
+            if event.__class__ not in MONEY_SIGNS:
+                self._dispatch(event)
+        money = [event for event in events if event.__class__ in MONEY_SIGNS]
+        if money:
+            self._balance += Amount.from_cents(fold_cents(
+                [event.dollars for event in money],  # type: ignore
+                [event.cents for event in money],  # type: ignore
+                [MONEY_SIGNS[event.__class__] for event in money]
+            ))
+        self._operations.add_all([event.operation_id for event in events])
+        self._stream_version += len(events)
+
     def credit(self, amount: Amount, operation_id: UniqueID) -> None:
         self.apply_event(AccountCredited(
             operation_id=operation_id.value,
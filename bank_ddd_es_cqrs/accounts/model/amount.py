@@ -1,72 +1,147 @@
-import math
-from typing import Tuple
-from dataclasses import dataclass
+from dataclasses import FrozenInstanceError
+from decimal import ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_HALF_DOWN, ROUND_DOWN, ROUND_UP, ROUND_FLOOR, \
+    ROUND_CEILING
+from typing import Any, Tuple
+
+ROUNDING_MODES = (ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_HALF_DOWN, ROUND_DOWN, ROUND_UP, ROUND_FLOOR, ROUND_CEILING)
+
+
+def divide_rounded(numerator: int, denominator: int, rounding: str = ROUND_HALF_EVEN) -> int:
+    """
+    `numerator / denominator` rounded to an int by one of the rounding modes of `decimal`,
+    exact for ints of any size, there are no floats involved.
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f'Unknown rounding mode {rounding}')
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(numerator, denominator)
+    if not remainder:
+        return quotient
+    # `quotient` is rounded towards negative infinity, the result is either it or the int above it
+    towards_zero, away_from_zero = (quotient + 1, quotient) if numerator < 0 else (quotient, quotient + 1)
+    if rounding == ROUND_FLOOR:
+        return quotient
+    if rounding == ROUND_CEILING:
+        return quotient + 1
+    if rounding == ROUND_DOWN:
+        return towards_zero
+    if rounding == ROUND_UP:
+        return away_from_zero
+    if remainder * 2 != denominator:
+        return quotient if remainder * 2 < denominator else quotient + 1
+    if rounding == ROUND_HALF_UP:
+        return away_from_zero
+    if rounding == ROUND_HALF_DOWN:
+        return towards_zero
+    return quotient if quotient % 2 == 0 else quotient + 1
 
 
-@dataclass(frozen=True)
 class Amount:
-    dollars: int
-    cents: int = 0
+    """
+    Amount of money held as a whole number of cents. `dollars` and `cents` are read out of it with the cents
+    between 0 and 99, the way amounts with cents that are not negative were always split, so `Amount(8, 253)`
+    has 10 dollars and 53 cents and `Amount(-2, 50)` has -2 dollars and 50 cents.
+    Arithmetic works on the cents alone, nothing has to be normalized and no float is involved.
+    """
+    __slots__ = ('_cents',)
+    _cents: int
 
-    def __post_init__(self) -> None:
-        dollars, cents = self._convert_cents_to_dollars_if_possible()
-        self.__dict__['dollars'] = dollars + self.dollars
-        self.__dict__['cents'] = cents
+    def __init__(self, dollars: int, cents: int = 0) -> None:
+        _set_cents(self, dollars * 100 + cents)
 
-    def _convert_cents_to_dollars_if_possible(self) -> Tuple[int, int]:
-        cents_in_dollars = self.cents // 100
-        dollars = 0 if cents_in_dollars < 0 else cents_in_dollars
-        return dollars, self.cents - dollars * 100
+    @classmethod
+    def from_cents(cls, total_cents: int) -> 'Amount':
+        return _from_cents(total_cents)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise FrozenInstanceError(f"cannot assign to field '{name}'")
+
+    def __delattr__(self, name: str) -> None:
+        raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+    def __reduce__(self) -> Tuple[Any, Tuple[int]]:
+        return _from_cents, (self._cents,)
+
+    @property
+    def dollars(self) -> int:
+        return self._cents // 100
+
+    @property
+    def cents(self) -> int:
+        return self._cents % 100
+
+    def __repr__(self) -> str:
+        return f'Amount(dollars={self.dollars}, cents={self.cents})'
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not Amount:
+            return NotImplemented
+        return self._cents == other._cents  # type: ignore
+
+    def __hash__(self) -> int:
+        return hash(self._cents)
 
     def __add__(self, other: 'Amount') -> 'Amount':
-        return Amount(self.dollars + other.dollars, self.cents + other.cents)
+        return _from_cents(self._cents + other._cents)
+
+    def __sub__(self, other: 'Amount') -> 'Amount':
+        return _from_cents(self._cents - other._cents)
+
+    def __neg__(self) -> 'Amount':
+        return _from_cents(-self._cents)
 
     def __gt__(self, other: 'Amount') -> bool:
-        if self.dollars != other.dollars:
-            return self.dollars > other.dollars
-        return self.cents > other.cents
+        return self._cents > other._cents
 
     def __ge__(self, other: 'Amount') -> bool:
-        if self.dollars > other.dollars:
-            return True
-        elif self.dollars == other.dollars:
-            if self.cents >= other.cents:
-                return True
-        return False
+        return self._cents >= other._cents
 
-    def __sub__(self, other: 'Amount') -> 'Amount':
-        return Amount(self.dollars - other.dollars, self.cents - other.cents)
+    def __lt__(self, other: 'Amount') -> bool:
+        return self._cents < other._cents
 
-    def __neg__(self) -> 'Amount':
-        return Amount(-self.dollars, -self.cents)
+    def __le__(self, other: 'Amount') -> bool:
+        return self._cents <= other._cents
 
     @property
     def total_dollars(self) -> float:
-        return self.dollars + self.cents / 100
+        return self._cents / 100
 
     @property
     def total_cents(self) -> int:
-        return self.dollars * 100 + self.cents
-
-    def _get_2_after_decimal(self, num: float) -> int:
-        return int(str(round(num, 2)).split('.')[-1])
+        return self._cents
 
-    def _cents_and_dollars_from_float(self, dollars: float) -> Tuple[int, int]:
-        float_cent_divided_by_10, float_dollars = math.modf(dollars)
-        return int(float_cent_divided_by_10 * 100), int(float_dollars)
+    def divide(self, parts: int, rounding: str = ROUND_HALF_EVEN) -> 'Amount':
+        """
+        The amount divided into `parts`, rounded to a cent by one of the rounding modes of `decimal`.
+        """
+        if parts == 0:
+            raise ZeroDivisionError('Amount divided into 0 parts')
+        return _from_cents(divide_rounded(self._cents, parts, rounding))
 
     def __truediv__(self, other: 'Amount') -> 'Amount':
+        """
+        An amount that is lower than `other` is returned as is. A divider without dollars divides the amount
+        by its cents, and the cents are truncated, otherwise it's the ratio of the amounts as dollars,
+        rounded to a cent half to even.
+        """
         if other > self:
             return self
-
+        if not other._cents:
+            raise ZeroDivisionError('Amount divided by zero')
         if self.dollars == 0:
-            return Amount(0, int(self.cents / other.cents))
-
+            return _from_cents(divide_rounded(self.cents, other.cents, ROUND_DOWN))
         if other.dollars == 0:
-            result = (self.total_cents / other.total_cents) / 100
-            cents, dollars = self._cents_and_dollars_from_float(result)
-            return Amount(dollars, cents)
+            return _from_cents(divide_rounded(self._cents, other._cents, ROUND_DOWN))
+        return _from_cents(divide_rounded(self._cents * 100, other._cents, ROUND_HALF_EVEN))
+
+
+# The slot is filled through its descriptor, `__setattr__` is the one that refuses changes
+_set_cents = Amount._cents.__set__  # type: ignore
+_new = object.__new__
+
 
-        result = self.total_dollars / other.total_dollars
-        cents_unprocessed, dollars = math.modf(result)  # type: ignore
-        return Amount(int(dollars), self._get_2_after_decimal(cents_unprocessed))
+def _from_cents(total_cents: int) -> Amount:
+    amount = _new(Amount)
+    _set_cents(amount, total_cents)
+    return amount
@@ -0,0 +1,38 @@
+"""
+Folds the credits and debits of an account into the change of its balance out of columns of their dollars,
+cents and signs, instead of adding an `Amount` for every event. With numpy installed the columns are summed as
+int64 arrays, otherwise as python ints, both give the same total.
+"""
+from typing import Any, Sequence
+
+try:
+    import numpy  # type: ignore
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# Below this many events the conversion of the columns to arrays takes longer than summing them as python ints
+NUMPY_MIN_EVENTS = 256
+
+
+def fold_cents(dollars: Sequence[int], cents: Sequence[int], signs: Sequence[int]) -> int:
+    """
+    The sum of `sign * (dollars * 100 + cents)` of all the events, the columns are of the same length.
+    """
+    if numpy is not None and len(dollars) >= NUMPY_MIN_EVENTS:
+        total = _numpy_fold(dollars, cents, signs)
+        if total is not None:
+            return total
+    return sum(sign * (dollar * 100 + cent) for dollar, cent, sign in zip(dollars, cents, signs))
+
+
+def _numpy_fold(dollars: Sequence[int], cents: Sequence[int], signs: Sequence[int]) -> Any:
+    # int64 wraps around silently, amounts that could overflow the sum are left to python ints
+    limit = (1 << 62) // (100 * len(dollars))
+    try:
+        dollar_column = numpy.asarray(dollars, dtype=numpy.int64)
+        cent_column = numpy.asarray(cents, dtype=numpy.int64)
+    except OverflowError:
+        return None
+    if numpy.abs(dollar_column).max() >= limit or numpy.abs(cent_column).max() >= limit:
+        return None
+    return int(numpy.dot(dollar_column * 100 + cent_column, numpy.asarray(signs, dtype=numpy.int64)))
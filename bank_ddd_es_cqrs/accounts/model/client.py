@@ -1,9 +1,9 @@
-from typing import List
+from typing import List, Dict, Any, Tuple
 from .first_last_name import FirstName, LastName
 from .social_security_number import SocialSecurityNumber
 from .birthdate import Birthdate
 from .events import ClientCreated, AccountAddedToClient, AccountRemovedFromClient
-from bank_ddd_es_cqrs.shared.model import AggregateRoot, UniqueID, EventStream
+from bank_ddd_es_cqrs.shared.model import AggregateRoot, UniqueID, EventStream, applies
 
 
 class Client(AggregateRoot):
@@ -22,22 +22,42 @@ class Client(AggregateRoot):
         client._initialize([created_event])
         return client
 
-    @AggregateRoot.apply.register
-    def _(self, event: ClientCreated) -> None:
+    @applies
+    def _apply_created(self, event: ClientCreated) -> None:
         self._client_id: UniqueID = UniqueID(event.client_id)
         self._ssn: SocialSecurityNumber = SocialSecurityNumber(event.ssn)
         self._first_name: FirstName = FirstName(event.first_name)
         self._last_name: LastName = LastName(event.last_name)
         self._birthdate: Birthdate = Birthdate(event.birthdate)
-        self._accounts: List[UniqueID] = []
+        # Ids of the accounts as a dict without values, ordered by when they were added and looked up by hash,
+        # clients can have thousands of accounts that are replayed without creating a `UniqueID` for each
+        self._accounts: Dict[str, None] = {}
 
-    @AggregateRoot.apply.register  # type: ignore
-    def _(self, event: AccountAddedToClient) -> None:
-        self._accounts.append(UniqueID(event.account_id))
+    @applies
+    def _apply_account_added(self, event: AccountAddedToClient) -> None:
+        self._accounts[event.account_id] = None
 
-    @AggregateRoot.apply.register  # type: ignore
-    def _(self, event: AccountRemovedFromClient) -> None:
-        self._accounts.remove(UniqueID(event.account_id))
+    @applies
+    def _apply_account_removed(self, event: AccountRemovedFromClient) -> None:
+        del self._accounts[event.account_id]
+
+    def _snapshot_state(self) -> Dict[str, Any]:
+        return {
+            'client_id': self._client_id.value,
+            'ssn': self._ssn.value,
+            'first_name': self._first_name.value,
+            'last_name': self._last_name.value,
+            'birthdate': self._birthdate.value,
+            'accounts': list(self._accounts)
+        }
+
+    def _restore_snapshot_state(self, state: Dict[str, Any]) -> None:
+        self._client_id = UniqueID(state['client_id'])
+        self._ssn = SocialSecurityNumber(state['ssn'])
+        self._first_name = FirstName(state['first_name'])
+        self._last_name = LastName(state['last_name'])
+        self._birthdate = Birthdate(state['birthdate'])
+        self._accounts = dict.fromkeys(state['accounts'])
 
     @property
     def client_id(self) -> UniqueID:
@@ -61,7 +81,10 @@ class Client(AggregateRoot):
 
     @property
     def accounts(self) -> List[UniqueID]:
-        return self._accounts
+        return [UniqueID(account_id) for account_id in self._accounts]
+
+    def has_account(self, account_id: UniqueID) -> bool:
+        return account_id.value in self._accounts
 
     def add_account(self, account_id: UniqueID, operation_id: UniqueID, account_name: str) -> None:
         self.apply_event(AccountAddedToClient(
@@ -72,10 +95,49 @@ class Client(AggregateRoot):
         ))
 
     def remove_account(self, account_id: UniqueID, operation_id: UniqueID) -> None:
-        if account_id not in self.accounts:
+        if not self.has_account(account_id):
             raise ValueError(f'Account {account_id} is not connected to in client {self.client_id}')
         self.apply_event(AccountRemovedFromClient(
             client_id=self.client_id.value,
             account_id=account_id.value,
             operation_id=operation_id.value
         ))
+
+    def add_accounts(self, accounts: List[Tuple[UniqueID, str]], operation_id: UniqueID) -> None:
+        """
+        Add the accounts, pairs of their ids and names, in one operation. Nothing is added when one of them
+        is already connected to the client or comes twice.
+        """
+        account_ids = [account_id.value for account_id, _ in accounts]
+        connected = [account_id for account_id in account_ids if account_id in self._accounts]
+        if connected:
+            raise ValueError(f'Accounts {", ".join(connected)} are already connected to client {self.client_id}')
+        if len(set(account_ids)) != len(account_ids):
+            raise ValueError('An account can only be added once in an operation')
+        self.apply_new_events([
+            AccountAddedToClient(
+                client_id=self.client_id.value,
+                account_id=account_id.value,
+                operation_id=operation_id.value,
+                account_name=account_name
+            ) for account_id, account_name in accounts
+        ])
+
+    def remove_accounts(self, account_ids: List[UniqueID], operation_id: UniqueID) -> None:
+        """
+        Remove the accounts in one operation. Nothing is removed when one of them is not connected to the client
+        or comes twice.
+        """
+        values = [account_id.value for account_id in account_ids]
+        missing = [account_id for account_id in values if account_id not in self._accounts]
+        if missing:
+            raise ValueError(f'Accounts {", ".join(missing)} are not connected to client {self.client_id}')
+        if len(set(values)) != len(values):
+            raise ValueError('An account can only be removed once in an operation')
+        self.apply_new_events([
+            AccountRemovedFromClient(
+                client_id=self.client_id.value,
+                account_id=account_id,
+                operation_id=operation_id.value
+            ) for account_id in values
+        ])
@@ -2,35 +2,35 @@ import attr
 from bank_ddd_es_cqrs.shared.model import BaseEvent
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AccountCreated(BaseEvent):
     client_id: str = attr.ib(kw_only=True)
     account_id: str = attr.ib(kw_only=True)
     account_name: str = attr.ib(kw_only=True)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AccountCredited(BaseEvent):
     dollars: int = attr.ib(kw_only=True)
     cents: int = attr.ib(kw_only=True)
     account_id: str = attr.ib(kw_only=True)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AccountDebited(BaseEvent):
     dollars: int = attr.ib(kw_only=True)
     cents: int = attr.ib(kw_only=True)
     account_id: str = attr.ib(kw_only=True)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AccountMaximumDebtChanged(BaseEvent):
     account_id: str = attr.ib(kw_only=True)
     dollars: int = attr.ib(kw_only=True)
     cents: int = attr.ib(kw_only=True)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class TransactionCreated(BaseEvent):
     transaction_id: str = attr.ib(kw_only=True)
     account_id_from: str = attr.ib(kw_only=True)
@@ -39,12 +39,12 @@ class TransactionCreated(BaseEvent):
     cents: int = attr.ib(kw_only=True)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class TransactionCompleted(BaseEvent):
     transaction_id: str = attr.ib(kw_only=True)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class ClientCreated(BaseEvent):
     client_id: str = attr.ib(kw_only=True)
     ssn: int = attr.ib(kw_only=True)
@@ -53,14 +53,14 @@ class ClientCreated(BaseEvent):
     birthdate: str = attr.ib(kw_only=True)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AccountAddedToClient(BaseEvent):
     client_id: str = attr.ib(kw_only=True)
     account_id: str = attr.ib(kw_only=True)
     account_name: str = attr.ib(kw_only=True)
 
 
-@attr.s(frozen=True)
+@attr.s(frozen=True, slots=True)
 class AccountRemovedFromClient(BaseEvent):
     client_id: str = attr.ib(kw_only=True)
     account_id: str = attr.ib(kw_only=True)
@@ -1,3 +1,4 @@
 from .account import credit_account, debit_account, change_maximum_debt, create_account
-from .client import create_client, add_account_to_client, remove_account_from_client
+from .client import create_client, add_account_to_client, remove_account_from_client, add_accounts_to_client, \
+    remove_accounts_from_client
 from .dto import AmountDTO, ClientDetailsDTO
@@ -1,3 +1,4 @@
+from typing import List
 from .dto import ClientDetailsDTO
 from bank_ddd_es_cqrs.shared.model import UniqueID
 from ..model import Client, ClientWriteRepository, FirstName, LastName, SocialSecurityNumber, Birthdate
@@ -33,3 +34,19 @@ def remove_account_from_client(operation_id: UniqueID, client_id: UniqueID, acco
     client = repo.get_by_id(client_id)
     client.remove_account(account_id, operation_id)
     repo.save(client)
+
+
+def add_accounts_to_client(operation_id: UniqueID, client_id: UniqueID, repo: ClientWriteRepository,
+                           new_account_names: List[str]) -> List[UniqueID]:
+    client = repo.get_by_id(client_id)
+    new_account_ids = [UniqueID() for _ in new_account_names]
+    client.add_accounts(list(zip(new_account_ids, new_account_names)), operation_id)
+    repo.save(client)
+    return new_account_ids
+
+
+def remove_accounts_from_client(operation_id: UniqueID, client_id: UniqueID, account_ids: List[UniqueID],
+                                repo: ClientWriteRepository) -> None:
+    client = repo.get_by_id(client_id)
+    client.remove_accounts(account_ids, operation_id)
+    repo.save(client)
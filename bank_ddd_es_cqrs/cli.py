@@ -3,14 +3,67 @@ import sys
 import click
 
 
-@click.command()
-def main(args=None):
+@click.group(invoke_without_command=True)
+@click.pass_context
+def main(ctx: click.Context, args: None = None) -> int:
     """Console script for bank_ddd_es_cqrs."""
-    click.echo("Replace this message by putting your code into "
-               "bank_ddd_es_cqrs.cli.main")
-    click.echo("See click documentation at https://click.palletsprojects.com/")
+    if ctx.invoked_subcommand is None:
+        click.echo("Replace this message by putting your code into "
+                   "bank_ddd_es_cqrs.cli.main")
+        click.echo("See click documentation at https://click.palletsprojects.com/")
     return 0
 
 
+@main.command('backfill-snapshots')
+@click.option('--batch-size', default=500, help='Amount of aggregates to snapshot in each transaction')
+def backfill_snapshots(batch_size: int) -> None:
+    """Build snapshots for existing streams according to the snapshot policies."""
+    from bank_ddd_es_cqrs.accounts.composition_root import backfill_snapshots as backfill
+    for aggregate_name, taken in backfill(batch_size).items():
+        click.echo(f'{aggregate_name}: {taken} snapshots taken')
+
+
+@main.command('migrate-events')
+def migrate_events() -> None:
+    """Add the columns the events table of a database created before them is missing, needed before anything else."""
+    from bank_ddd_es_cqrs.accounts.composition_root import migrate_events_table
+    added = migrate_events_table()
+    click.echo(f'{len(added)} columns added' + (f': {", ".join(added)}' if added else ''))
+
+
+@main.command('upcast-events')
+@click.option('--batch-size', default=1000, help='Amount of events to read in each transaction')
+def upcast_events(batch_size: int) -> None:
+    """Rewrite stored events of older versions with their upcasted data."""
+    from bank_ddd_es_cqrs.accounts.composition_root import upcast_events as upcast
+    click.echo(f'{upcast(batch_size)} events rewritten')
+
+
+@main.command('backfill-operations')
+@click.option('--batch-size', default=1000, help='Amount of events to read in each transaction')
+def backfill_operations(batch_size: int) -> None:
+    """Index the operations of stored events, needed before ACCOUNTS_OPERATION_WINDOW is set."""
+    from bank_ddd_es_cqrs.accounts.composition_root import backfill_operations as backfill
+    click.echo(f'{backfill(batch_size)} operations indexed')
+
+
+@main.command('migrate-uuids')
+def migrate_uuids() -> None:
+    """Convert the id columns of the event store from VARCHAR(36) to the 16 bytes UUID type of postgres."""
+    from bank_ddd_es_cqrs.accounts.composition_root import migrate_uuid_columns
+    converted = migrate_uuid_columns()
+    click.echo(f'{len(converted)} columns converted' + (f': {", ".join(converted)}' if converted else ''))
+
+
+@main.command('rebalance-shards')
+@click.option('--previous', required=True,
+              help='Shard map the streams were saved with, name=url,name=url, urls of current shards may be left out')
+def rebalance_shards(previous: str) -> None:
+    """Move the streams to their shards by the current shard map of ACCOUNTS_SHARDS."""
+    from bank_ddd_es_cqrs.accounts.composition_root import rebalance_shards as rebalance
+    previous_shards = {name: url for name, _, url in (entry.partition('=') for entry in previous.split(','))}
+    click.echo(f'{rebalance(previous_shards)} streams moved')
+
+
 if __name__ == "__main__":
     sys.exit(main())  # pragma: no cover
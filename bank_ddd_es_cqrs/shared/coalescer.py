@@ -0,0 +1,124 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, ContextManager, Dict, List, Optional, Any, Tuple
+from .metrics import Metrics, metrics as process_metrics
+from .model import AggregateRoot, UniqueID, OperationDuplicate
+from .model.repo import WriteRepository, SingleAggregateRepository
+from .retry import RetryingCommandExecutor
+
+Command = Callable[[WriteRepository[Any]], Any]
+# The operation id, the command and the future its caller waits on
+Pending = Tuple[str, Command, 'Future[Any]']
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.commands: List[Pending] = []
+        self.full = threading.Event()
+
+
+class CommandCoalescer:
+    """
+    Runs the commands that arrive for the same aggregate within `window` seconds of each other as one batch:
+    the aggregate is loaded once, the commands run on it in the order they arrived and the events of all of
+    them are saved together.
+
+    The first command of a batch is run by its caller, who waits for the window to close, the callers of the
+    commands that join it wait for their result. A command that fails, like a debit that breaks an invariant,
+    fails only for its caller, the commands before and after it are saved.
+    """
+
+    def __init__(self, name: str, open_repository: Callable[[], ContextManager[WriteRepository[Any]]],
+                 window: float = 0.002, max_batch_size: int = 100,
+                 executor: Optional[RetryingCommandExecutor] = None, metrics: Metrics = process_metrics) -> None:
+        """
+        :param open_repository: opens the repository a batch is loaded from and saved to, it commits on exit.
+        :param executor: runs the whole batch again, from loading the aggregate, when saving it conflicts.
+        """
+        if max_batch_size < 1:
+            raise ValueError('Batches must hold at least one command')
+        self.name = name
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._open_repository = open_repository
+        self._executor = executor
+        self._metrics = metrics
+        self._lock = threading.Lock()
+        self._open: Dict[str, _Batch] = {}
+
+    def execute(self, aggregate_id: UniqueID, operation_id: UniqueID, command: Command) -> Any:
+        """
+        Run `command` with a repository that returns the aggregate of the batch, returns what the command
+        returns or raises what it raises.
+        """
+        key = str(aggregate_id)
+        future: 'Future[Any]' = Future()
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if batch is None:
+                batch = self._open[key] = _Batch()
+            batch.commands.append((str(operation_id), command, future))
+            if len(batch.commands) >= self.max_batch_size:
+                del self._open[key]
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            self._run(aggregate_id, batch.commands)
+        return future.result()
+
+    def _run(self, aggregate_id: UniqueID, commands: List[Pending]) -> None:
+        self._metrics.increment(f'coalescer.{self.name}.batches')
+        self._metrics.increment(f'coalescer.{self.name}.commands', len(commands))
+        try:
+            if self._executor:
+                results = self._executor.execute(lambda: self._run_once(aggregate_id, commands))
+            else:
+                results = self._run_once(aggregate_id, commands)
+        except BaseException as e:
+            for _, _, future in commands:
+                future.set_exception(e)
+            return
+        for (_, _, future), (result, error) in zip(commands, results):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _run_once(self, aggregate_id: UniqueID, commands: List[Pending]) -> List[Tuple[Any, Optional[BaseException]]]:
+        results: List[Tuple[Any, Optional[BaseException]]] = []
+        with self._open_repository() as repository:
+            aggregate_root = repository.get_by_id(aggregate_id)
+            batch_repository = SingleAggregateRepository(aggregate_id, aggregate_root)
+            operations = set()
+            for operation_id, command, _ in commands:
+                if operation_id in operations:
+                    results.append((None, OperationDuplicate()))
+                    continue
+                applied = len(aggregate_root.uncommitted_changes)
+                try:
+                    results.append((command(batch_repository), None))
+                    operations.add(operation_id)
+                except Exception as e:
+                    if len(aggregate_root.uncommitted_changes) != applied:
+                        # The command failed after changing the aggregate, it is rebuilt without its changes
+                        aggregate_root = self._rebuild(repository, aggregate_id, aggregate_root, applied)
+                        batch_repository = SingleAggregateRepository(aggregate_id, aggregate_root)
+                    results.append((None, e))
+            if aggregate_root.uncommitted_changes:
+                repository.save(aggregate_root)
+        return results
+
+    @staticmethod
+    def _rebuild(repository: WriteRepository[Any], aggregate_id: UniqueID, aggregate_root: AggregateRoot,
+                 applied: int) -> AggregateRoot:
+        changes = aggregate_root.uncommitted_changes[:applied]
+        rebuilt = repository.get_by_id(aggregate_id)
+        if rebuilt is aggregate_root or rebuilt.version != aggregate_root.version:
+            raise RuntimeError(f'Could not rebuild aggregate {aggregate_id} after a failed command')
+        for event in changes:
+            rebuilt.apply_event(event)
+        return rebuilt
@@ -0,0 +1,38 @@
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, DefaultDict
+
+
+class Metrics:
+    """
+    Counters and gauges of the process. A counter only goes up, a gauge is read from its function
+    every time the metrics are read.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: DefaultDict[str, int] = defaultdict(int)
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def register_gauge(self, name: str, read: Callable[[], float]) -> None:
+        with self._lock:
+            self._gauges[name] = read
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters[name]
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            values: Dict[str, float] = dict(self._counters)
+            gauges = dict(self._gauges)
+        for name, read in gauges.items():
+            values[name] = read()
+        return values
+
+
+metrics = Metrics()
@@ -1,7 +1,9 @@
 from .event import BaseEvent
-from .entity import AggregateRoot, OperationDuplicate
+from .entity import AggregateRoot, OperationDuplicate, applies
 from .unique_id import UniqueID
-from .event_stream import EventStream
+from .snapshot import Snapshot, SnapshotPolicy
+from .operations import OperationLog, UnboundedOperationLog, BoundedOperationLog, OperationIndex
+from .event_stream import EventStream, LazyEventStream, RecordedEvent
 from .exception import AppException
 from .status_code import StatusCodes
 from .event_manager import EventManager
@@ -1,52 +1,190 @@
-from functools import singledispatchmethod
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Any, Union, Callable, Iterable, Type, TypeVar, get_type_hints
 from .event import BaseEvent
-from .event_stream import EventStream
+from .event_stream import EventStream, LazyEventStream
+from .snapshot import Snapshot
+from .operations import OperationLog, UnboundedOperationLog, OperationIndex
+from .exception import AppException
+from .status_code import StatusCodes
 
 
-class OperationDuplicate(Exception):
+class OperationDuplicate(AppException):
     def __init__(self) -> None:
-        super(OperationDuplicate, self).__init__('Operation has already been performed')
+        super(OperationDuplicate, self).__init__(
+            'Operation has already been performed', StatusCodes.CONFLICT_WITH_CURRENT_STATE.value
+        )
+
+
+Applier = Callable[[Any, BaseEvent], None]
+A = TypeVar('A', bound=Callable[..., None])
+
+
+def applies(method: A) -> A:
+    """
+    Marks a method of an aggregate as the one that applies the events of the class its `event` argument
+    is annotated with, like `register` of `singledispatchmethod` does.
+    """
+    hints = get_type_hints(method)
+    event_class = hints.get('event')
+    if not isinstance(event_class, type) or not issubclass(event_class, BaseEvent):
+        raise TypeError(f'{method.__qualname__} must annotate its `event` argument with the class of the event')
+    method._applies = event_class  # type: ignore
+    return method
 
 
 class AggregateRoot:
-    def __init__(self, stream: Optional[EventStream] = None) -> None:
+    # Creates the log of the committed operations of every aggregate that isn't passed one
+    operation_log_factory: Callable[[], OperationLog] = UnboundedOperationLog
+    # The methods marked by `applies` by the class of the event, built for every aggregate class when it's defined
+    _appliers: Dict[Type[BaseEvent], Applier] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)  # type: ignore
+        appliers: Dict[Type[BaseEvent], Applier] = {}
+        # The classes further down the MRO come first, so the method of a subclass replaces the one it overrides
+        for klass in reversed(cls.__mro__):
+            for method in vars(klass).values():
+                event_class = getattr(method, '_applies', None)
+                if event_class is not None:
+                    appliers[event_class] = method
+        cls._appliers = appliers
+
+    @classmethod
+    def _applier(cls, event_class: Type[BaseEvent]) -> Optional[Applier]:
+        """
+        The method that applies a subclass of an event with a method of its own, it's added to the table
+        the first time the subclass is applied.
+        """
+        for klass in event_class.__mro__[1:]:
+            applier = cls._appliers.get(klass)
+            if applier is not None:
+                cls._appliers[event_class] = applier
+                return applier
+        return None
+
+    def __init__(self, stream: Optional[Union[EventStream, LazyEventStream]] = None,
+                 operations: Optional[OperationLog] = None) -> None:
         """
         Just a note here, sadly, we cannot avoid inserting the `version` logic into the aggregate root
         although it being an infrastructure detail to protect from concurrency problems (optimistic locking).
+        The same goes for `stream_version`, the number of committed events the aggregate was built from,
+        which is needed to know when to take snapshots and which events come after one.
         """
         self._version = -1  # Indicates its a new entity
-        self._operations: Dict[str, bool] = {}
+        self._stream_version = 0
+        self._operations: OperationLog = operations if operations is not None else type(self).operation_log_factory()
         if stream:
             self._version = stream.version
-            for event in stream.events:
-                self.apply_event(event, False)
+            if stream.snapshot:
+                self._restore_snapshot(stream.snapshot)
+            self.apply_events(stream.events)
         self._changes: List[BaseEvent] = []
 
     def _initialize(self, events: List[BaseEvent]) -> None:
         self._changes = events
+        self._stream_version -= len(events)
 
     def apply_event(self, event: BaseEvent, is_new: bool = True) -> None:
-        self.apply(event)  # type: ignore
+        # Checked before applying, a duplicate must leave the state of the aggregate as it was
+        if is_new and self._operation_in_committed_operations(event.operation_id):
+            raise OperationDuplicate()
+        self._dispatch(event)
         if is_new:
-            if self._operation_in_committed_operations(event.operation_id):
-                raise OperationDuplicate()
             self._changes.append(event)
         else:
             self._add_operation_id_to_committed(event)
+            self._stream_version += 1
+
+    def apply_new_events(self, events: List[BaseEvent]) -> None:
+        """
+        Apply new events, same as `apply_event` of every event, but every operation is checked once and before
+        any of the events is applied, so a duplicate leaves the state of the aggregate as it was.
+        """
+        for operation_id in dict.fromkeys(event.operation_id for event in events):
+            if self._operation_in_committed_operations(operation_id):
+                raise OperationDuplicate()
+        for event in events:
+            self._dispatch(event)
+        self._changes.extend(events)
+
+    def _dispatch(self, event: BaseEvent) -> None:
+        applier = self._appliers.get(event.__class__) or self._applier(event.__class__)
+        if applier is None:
+            self.apply(event)
+        else:
+            applier(self, event)
+
+    def apply_events(self, events: Iterable[BaseEvent]) -> None:
+        """
+        Apply committed events, same as `apply_event` of every event with `is_new` set to `False`, but the table
+        of the methods and the log of the operations are looked up once for all of them.
+        """
+        appliers = self._appliers
+        apply = self.apply
+        add_operation = self._operations.add
+        applied = 0
+        for event in events:
+            applier = appliers.get(event.__class__) or self._applier(event.__class__)
+            if applier is None:
+                apply(event)
+            else:
+                applier(self, event)
+            add_operation(event.operation_id)
+            applied += 1
+        self._stream_version += applied
 
     def _operation_in_committed_operations(self, operation_id: str) -> bool:
         return operation_id in self.committed_operations
 
     def _add_operation_id_to_committed(self, event: BaseEvent) -> None:
-        self._operations[event.operation_id] = True
+        self._operations.add(event.operation_id)
+
+    def bind_operation_index(self, index: Optional[OperationIndex]) -> None:
+        """
+        Where the operations that the log of the aggregate doesn't remember are looked up, bound by the repository
+        every time it hands out the aggregate.
+        """
+        self._operations.bind_index(index)
 
-    @singledispatchmethod
     def apply(self, event: BaseEvent) -> None:
+        """
+        Applies the events that no method marked by `applies` takes.
+        """
         # TODO: I've tried to use here the ABCMeta and abstractmethod decorator, but it throws exceptions, maybe
         #  I should try it again later and figure out how to remove the errors
         raise NotImplementedError("Not implementation of `apply` available")
 
+    def snapshot(self) -> Snapshot:
+        """
+        Snapshot of the committed state, uncommitted changes are not part of it.
+        """
+        if self._changes:
+            raise ValueError('Cannot snapshot an aggregate with uncommitted changes')
+        return Snapshot(
+            state={'operations': self._operations.snapshot(), **self._snapshot_state()},
+            stream_version=self._stream_version
+        )
+
+    def _restore_snapshot(self, snapshot: Snapshot) -> None:
+        self._operations.restore(snapshot.state['operations'])
+        self._stream_version = snapshot.stream_version
+        self._restore_snapshot_state(snapshot.state)
+
+    def catch_up(self, stream: EventStream) -> None:
+        """
+        Apply the committed events that came after the ones the aggregate was built from, `stream` is expected
+        to hold only the events after `stream_version`. The aggregate takes the version of the stream.
+        """
+        if self._changes:
+            raise ValueError('Cannot catch up an aggregate with uncommitted changes')
+        self.apply_events(stream.events)
+        self._version = stream.version
+
+    def _snapshot_state(self) -> Dict[str, Any]:
+        raise NotImplementedError("Not implementation of `_snapshot_state` available")
+
+    def _restore_snapshot_state(self, state: Dict[str, Any]) -> None:
+        raise NotImplementedError("Not implementation of `_restore_snapshot_state` available")
+
     @property
     def uncommitted_changes(self) -> List[BaseEvent]:
         return self._changes
@@ -55,11 +193,20 @@ class AggregateRoot:
     def version(self) -> int:
         return self._version
 
+    @property
+    def stream_version(self) -> int:
+        return self._stream_version
+
     def mark_changes_as_committed(self) -> None:
+        """
+        The version moves the same way it does in the event store, by the number of events that were committed.
+        """
         for event in self.uncommitted_changes:
             self._add_operation_id_to_committed(event)
+        self._version = max(self._version, 0) + len(self._changes)
+        self._stream_version += len(self._changes)
         self._changes.clear()
 
     @property
-    def committed_operations(self) -> Dict[str, bool]:
+    def committed_operations(self) -> OperationLog:
         return self._operations
@@ -7,7 +7,7 @@ import attr
 #    that there is non default parameters after default parameter.
 
 
-@attr.s(kw_only=True, frozen=True)
+@attr.s(kw_only=True, frozen=True, slots=True)
 class BaseEvent:
     operation_id: str = attr.ib()
     version: int = attr.ib(default=1)
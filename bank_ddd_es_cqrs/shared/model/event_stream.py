@@ -1,5 +1,6 @@
-from typing import List
+from typing import List, Optional, Iterator
 from .event import BaseEvent
+from .snapshot import Snapshot
 from dataclasses import dataclass, field
 
 
@@ -7,4 +8,27 @@ from dataclasses import dataclass, field
 class EventStream:
     events: List[BaseEvent]
     version: int = field(default=-1)
+    snapshot: Optional[Snapshot] = field(default=None)
 
+
+@dataclass(frozen=True)
+class LazyEventStream:
+    """
+    Same as `EventStream`, but the events are read only while iterating over them, so the whole stream
+    is never held in memory. The events can be iterated over only once.
+    """
+    events: Iterator[BaseEvent]
+    version: int = field(default=-1)
+    snapshot: Optional[Snapshot] = field(default=None)
+
+
+@dataclass(frozen=True)
+class RecordedEvent:
+    """
+    An event as it was recorded in the event store, together with its place in its own stream (`sequence`)
+    and across all the streams (`position`).
+    """
+    position: int
+    aggregate_id: str
+    sequence: int
+    event: BaseEvent
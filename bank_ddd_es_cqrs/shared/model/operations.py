@@ -0,0 +1,165 @@
+import base64
+import hashlib
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Set
+
+# Tells if the aggregate has committed an operation, by the persistent index of the event store
+OperationIndex = Callable[[str], bool]
+
+
+class OperationLog:
+    """
+    The operations an aggregate has committed, to reject an operation that is performed again.
+    """
+
+    def __contains__(self, operation_id: object) -> bool:
+        raise NotImplementedError("Not implementation of `__contains__` available")
+
+    def add(self, operation_id: str) -> None:
+        raise NotImplementedError("Not implementation of `add` available")
+
+    def add_all(self, operation_ids: Iterable[str]) -> None:
+        for operation_id in operation_ids:
+            self.add(operation_id)
+
+    def bind_index(self, index: Optional[OperationIndex]) -> None:
+        """
+        Logs that don't remember every operation ask `index` about the ones they can't tell.
+        """
+        pass
+
+    def snapshot(self) -> Any:
+        raise NotImplementedError("Not implementation of `snapshot` available")
+
+    def restore(self, state: Any) -> None:
+        raise NotImplementedError("Not implementation of `restore` available")
+
+
+class UnboundedOperationLog(Dict[str, bool], OperationLog):
+    """
+    Remembers every operation id, so it grows with the stream.
+    """
+
+    def __contains__(self, operation_id: object) -> bool:
+        return dict.__contains__(self, operation_id)
+
+    def add(self, operation_id: str) -> None:
+        self[operation_id] = True
+
+    def add_all(self, operation_ids: Iterable[str]) -> None:
+        self.update(dict.fromkeys(operation_ids, True))
+
+    def snapshot(self) -> Any:
+        return list(self)
+
+    def restore(self, state: Any) -> None:
+        self.clear()
+        self.update(dict.fromkeys(UnboundedOperationLog._operation_ids(state), True))
+
+    @staticmethod
+    def _operation_ids(state: Any) -> Any:
+        # Snapshots of `BoundedOperationLog` only have its window, as uuids, the operations before it are lost
+        if isinstance(state, list):
+            return state
+        return [f'{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}' for h in state['window']]
+
+
+def compact_operation_id(operation_id: str) -> bytes:
+    """
+    The 16 bytes of an operation id in the canonical uuid format, the md5 of any other id.
+    """
+    if len(operation_id) == 36 and operation_id.count('-') == 4:
+        try:
+            return bytes.fromhex(operation_id.replace('-', ''))
+        except ValueError:
+            pass
+    return hashlib.md5(operation_id.encode('utf-8')).digest()
+
+
+class BoundedOperationLog(OperationLog):
+    """
+    Remembers the last `window` operation ids as 16 bytes each, and every id it ever saw in a bloom filter of
+    `bloom_bits` bits. An id that is not in the window and that the filter may have seen, is either an old
+    operation or a false positive of the filter, only then the bound index is asked.
+    Without an index such an id is taken as a new operation.
+    """
+
+    # Bits of the id the hashes start at, around the bytes 6 and 8 that hold the version and variant of uuids
+    HASH_OFFSETS = (0, 24, 72, 96)
+    MAX_BLOOM_BITS = 1 << 24
+
+    def __init__(self, window: int = 1000, bloom_bits: int = 1 << 15) -> None:
+        if window < 1:
+            raise ValueError('Operation log window must hold at least one operation')
+        if bloom_bits < 8 or bloom_bits > self.MAX_BLOOM_BITS or bloom_bits & (bloom_bits - 1):
+            raise ValueError(f'Bloom filter bits must be a power of 2 from 8 to 2 ** 24, got {bloom_bits}')
+        self.window = window
+        self._recent: Deque[bytes] = deque()
+        self._recent_set: Set[bytes] = set()
+        self._bloom = bytearray(bloom_bits // 8)
+        self._mask = bloom_bits - 1
+        self._index: Optional[OperationIndex] = None
+        self.index_lookups = 0
+
+    def _bits(self, compact: bytes) -> Any:
+        # Uuids are random already, their bytes are used as the hashes, as is the md5 of the other ids
+        value = int.from_bytes(compact, 'little')
+        mask = self._mask
+        return [(value >> offset) & mask for offset in self.HASH_OFFSETS]
+
+    def __contains__(self, operation_id: object) -> bool:
+        compact = compact_operation_id(str(operation_id))
+        if compact in self._recent_set:
+            return True
+        bloom = self._bloom
+        if not all(bloom[bit >> 3] & (1 << (bit & 7)) for bit in self._bits(compact)):
+            return False
+        if self._index is None:
+            return False
+        self.index_lookups += 1
+        return self._index(str(operation_id))
+
+    def add(self, operation_id: str) -> None:
+        compact = compact_operation_id(operation_id)
+        bloom = self._bloom
+        for bit in self._bits(compact):
+            bloom[bit >> 3] |= 1 << (bit & 7)
+        if compact in self._recent_set:
+            return
+        self._recent.append(compact)
+        self._recent_set.add(compact)
+        if len(self._recent) > self.window:
+            self._recent_set.discard(self._recent.popleft())
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def bind_index(self, index: Optional[OperationIndex]) -> None:
+        self._index = index
+
+    def snapshot(self) -> Any:
+        return {
+            'window': [compact.hex() for compact in self._recent],
+            'bloom': base64.b64encode(self._bloom).decode('ascii')
+        }
+
+    def restore(self, state: Any) -> None:
+        self._recent.clear()
+        self._recent_set.clear()
+        if isinstance(state, list):
+            # Snapshot of an unbounded log, every id is added to the filter and the last ones to the window
+            self._bloom = bytearray(len(self._bloom))
+            for operation_id in state:
+                self.add(operation_id)
+            return
+        bloom = base64.b64decode(state['bloom'])
+        if len(bloom) == len(self._bloom):
+            self._bloom = bytearray(bloom)
+        else:
+            # Taken with another size of the filter, only the window is kept, the index answers for the rest
+            self._bloom = bytearray(len(self._bloom))
+            self._bloom[:] = b'\xff' * len(self._bloom)
+        for value in state['window'][-self.window:]:
+            compact = bytes.fromhex(value)
+            self._recent.append(compact)
+            self._recent_set.add(compact)
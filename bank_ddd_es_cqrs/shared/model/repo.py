@@ -1,5 +1,5 @@
 from abc import ABCMeta, abstractmethod
-from typing import TypeVar, Generic
+from typing import TypeVar, Generic, List, Sequence
 from .unique_id import UniqueID
 
 T = TypeVar('T')
@@ -13,3 +13,29 @@ class WriteRepository(Generic[T], metaclass=ABCMeta):
     @abstractmethod
     def get_by_id(self, aggregate_id: UniqueID) -> T:
         pass
+
+    @abstractmethod
+    def get_by_ids(self, aggregate_ids: Sequence[UniqueID]) -> List[T]:
+        pass
+
+
+class SingleAggregateRepository(WriteRepository[T]):
+    """
+    Handed to a use case instead of the real repository when the aggregate is already loaded, it returns that
+    aggregate, and saving it only leaves its changes for the caller to save through the real repository.
+    """
+
+    def __init__(self, aggregate_id: UniqueID, aggregate_root: T) -> None:
+        self._aggregate_id = aggregate_id
+        self._aggregate_root = aggregate_root
+
+    def get_by_id(self, aggregate_id: UniqueID) -> T:
+        if aggregate_id != self._aggregate_id:
+            raise ValueError(f'Repository of aggregate {self._aggregate_id} was asked for aggregate {aggregate_id}')
+        return self._aggregate_root
+
+    def get_by_ids(self, aggregate_ids: Sequence[UniqueID]) -> List[T]:
+        return [self.get_by_id(aggregate_id) for aggregate_id in aggregate_ids]
+
+    def save(self, aggregate_root: T) -> T:
+        return aggregate_root
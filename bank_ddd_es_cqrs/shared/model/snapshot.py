@@ -0,0 +1,27 @@
+from typing import Any, Dict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Serialized committed state of an aggregate, taken after the first `stream_version` events of its stream
+    were applied to it.
+    """
+    state: Dict[str, Any]
+    stream_version: int
+
+
+@dataclass(frozen=True)
+class SnapshotPolicy:
+    """
+    Take a snapshot every `every` events of the stream.
+    """
+    every: int
+
+    def __post_init__(self) -> None:
+        if self.every < 1:
+            raise ValueError(f'Snapshot policy must take snapshots every 1 event or more, got {self.every}')
+
+    def should_snapshot(self, previous_stream_version: int, stream_version: int) -> bool:
+        return previous_stream_version // self.every != stream_version // self.every
@@ -0,0 +1,103 @@
+import random
+import threading
+import time
+from typing import Callable, Tuple, Type, TypeVar, Optional
+from .metrics import Metrics, metrics as process_metrics
+
+T = TypeVar('T')
+
+
+class RetryBudget:
+    """
+    Limits the retries to a share of the commands, so conflicts that keep happening don't turn every command
+    into several. Every command adds `ratio` to the balance, up to `capacity`, and every retry takes 1 from it.
+    """
+
+    def __init__(self, ratio: float = 0.2, capacity: float = 10.0) -> None:
+        if ratio < 0 or capacity < 1:
+            raise ValueError('Retry budget ratio must not be negative and its capacity must be at least 1')
+        self.ratio = ratio
+        self.capacity = capacity
+        self._balance = capacity
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+    @property
+    def balance(self) -> float:
+        with self._lock:
+            return self._balance
+
+
+class RetryingCommandExecutor:
+    """
+    Runs a command, a whole load, decide and save, again when it fails with one of `retry_on`, waiting
+    a random time up to an exponentially growing delay before every attempt.
+    The command must be safe to run again, like the use cases that are deduplicated by their operation id.
+    """
+
+    def __init__(self, name: str, retry_on: Tuple[Type[Exception], ...], max_attempts: int = 5,
+                 base_delay: float = 0.01, max_delay: float = 0.5, budget: Optional[RetryBudget] = None,
+                 metrics: Metrics = process_metrics, sleep: Callable[[float], None] = time.sleep,
+                 jitter: Callable[[float, float], float] = random.uniform) -> None:
+        """
+        :param max_attempts: amount of times a command is run at most, the first run included.
+        :param budget: shared by the commands of the executor, a command that failed is not run again once the
+            budget is spent.
+        """
+        if max_attempts < 1:
+            raise ValueError('Commands must be attempted at least once')
+        self.name = name
+        self.retry_on = retry_on
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._metrics = metrics
+        self._sleep = sleep
+        self._jitter = jitter
+        metrics.register_gauge(f'commands.{name}.conflict_rate', self.conflict_rate)
+
+    def conflict_rate(self) -> float:
+        """
+        Share of the attempts that failed with one of `retry_on`.
+        """
+        attempts = self._metrics.counter(f'commands.{self.name}.attempts')
+        return self._metrics.counter(f'commands.{self.name}.conflicts') / attempts if attempts else 0.0
+
+    def delay(self, retry: int) -> float:
+        """
+        Time to wait before retry number `retry`, starting from 1.
+        """
+        return self._jitter(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+    def execute(self, command: Callable[[], T]) -> T:
+        prefix = f'commands.{self.name}'
+        self._metrics.increment(f'{prefix}.executed')
+        if self.budget:
+            self.budget.deposit()
+        attempt = 1
+        while True:
+            self._metrics.increment(f'{prefix}.attempts')
+            try:
+                return command()
+            except self.retry_on:
+                self._metrics.increment(f'{prefix}.conflicts')
+                if attempt == self.max_attempts:
+                    self._metrics.increment(f'{prefix}.retries_exhausted')
+                    raise
+                if self.budget and not self.budget.withdraw():
+                    self._metrics.increment(f'{prefix}.budget_exhausted')
+                    raise
+            self._metrics.increment(f'{prefix}.retries')
+            self._sleep(self.delay(attempt))
+            attempt += 1
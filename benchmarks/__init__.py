@@ -0,0 +1,3 @@
+"""
+Benchmarks, every module can be run on its own - `python -m benchmarks.<module>`
+"""
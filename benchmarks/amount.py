@@ -0,0 +1,99 @@
+"""
+Operations per second of `Amount` against the frozen dataclass it replaced, which normalized dollars and cents
+in `__post_init__` of every result and divided through floats, and the replay of the credits and debits of
+an account, which adds or subtracts an amount for every event.
+
+`python -m benchmarks.amount [operations]`
+"""
+import math
+import sys
+import timeit
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Tuple
+from unittest.mock import patch
+from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream
+from bank_ddd_es_cqrs.accounts import Account, AccountCreated, AccountCredited, AccountDebited, Amount
+from bank_ddd_es_cqrs.accounts.model import account as account_module
+
+REPLAYED_EVENTS = 10000
+
+
+@dataclass(frozen=True)
+class DataclassAmount:
+    dollars: int
+    cents: int = 0
+
+    def __post_init__(self) -> None:
+        cents_in_dollars = self.cents // 100
+        dollars = 0 if cents_in_dollars < 0 else cents_in_dollars
+        self.__dict__['dollars'] = dollars + self.dollars
+        self.__dict__['cents'] = self.cents - dollars * 100
+
+    def __add__(self, other: 'DataclassAmount') -> 'DataclassAmount':
+        return DataclassAmount(self.dollars + other.dollars, self.cents + other.cents)
+
+    def __sub__(self, other: 'DataclassAmount') -> 'DataclassAmount':
+        return DataclassAmount(self.dollars - other.dollars, self.cents - other.cents)
+
+    def __neg__(self) -> 'DataclassAmount':
+        return DataclassAmount(-self.dollars, -self.cents)
+
+    def __gt__(self, other: 'DataclassAmount') -> bool:
+        if self.dollars != other.dollars:
+            return self.dollars > other.dollars
+        return self.cents > other.cents
+
+    def __truediv__(self, other: 'DataclassAmount') -> 'DataclassAmount':
+        if other > self:
+            return self
+        result = (self.dollars + self.cents / 100) / (other.dollars + other.cents / 100)
+        cents_unprocessed, dollars = math.modf(result)
+        return DataclassAmount(int(dollars), int(str(round(cents_unprocessed, 2)).split('.')[-1]))
+
+
+def operations(amount_class: Any) -> Dict[str, Callable[[], Any]]:
+    first, second = amount_class(1520, 75), amount_class(310, 40)
+    return {
+        'create': lambda: amount_class(1520, 75),
+        'add': lambda: first + second,
+        'subtract': lambda: first - second,
+        'negate': lambda: -first,
+        'compare': lambda: first > second,
+        'divide': lambda: first / second
+    }
+
+
+def account_stream() -> EventStream:
+    account_id = str(UniqueID())
+    events = [AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=account_id,
+                             account_name='benchmark')]
+    for index in range(REPLAYED_EVENTS):
+        event_class = AccountCredited if index % 3 else AccountDebited
+        events.append(event_class(operation_id=str(UniqueID()), dollars=12, cents=85, account_id=account_id))
+    return EventStream(events, len(events))
+
+
+def replays_per_second(stream: EventStream, number: int) -> float:
+    return number / timeit.timeit(lambda: Account(stream), number=number)
+
+
+def run(number: int) -> None:
+    print(f'{"operation":>10} {"dataclass/s":>14} {"amount/s":>14} {"speedup":>8}')
+    results: Tuple[Dict[str, Callable[[], Any]], Dict[str, Callable[[], Any]]] = (
+        operations(DataclassAmount), operations(Amount)
+    )
+    for name in results[0]:
+        before = number / timeit.timeit(results[0][name], number=number)
+        after = number / timeit.timeit(results[1][name], number=number)
+        print(f'{name:>10} {before:>14.0f} {after:>14.0f} {after / before:>7.1f}x')
+    stream = account_stream()
+    # The account module is patched to replay with the dataclass
+    with patch.object(account_module, 'Amount', DataclassAmount):
+        before = replays_per_second(stream, 10)
+    after = replays_per_second(stream, 10)
+    print(f'{"replay":>10} {before:>14.1f} {after:>14.1f} {after / before:>7.1f}x'
+          f'  ({REPLAYED_EVENTS} credits and debits per replay)')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,44 @@
+"""
+Throughput of the `credit_account` use case on the in memory event store, measures the domain, the repository
+and the use case without any database overhead, with and without the aggregate cache.
+Every credit replays the stream of the account unless it is cached, the stream starts at each of
+`STREAM_LENGTHS` and grows by one event with every credit.
+
+`python -m benchmarks.credit_account [credits]`
+"""
+import sys
+import timeit
+from bank_ddd_es_cqrs.shared.model import UniqueID
+from bank_ddd_es_cqrs.accounts import Account, AmountDTO, ESAccountRepository, InMemoryEventStore, credit_account
+from bank_ddd_es_cqrs.accounts.infrastructure.cache import AggregateCache
+
+STREAM_LENGTHS = (1, 10, 100, 1000)
+
+
+def credits_per_second(stream_length: int, credits: int, cached: bool) -> float:
+    account_repo = ESAccountRepository(InMemoryEventStore(), cache=AggregateCache('benchmark') if cached else None)
+    account = Account.create(UniqueID(), UniqueID(), UniqueID(), 'benchmark')
+    account_repo.save(account)
+    amount = AmountDTO(dollars=10, cents=5)
+    for _ in range(stream_length - 1):
+        credit_account(UniqueID(), account.account_id, account_repo, amount)
+    account_repo.cache_saved()
+
+    def credit_all() -> None:
+        for _ in range(credits):
+            credit_account(UniqueID(), account.account_id, account_repo, amount)
+            account_repo.cache_saved()
+
+    # Every run appends to the stream, so it is rebuilt for every stream length and timed once
+    return credits / timeit.timeit(credit_all, number=1)
+
+
+def run(credits: int) -> None:
+    print(f'{"events":>8} {"credits/s":>12} {"cached/s":>12}')
+    for stream_length in STREAM_LENGTHS:
+        print(f'{stream_length:>8} {credits_per_second(stream_length, credits, False):>12.0f} '
+              f'{credits_per_second(stream_length, credits, True):>12.0f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,78 @@
+"""
+Encoding and decoding throughput and the bytes per event of every event codec, together with the JSON
+`data` column that `PostgresEventStore` writes when it has no serializer, decoded by the precompiled constructors
+of the registry and by the `getattr` of the class and `**kwargs` it used before.
+
+`python -m benchmarks.event_codec`
+"""
+import json
+import timeit
+from typing import Callable, Dict, List, Tuple
+from attr import asdict
+from bank_ddd_es_cqrs.shared.model import UniqueID, BaseEvent
+from bank_ddd_es_cqrs.accounts import AccountCreated, AccountCredited, AccountDebited, EventSerializer, \
+    JsonEventCodec, StructEventCodec, event_types
+from bank_ddd_es_cqrs.accounts.model import events as account_module_events
+
+EVENTS = 10000
+
+
+def new_events(event_class: type) -> List[BaseEvent]:
+    if event_class is AccountCreated:
+        return [
+            AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=str(UniqueID()),
+                           account_name='benchmark')
+            for _ in range(EVENTS)
+        ]
+    return [
+        event_class(operation_id=str(UniqueID()), dollars=100, cents=25, account_id=str(UniqueID()))
+        for _ in range(EVENTS)
+    ]
+
+
+def json_column_encode(event: BaseEvent) -> Tuple[str, bytes]:
+    return event.__class__.__name__, json.dumps(asdict(event, recurse=False)).encode('utf-8')
+
+
+def json_column_kwargs_decode(encoded: Tuple[str, bytes]) -> BaseEvent:
+    name, data = encoded
+    return getattr(account_module_events, name)(**json.loads(data))
+
+
+def json_column_registry_decode(encoded: Tuple[str, bytes]) -> BaseEvent:
+    name, data = encoded
+    return event_types.create(name, json.loads(data))
+
+
+def serializer(codec) -> Tuple[Callable, Callable]:
+    event_serializer = EventSerializer(codec)
+
+    def decode(encoded: Tuple[int, bytes]) -> BaseEvent:
+        return event_serializer.deserialize(*encoded)
+
+    return event_serializer.serialize, decode
+
+
+def run() -> None:
+    codecs: Dict[str, Tuple[Callable, Callable]] = {
+        'column kwargs': (json_column_encode, json_column_kwargs_decode),
+        'column': (json_column_encode, json_column_registry_decode),
+        'json': serializer(JsonEventCodec()),
+        'struct': serializer(StructEventCodec())
+    }
+    print(f'{"event":>16} {"codec":>14} {"encode/s":>10} {"decode/s":>10} {"bytes":>6}')
+    for event_class in (AccountCredited, AccountDebited, AccountCreated):
+        events = new_events(event_class)
+        for name, (encode, decode) in codecs.items():
+            encoded = [encode(event) for event in events]
+            assert [decode(item) for item in encoded] == events
+            encode_seconds = timeit.timeit(lambda: [encode(event) for event in events], number=1)
+            decode_seconds = timeit.timeit(lambda: [decode(item) for item in encoded], number=1)
+            # The name of the event is stored too for the JSON column, the type id in two bytes for the codecs
+            size = sum(len(item[1]) + (len(item[0]) if isinstance(item[0], str) else 2) for item in encoded) / EVENTS
+            print(f'{event_class.__name__:>16} {name:>14} {EVENTS / encode_seconds:>10.0f} '
+                  f'{EVENTS / decode_seconds:>10.0f} {size:>6.1f}')
+
+
+if __name__ == '__main__':
+    run()
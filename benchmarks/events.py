@@ -0,0 +1,97 @@
+"""
+Bytes per event and events per second of the slotted events against the same events with a `__dict__`,
+as they were before, for a stream of `EVENTS` credits and debits: created out of their data by the registry,
+as they are when loaded, replayed into an `Account`, and serialized into the JSON `data` column.
+
+`python -m benchmarks.events [events]`
+"""
+import json
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+import attr
+from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream
+from bank_ddd_es_cqrs.accounts import Account, AccountCreated, AccountCredited, AccountDebited
+from bank_ddd_es_cqrs.accounts.infrastructure.registry import compile_constructor
+
+EVENTS = 100000
+
+
+@attr.s(kw_only=True, frozen=True)
+class DictBaseEvent:
+    operation_id: str = attr.ib()
+    version: int = attr.ib(default=1)
+
+
+@attr.s(frozen=True)
+class DictAccountCredited(DictBaseEvent):
+    dollars: int = attr.ib(kw_only=True)
+    cents: int = attr.ib(kw_only=True)
+    account_id: str = attr.ib(kw_only=True)
+
+
+@attr.s(frozen=True)
+class DictAccountDebited(DictBaseEvent):
+    dollars: int = attr.ib(kw_only=True)
+    cents: int = attr.ib(kw_only=True)
+    account_id: str = attr.ib(kw_only=True)
+
+
+class DictEventsAccount(Account):
+    pass
+
+
+DictEventsAccount._appliers = {
+    **Account._appliers,
+    DictAccountCredited: Account._apply_credited,
+    DictAccountDebited: Account._apply_debited
+}
+
+
+def stream_data(events: int) -> List[Tuple[bool, Dict[str, Any]]]:
+    account_id = str(UniqueID())
+    return [
+        (bool(index % 3), {'operation_id': str(UniqueID()), 'version': 1, 'dollars': 12, 'cents': 85,
+                           'account_id': account_id})
+        for index in range(events)
+    ]
+
+
+def create_all(data: List[Tuple[bool, Dict[str, Any]]], credited: Callable, debited: Callable) -> List[Any]:
+    return [credited(item) if is_credit else debited(item) for is_credit, item in data]
+
+
+def bytes_per_event(create: Callable[[], List[Any]]) -> float:
+    """
+    Memory held by the event objects alone, the strings and ints they hold are created before tracing starts.
+    """
+    tracemalloc.start()
+    events = create()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(events)
+
+
+def run(events: int) -> None:
+    data = stream_data(events)
+    created = AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=str(UniqueID()),
+                             account_name='benchmark')
+    print(f'{"events":>8} {"bytes":>7} {"create/s":>10} {"replay/s":>10} {"serialize/s":>12}')
+    for name, credited_class, debited_class, account_class in (
+            ('dict', DictAccountCredited, DictAccountDebited, DictEventsAccount),
+            ('slots', AccountCredited, AccountDebited, Account)):
+        credited, debited = compile_constructor(credited_class), compile_constructor(debited_class)
+        size = bytes_per_event(lambda: create_all(data, credited, debited))
+        create_seconds = timeit.timeit(lambda: create_all(data, credited, debited), number=1)
+        stream = [created] + create_all(data, credited, debited)
+        replay_seconds = timeit.timeit(lambda: account_class(EventStream(stream, len(stream))), number=1)
+        serialize_seconds = timeit.timeit(
+            lambda: [json.dumps(attr.asdict(event, recurse=False)) for event in stream], number=1
+        )
+        print(f'{name:>8} {size:>7.1f} {events / create_seconds:>10.0f} {events / replay_seconds:>10.0f} '
+              f'{events / serialize_seconds:>12.0f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else EVENTS)
@@ -0,0 +1,63 @@
+"""
+Events per second of replaying an `Account` stream of `EVENTS` credits and debits, through the table of the
+methods marked by `applies` and `apply_events`, against the `singledispatchmethod` that the aggregates used
+before, with every event applied on its own by `apply_event`, and with `fold_balance`, which sums the credits
+and debits in chunks, with numpy when it's installed.
+
+`python -m benchmarks.replay [events]`
+"""
+import sys
+import timeit
+from functools import singledispatchmethod
+from typing import Iterable
+from unittest.mock import patch
+from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream, BaseEvent
+from bank_ddd_es_cqrs.accounts import Account, AccountCreated, AccountCredited, AccountDebited
+from bank_ddd_es_cqrs.accounts.model import balance_fold
+
+EVENTS = 100000
+REPLAYS = 3
+
+
+class SingledispatchAccount(Account):
+    @singledispatchmethod
+    def apply(self, event: BaseEvent) -> None:
+        raise NotImplementedError("Not implementation of `apply` available")
+
+    def apply_events(self, events: Iterable[BaseEvent]) -> None:
+        for event in events:
+            self.apply_event(event, False)
+
+
+for _event_class, _applier in Account._appliers.items():
+    SingledispatchAccount.apply.register(_event_class, _applier)
+# Every event falls through to `apply`
+SingledispatchAccount._appliers = {}
+
+
+def account_stream(events: int) -> EventStream:
+    account_id = str(UniqueID())
+    stream = [AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=account_id,
+                             account_name='benchmark')]
+    for index in range(events - 1):
+        event_class = AccountCredited if index % 3 else AccountDebited
+        stream.append(event_class(operation_id=str(UniqueID()), dollars=12, cents=85, account_id=account_id))
+    return EventStream(stream, len(stream))
+
+
+def run(events: int) -> None:
+    stream = account_stream(events)
+    assert SingledispatchAccount(stream).balance == Account(stream).balance
+    print(f'{"dispatch":>16} {"events/s":>10}')
+    for name, account_class in (('singledispatch', SingledispatchAccount), ('table', Account)):
+        seconds = timeit.timeit(lambda: account_class(stream), number=REPLAYS) / REPLAYS
+        print(f'{name:>16} {events / seconds:>10.0f}')
+    with patch.object(Account, 'fold_balance', True):
+        assert Account(stream).snapshot() == SingledispatchAccount(stream).snapshot()
+        seconds = timeit.timeit(lambda: Account(stream), number=REPLAYS) / REPLAYS
+    name = 'fold numpy' if balance_fold.numpy is not None else 'fold'
+    print(f'{name:>16} {events / seconds:>10.0f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else EVENTS)
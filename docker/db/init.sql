@@ -4,7 +4,7 @@
 
 CREATE TABLE public.aggregates
 (
-    uuid character varying(36) COLLATE pg_catalog."default" NOT NULL,
+    uuid uuid NOT NULL,
     version integer,
     CONSTRAINT aggregates_pkey PRIMARY KEY (uuid)
 )
@@ -23,11 +23,16 @@ ALTER TABLE public.aggregates
 
 CREATE TABLE public.events
 (
-    uuid character varying(36) COLLATE pg_catalog."default" NOT NULL,
-    aggregate_uuid character varying(36) COLLATE pg_catalog."default",
+    "position" bigserial NOT NULL,
+    uuid uuid NOT NULL,
+    aggregate_uuid uuid,
+    sequence integer NOT NULL,
     name character varying(50) COLLATE pg_catalog."default",
     data json,
-    CONSTRAINT events_pkey PRIMARY KEY (uuid),
+    type_id smallint,
+    payload bytea,
+    CONSTRAINT events_pkey PRIMARY KEY ("position"),
+    CONSTRAINT events_uuid_key UNIQUE (uuid),
     CONSTRAINT events_aggregate_uuid_fkey FOREIGN KEY (aggregate_uuid)
         REFERENCES public.aggregates (uuid) MATCH SIMPLE
         ON UPDATE NO ACTION
@@ -41,4 +46,56 @@ TABLESPACE pg_default;
 ALTER TABLE public.events
     OWNER to postgres;
 
+CREATE UNIQUE INDEX events_aggregate_uuid_sequence_idx
+    ON public.events USING btree
+    (aggregate_uuid, sequence);
 
+
+-- Table: public.snapshots
+
+-- DROP TABLE public.snapshots;
+
+CREATE TABLE public.snapshots
+(
+    aggregate_uuid uuid NOT NULL,
+    stream_version integer NOT NULL,
+    data json,
+    CONSTRAINT snapshots_pkey PRIMARY KEY (aggregate_uuid),
+    CONSTRAINT snapshots_aggregate_uuid_fkey FOREIGN KEY (aggregate_uuid)
+        REFERENCES public.aggregates (uuid) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE NO ACTION
+)
+WITH (
+    OIDS = FALSE
+)
+TABLESPACE pg_default;
+
+ALTER TABLE public.snapshots
+    OWNER to postgres;
+
+
+
+
+-- Table: public.operations
+
+-- DROP TABLE public.operations;
+
+CREATE TABLE public.operations
+(
+    aggregate_uuid uuid NOT NULL,
+    operation_id bytea NOT NULL,
+    sequence integer,
+    CONSTRAINT operations_pkey PRIMARY KEY (aggregate_uuid, operation_id),
+    CONSTRAINT operations_aggregate_uuid_fkey FOREIGN KEY (aggregate_uuid)
+        REFERENCES public.aggregates (uuid) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE NO ACTION
+)
+WITH (
+    OIDS = FALSE
+)
+TABLESPACE pg_default;
+
+ALTER TABLE public.operations
+    OWNER to postgres;
@@ -73,12 +73,14 @@ def db(app, account_id: UniqueID, client_id: UniqueID, account_name: str):
         client_created_db_event = EventModel(
             uuid=str(UniqueID()),
             aggregate_uuid=str(client_id),
+            sequence=1,
             name=client_created_event.__class__.__name__,
             data=asdict(client_created_event)
         )
         account_added_to_client_db_event = EventModel(
             uuid=str(UniqueID()),
             aggregate_uuid=str(client_id),
+            sequence=2,
             name=account_added_to_client.__class__.__name__,
             data=asdict(account_added_to_client)
         )
@@ -90,12 +92,14 @@ def db(app, account_id: UniqueID, client_id: UniqueID, account_name: str):
         account_created_db_event = EventModel(
             uuid=str(UniqueID()),
             aggregate_uuid=account_id.value,
+            sequence=1,
             name=account_created_event.__class__.__name__,
             data=asdict(account_created_event)
         )
         account_credited_db_event = EventModel(
             uuid=str(UniqueID()),
             aggregate_uuid=account_id.value,
+            sequence=2,
             name=account_credit_event.__class__.__name__,
             data=asdict(account_credit_event)
         )
@@ -237,6 +241,26 @@ def test_add_account_with_wrong_payload_returns_400(fake_app: FlaskClient, db, c
     assert result._status_code == 400
 
 
+def test_add_accounts_adds_all_accounts_to_client_in_one_operation(fake_app: FlaskClient, db, client_id, account_id,
+                                                                   session: Session):
+    result = fake_app.post(
+        f'/api/v1/client/{client_id}/accounts',
+        data=json.dumps({
+            'account_name': ['first', 'second'],
+        }),
+        content_type='application/json'
+    )
+    assert result._status_code == 201
+    aggregate = session.query(AggregateModel).filter(
+        AggregateModel.uuid == str(client_id)
+    ).one()
+    added = aggregate.events[-2:]
+    assert [event.name for event in added] == ['AccountAddedToClient', 'AccountAddedToClient']
+    assert [event.data['account_name'] for event in added] == ['first', 'second']
+    assert [event.data['account_id'] for event in added] == json.loads(result.data)['accounts']
+    assert added[0].data['operation_id'] == added[1].data['operation_id']
+
+
 def test_create_client_returns_201(fake_app: FlaskClient, db, client_id, account_id, session: Session):
     result = fake_app.post(
         f'/api/v1/client',
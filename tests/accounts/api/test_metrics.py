@@ -0,0 +1,18 @@
+import pytest
+from flask.testing import FlaskClient
+from bank_ddd_es_cqrs.accounts.app import account_app_factory
+from bank_ddd_es_cqrs.shared.metrics import metrics
+
+
+@pytest.fixture
+def fake_app() -> FlaskClient:
+    with account_app_factory("sqlite:///:memory:").test_client() as c:
+        yield c
+
+
+def test_get_metrics_returns_metrics_of_process(fake_app):
+    metrics.increment('test.requests')
+    response = fake_app.get('/api/v1/metrics')
+    assert response.status_code == 200
+    assert response.get_json()['test.requests'] == metrics.counter('test.requests')
+    assert 'db.pool.checked_out' in response.get_json()
@@ -0,0 +1,137 @@
+from contextlib import contextmanager
+from unittest.mock import patch
+import pytest
+from bank_ddd_es_cqrs.shared.model import UniqueID
+from bank_ddd_es_cqrs.shared.metrics import Metrics
+from bank_ddd_es_cqrs.shared.retry import RetryingCommandExecutor
+from bank_ddd_es_cqrs.accounts import Account, Amount, AmountDTO, credit_account, debit_account
+from bank_ddd_es_cqrs.accounts.infrastructure import InMemoryEventStore, ESAccountRepository, ConcurrencyException
+from bank_ddd_es_cqrs.accounts.infrastructure.actors import ActorSystem
+
+
+@pytest.fixture
+def event_store() -> InMemoryEventStore:
+    return InMemoryEventStore()
+
+
+def create_account(event_store) -> UniqueID:
+    account_id = UniqueID()
+    ESAccountRepository(event_store).save(Account.create(UniqueID(), account_id, UniqueID(), 'test'))
+    return account_id
+
+
+@pytest.fixture
+def account_id(event_store) -> UniqueID:
+    return create_account(event_store)
+
+
+def actor_system(event_store, **kwargs) -> ActorSystem:
+    @contextmanager
+    def open_repository():
+        yield ESAccountRepository(event_store)
+
+    return ActorSystem('test', open_repository, **kwargs)
+
+
+@pytest.fixture
+def actors(event_store):
+    system = actor_system(event_store, workers=2)
+    yield system
+    system.close()
+
+
+def credit(account_id, dollars):
+    return lambda repo: credit_account(UniqueID(), account_id, repo, AmountDTO(dollars, 0))
+
+
+def balance(event_store, account_id) -> Amount:
+    return ESAccountRepository(event_store).get_by_id(account_id).balance
+
+
+def test_commands_of_aggregate_are_run_in_order(actors, event_store, account_id):
+    futures = [actors.send(account_id, credit(account_id, dollars)) for dollars in range(1, 11)]
+    for future in futures:
+        future.result()
+    assert balance(event_store, account_id) == Amount(55, 0)
+    assert actors.hydrations == 1
+
+
+def test_aggregate_stays_hydrated_between_commands(actors, event_store, account_id):
+    actors.execute(account_id, credit(account_id, 1))
+    with patch.object(event_store, 'load_stream') as load_stream:
+        actors.execute(account_id, credit(account_id, 2))
+    load_stream.assert_not_called()
+    assert balance(event_store, account_id) == Amount(3, 0)
+
+
+def test_execute_returns_result_and_raises_error_of_command(actors, event_store, account_id):
+    assert actors.execute(account_id, lambda repo: 'result') == 'result'
+    with pytest.raises(ValueError):
+        actors.execute(account_id, lambda repo: debit_account(UniqueID(), account_id, repo, AmountDTO(100, 0)))
+
+
+def test_aggregate_is_loaded_again_after_failed_command(actors, event_store, account_id):
+    def credit_then_fail(repo):
+        credit_account(UniqueID(), account_id, repo, AmountDTO(50, 0))
+        raise ValueError('failed after credit')
+
+    with pytest.raises(ValueError):
+        actors.execute(account_id, credit_then_fail)
+    actors.execute(account_id, credit(account_id, 1))
+    assert balance(event_store, account_id) == Amount(1, 0)
+    assert actors.hydrations == 2
+
+
+def test_change_by_another_writer_is_retried_on_a_loaded_aggregate(event_store, account_id):
+    executor = RetryingCommandExecutor('test', (ConcurrencyException,), metrics=Metrics(), sleep=lambda _: None)
+    system = actor_system(event_store, workers=1, executor=executor)
+    try:
+        system.execute(account_id, credit(account_id, 1))
+        repository = ESAccountRepository(event_store)
+        account = repository.get_by_id(account_id)
+        account.credit(Amount(10, 0), UniqueID())
+        repository.save(account)
+        system.execute(account_id, credit(account_id, 1))
+    finally:
+        system.close()
+    assert balance(event_store, account_id) == Amount(12, 0)
+
+
+def test_least_recently_used_aggregates_are_passivated(event_store):
+    system = actor_system(event_store, workers=1, max_actors=2)
+    try:
+        account_ids = [create_account(event_store) for _ in range(3)]
+        for account_id in account_ids:
+            system.execute(account_id, credit(account_id, 1))
+        assert system.passivations == 1
+        system.execute(account_ids[0], credit(account_ids[0], 1))
+        assert system.hydrations == 4
+    finally:
+        system.close()
+
+
+def test_aggregates_are_passivated_when_over_memory_budget(event_store):
+    system = actor_system(event_store, workers=1, max_bytes=1)
+    try:
+        account_ids = [create_account(event_store) for _ in range(2)]
+        for account_id in account_ids:
+            system.execute(account_id, credit(account_id, 1))
+        assert system.passivations == 1
+    finally:
+        system.close()
+
+
+def test_every_aggregate_is_owned_by_exactly_one_process(event_store):
+    systems = [actor_system(event_store, workers=1, process_index=index, process_count=3) for index in range(3)]
+    try:
+        for _ in range(20):
+            account_id = UniqueID()
+            assert sum(system.owns(account_id) for system in systems) == 1
+    finally:
+        for system in systems:
+            system.close()
+
+
+def test_process_index_must_be_one_of_processes(event_store):
+    with pytest.raises(ValueError):
+        actor_system(event_store, process_index=2, process_count=2)
@@ -0,0 +1,68 @@
+import pytest
+from bank_ddd_es_cqrs.shared.model import UniqueID
+from bank_ddd_es_cqrs.shared.metrics import metrics
+from bank_ddd_es_cqrs.accounts import Account, Amount
+from bank_ddd_es_cqrs.accounts.infrastructure.cache import AggregateCache, estimate_size
+
+
+def new_account() -> Account:
+    account = Account.create(UniqueID(), UniqueID(), UniqueID(), 'test')
+    account.mark_changes_as_committed()
+    return account
+
+
+def test_take_returns_put_aggregate_once():
+    cache = AggregateCache('test')
+    account = new_account()
+    cache.put(account.account_id, account)
+    assert cache.take(account.account_id) is account
+    assert cache.take(account.account_id) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_put_evicts_least_recently_used_aggregate_over_max_entries():
+    cache = AggregateCache('test', max_entries=2)
+    accounts = [new_account() for _ in range(3)]
+    for account in accounts:
+        cache.put(account.account_id, account)
+    assert len(cache) == 2
+    assert cache.take(accounts[0].account_id) is None
+    assert cache.evictions == 1
+
+
+def test_put_evicts_aggregates_over_max_bytes():
+    account = new_account()
+    cache = AggregateCache('test', max_bytes=estimate_size(account) * 2 + 1)
+    accounts = [new_account() for _ in range(3)]
+    for account in accounts:
+        cache.put(account.account_id, account)
+    assert len(cache) == 2
+    assert cache.bytes <= cache.max_bytes
+
+
+def test_put_does_not_keep_aggregate_larger_than_max_bytes():
+    cache = AggregateCache('test', max_bytes=10)
+    account = new_account()
+    cache.put(account.account_id, account)
+    assert len(cache) == 0
+    assert cache.bytes == 0
+
+
+def test_estimate_size_grows_with_aggregate_state():
+    account = new_account()
+    size = estimate_size(account)
+    for _ in range(10):
+        account.credit(Amount(1), UniqueID())
+    account.mark_changes_as_committed()
+    assert estimate_size(account) > size
+
+
+def test_cache_counters_are_exposed_as_metrics():
+    cache = AggregateCache('metrics_test')
+    cache.take(UniqueID())
+    assert metrics.snapshot()['cache.metrics_test.misses'] == 1
+
+
+def test_cache_of_no_entries_raises_value_error():
+    with pytest.raises(ValueError):
+        AggregateCache('test', max_entries=0)
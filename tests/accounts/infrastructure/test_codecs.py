@@ -0,0 +1,63 @@
+import pytest
+from bank_ddd_es_cqrs.shared.model import UniqueID
+from bank_ddd_es_cqrs.accounts import AccountCreated, AccountCredited, AccountDebited, EventTypeRegistry, \
+    EventSerializer, JsonEventCodec, StructEventCodec, event_types
+
+
+@pytest.fixture
+def credit_event():
+    return AccountCredited(operation_id=str(UniqueID()), dollars=120, cents=35, account_id=str(UniqueID()))
+
+
+@pytest.fixture
+def created_event():
+    return AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=str(UniqueID()),
+                          account_name='test')
+
+
+def test_registry_returns_class_of_type_id():
+    assert event_types.event_class(event_types.type_id(AccountDebited)) is AccountDebited
+
+
+def test_registry_register_existing_type_id_raises_value_error():
+    registry = EventTypeRegistry()
+    registry.register(1, AccountCredited)
+    with pytest.raises(ValueError):
+        registry.register(1, AccountDebited)
+    with pytest.raises(ValueError):
+        registry.register(2, AccountCredited)
+
+
+@pytest.mark.parametrize('codec', [JsonEventCodec(), StructEventCodec()])
+def test_serializer_round_trips_events(codec, credit_event, created_event):
+    serializer = EventSerializer(codec)
+    for event in (credit_event, created_event):
+        assert serializer.deserialize(*serializer.serialize(event)) == event
+
+
+def test_struct_codec_encodes_money_moved_events_into_fixed_size_records(credit_event):
+    _, payload = EventSerializer(StructEventCodec()).serialize(credit_event)
+    assert payload[0] == StructEventCodec.codec_id
+    assert len(payload) == 1 + StructEventCodec.MONEY_MOVED.size
+
+
+def test_struct_codec_leaves_other_events_to_json(created_event):
+    _, payload = EventSerializer(StructEventCodec()).serialize(created_event)
+    assert payload[0] == JsonEventCodec.codec_id
+
+
+@pytest.mark.parametrize('event', [
+    AccountCredited(operation_id='not a uuid', dollars=1, cents=0, account_id=str(UniqueID())),
+    AccountCredited(operation_id=str(UniqueID()).upper(), dollars=1, cents=0, account_id=str(UniqueID())),
+    AccountDebited(operation_id=str(UniqueID()), dollars=2 ** 70, cents=0, account_id=str(UniqueID()))
+])
+def test_struct_codec_leaves_events_that_do_not_fit_to_json(event):
+    serializer = EventSerializer(StructEventCodec())
+    type_id, payload = serializer.serialize(event)
+    assert payload[0] == JsonEventCodec.codec_id
+    assert serializer.deserialize(type_id, payload) == event
+
+
+def test_payloads_are_decoded_whatever_the_codec_of_the_serializer(credit_event):
+    type_id, payload = EventSerializer(StructEventCodec()).serialize(credit_event)
+    assert EventSerializer(JsonEventCodec()).deserialize(type_id, payload) == credit_event
@@ -1,13 +1,20 @@
 import pytest
 import random
+from unittest.mock import patch
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
 from attr import asdict
+from sqlalchemy.exc import IntegrityError
 from flask import Flask
 from sqlalchemy.orm.session import Session
-from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream
+from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream, LazyEventStream, Snapshot
 from bank_ddd_es_cqrs.accounts import AccountCreated, AccountCredited, AccountDebited
-from bank_ddd_es_cqrs.accounts import PostgresEventStore
-from bank_ddd_es_cqrs.accounts import AggregateModel, EventModel, event_store_db, \
+from bank_ddd_es_cqrs.accounts import PostgresEventStore, EventSerializer, StructEventCodec, EventTypeRegistry, \
+    event_types
+from bank_ddd_es_cqrs.accounts import AggregateModel, EventModel, SnapshotModel, OperationModel, event_store_db, \
     ConcurrencyException, NotFoundException
+from bank_ddd_es_cqrs.shared.model import OperationDuplicate
+from bank_ddd_es_cqrs.accounts.infrastructure.sql import migrate_uuid_columns, migrate_events_table
 
 AGGREGATE_VERSION = 5
 
@@ -57,12 +64,14 @@ def db(app, account_id, client_id):
     event1 = EventModel(
         uuid=str(UniqueID()),
         aggregate_uuid=account_id.value,
+        sequence=1,
         name=account_created_event.__class__.__name__,
         data=asdict(account_created_event)
     )
     event2 = EventModel(
         uuid=str(UniqueID()),
         aggregate_uuid=account_id.value,
+        sequence=2,
         name=account_credit_event.__class__.__name__,
         data=asdict(account_credit_event)
     )
@@ -153,14 +162,15 @@ def test_save_events_adds_events_to_related_aggregate(account_id: UniqueID, sess
     assert len(aggregate.events) == 4
 
 
-def test_save_events_increments_version_by_one_on_successful_save(account_id: UniqueID, session: Session, credit_event,
-                                                                  debit_event, postgres_event_store):
+def test_save_events_increments_version_by_number_of_events_on_successful_save(account_id: UniqueID,
+                                                                               session: Session, credit_event,
+                                                                               debit_event, postgres_event_store):
     postgres_event_store.save_events(aggregate_id=account_id, events=[credit_event, debit_event],
                                      expected_version=AGGREGATE_VERSION)
     aggregate = session.query(AggregateModel).filter(
         AggregateModel.uuid == account_id.value
     ).one()
-    assert aggregate.version == AGGREGATE_VERSION + 1
+    assert aggregate.version == AGGREGATE_VERSION + 2
 
 
 def test_save_events_throws_concurrency_error_if_version_does_not_match(account_id: UniqueID, session: Session,
@@ -205,6 +215,24 @@ def test_save_events_adds_related_events_to_new_aggregate(session: Session, post
     assert len(aggregate.events) == 2
 
 
+def test_save_events_sets_version_of_new_aggregate_to_number_of_events(session: Session, postgres_event_store):
+    account_id = UniqueID()
+    account_created_event = AccountCreated(
+        operation_id=str(UniqueID()),
+        client_id=str(UniqueID()),
+        account_id=str(account_id),
+        account_name='test'
+    )
+    credit_event = AccountCredited(
+        dollars=22, cents=0, account_id=str(account_id), operation_id=str(UniqueID())
+    )
+    postgres_event_store.save_events(aggregate_id=account_id, events=[account_created_event, credit_event])
+    aggregate = session.query(AggregateModel).filter(
+        AggregateModel.uuid == account_id.value
+    ).one()
+    assert aggregate.version == 2
+
+
 def test_save_events_passing_expected_version_for_new_aggregate_throws_concurrency_error(session: Session,
                                                                                          postgres_event_store):
     account_id = UniqueID()
@@ -217,3 +245,325 @@ def test_save_events_passing_expected_version_for_new_aggregate_throws_concurren
     with pytest.raises(ConcurrencyException):
         postgres_event_store.save_events(account_id, [account_created_event], expected_version=6)
 
+
+def test_save_snapshot_adds_snapshot_of_aggregate(account_id: UniqueID, session: Session, postgres_event_store):
+    postgres_event_store.save_snapshot(account_id, Snapshot({'operations': []}, 1))
+    snapshot = session.query(SnapshotModel).filter(
+        SnapshotModel.aggregate_uuid == account_id.value
+    ).one()
+    assert snapshot.stream_version == 1
+
+
+def test_save_snapshot_replaces_previous_snapshot(account_id: UniqueID, session: Session, postgres_event_store):
+    postgres_event_store.save_snapshot(account_id, Snapshot({'operations': []}, 1))
+    postgres_event_store.save_snapshot(account_id, Snapshot({'operations': []}, 2))
+    snapshots = session.query(SnapshotModel).filter(
+        SnapshotModel.aggregate_uuid == account_id.value
+    ).all()
+    assert len(snapshots) == 1
+    assert snapshots[0].stream_version == 2
+
+
+def test_load_stream_returns_snapshot_and_only_events_after_it(account_id: UniqueID, postgres_event_store):
+    postgres_event_store.save_snapshot(account_id, Snapshot({'operations': []}, 1))
+    event_stream = postgres_event_store.load_stream(account_id)
+    assert event_stream.snapshot == Snapshot({'operations': []}, 1)
+    assert len(event_stream.events) == 1
+    assert isinstance(event_stream.events[0], AccountCredited)
+
+
+def test_stream_ids_returns_ids_of_streams_with_event(account_id: UniqueID, postgres_event_store):
+    assert list(postgres_event_store.stream_ids(AccountCreated)) == [account_id]
+
+
+def test_load_stream_from_version_returns_only_events_from_that_version(postgres_event_store, account_id):
+    event_stream = postgres_event_store.load_stream(account_id, from_version=2)
+    assert len(event_stream.events) == 1
+    assert isinstance(event_stream.events[0], AccountCredited)
+
+
+def test_load_stream_to_version_returns_only_events_up_to_that_version(postgres_event_store, account_id):
+    event_stream = postgres_event_store.load_stream(account_id, to_version=1)
+    assert len(event_stream.events) == 1
+    assert isinstance(event_stream.events[0], AccountCreated)
+
+
+def test_load_stream_with_range_ignores_snapshot(postgres_event_store, account_id):
+    postgres_event_store.save_snapshot(account_id, Snapshot({'operations': []}, 1))
+    event_stream = postgres_event_store.load_stream(account_id, from_version=1)
+    assert event_stream.snapshot is None
+    assert len(event_stream.events) == 2
+
+
+def test_save_events_continues_sequence_of_stream(account_id: UniqueID, session: Session, credit_event,
+                                                  debit_event, postgres_event_store):
+    postgres_event_store.save_events(aggregate_id=account_id, events=[credit_event, debit_event],
+                                     expected_version=AGGREGATE_VERSION)
+    aggregate = session.query(AggregateModel).filter(
+        AggregateModel.uuid == account_id.value
+    ).one()
+    assert [event.sequence for event in aggregate.events] == [1, 2, 3, 4]
+
+
+def test_save_events_for_existing_new_aggregate_throws_concurrency_error(account_id: UniqueID, credit_event,
+                                                                         postgres_event_store):
+    with pytest.raises(ConcurrencyException):
+        postgres_event_store.save_events(account_id, [credit_event])
+
+
+def test_save_events_with_copy_threshold_falls_back_to_insert_when_not_on_postgres(account_id: UniqueID,
+                                                                                   session: Session, credit_event,
+                                                                                   debit_event):
+    event_store = PostgresEventStore(session, copy_threshold=1)
+    event_store.save_events(aggregate_id=account_id, events=[credit_event, debit_event],
+                            expected_version=AGGREGATE_VERSION)
+    event_stream = event_store.load_stream(account_id)
+    assert event_stream.events[2:] == [credit_event, debit_event]
+
+
+def test_load_streams_returns_stream_of_each_aggregate(account_id: UniqueID, session: Session,
+                                                       postgres_event_store):
+    new_account_id = UniqueID()
+    created_event = AccountCreated(
+        operation_id=str(UniqueID()),
+        client_id=str(UniqueID()),
+        account_id=str(new_account_id),
+        account_name='test'
+    )
+    postgres_event_store.save_events(new_account_id, [created_event])
+    event_streams = postgres_event_store.load_streams([account_id, new_account_id])
+    assert event_streams[account_id].version == AGGREGATE_VERSION
+    assert [type(event) for event in event_streams[account_id].events] == [AccountCreated, AccountCredited]
+    assert event_streams[new_account_id].events == [created_event]
+
+
+def test_load_streams_returns_snapshot_and_only_events_after_it(account_id: UniqueID, postgres_event_store):
+    postgres_event_store.save_snapshot(account_id, Snapshot({'operations': []}, 1))
+    event_stream = postgres_event_store.load_streams([account_id])[account_id]
+    assert event_stream.snapshot == Snapshot({'operations': []}, 1)
+    assert len(event_stream.events) == 1
+
+
+def test_load_streams_throws_not_found_exception_with_only_missing_ids(account_id: UniqueID,
+                                                                       postgres_event_store):
+    missing_id = UniqueID()
+    with pytest.raises(NotFoundException) as e:
+        postgres_event_store.load_streams([account_id, missing_id])
+    assert str(missing_id) in str(e.value)
+    assert str(account_id) not in str(e.value)
+
+
+def test_iter_stream_returns_lazy_event_stream_with_events_in_order(postgres_event_store, account_id):
+    event_stream = postgres_event_store.iter_stream(account_id, batch_size=1)
+    assert isinstance(event_stream, LazyEventStream)
+    assert event_stream.version == AGGREGATE_VERSION
+    assert [type(event) for event in event_stream.events] == [AccountCreated, AccountCredited]
+
+
+def test_iter_stream_returns_snapshot_and_only_events_after_it(postgres_event_store, account_id):
+    postgres_event_store.save_snapshot(account_id, Snapshot({'operations': []}, 1))
+    event_stream = postgres_event_store.iter_stream(account_id)
+    assert event_stream.snapshot == Snapshot({'operations': []}, 1)
+    assert [type(event) for event in event_stream.events] == [AccountCredited]
+
+
+def test_iter_stream_throws_not_found_exception_when_no_aggregate_is_found(postgres_event_store):
+    with pytest.raises(NotFoundException):
+        postgres_event_store.iter_stream(UniqueID())
+
+
+def test_read_all_returns_events_of_all_streams_in_order_of_position(account_id: UniqueID, credit_event,
+                                                                     postgres_event_store):
+    new_account_id = UniqueID()
+    created_event = AccountCreated(
+        operation_id=str(UniqueID()),
+        client_id=str(UniqueID()),
+        account_id=str(new_account_id),
+        account_name='test'
+    )
+    postgres_event_store.save_events(new_account_id, [created_event])
+    postgres_event_store.save_events(account_id, [credit_event], expected_version=AGGREGATE_VERSION)
+    recorded = [recorded for batch in postgres_event_store.read_all() for recorded in batch]
+    assert [recorded.event for recorded in recorded][2:] == [created_event, credit_event]
+    assert [recorded.sequence for recorded in recorded] == [1, 2, 1, 3]
+    assert recorded[3].aggregate_id == account_id.value
+    assert [recorded.position for recorded in recorded] == sorted({recorded.position for recorded in recorded})
+
+
+def test_read_all_returns_batches_of_batch_size(postgres_event_store):
+    batches = list(postgres_event_store.read_all(batch_size=1))
+    assert [len(batch) for batch in batches] == [1, 1]
+
+
+def test_read_all_starts_after_from_position(postgres_event_store):
+    first, second = [recorded for batch in postgres_event_store.read_all() for recorded in batch]
+    assert [batch for batch in postgres_event_store.read_all(from_position=first.position)] == [[second]]
+
+
+def test_delete_stream_removes_aggregate_events_and_snapshot(account_id: UniqueID, postgres_event_store):
+    postgres_event_store.save_snapshot(account_id, Snapshot({'balance': 1}, 2))
+    postgres_event_store.delete_stream(account_id)
+    with pytest.raises(NotFoundException):
+        postgres_event_store.load_stream(account_id)
+    assert list(postgres_event_store.read_all()) == []
+
+
+def test_delete_stream_of_unknown_aggregate_raises_not_found(postgres_event_store):
+    with pytest.raises(NotFoundException):
+        postgres_event_store.delete_stream(UniqueID())
+
+
+def test_save_events_indexes_every_operation_once(account_id: UniqueID, session: Session):
+    event_store = PostgresEventStore(session, index_operations=True)
+    operation_id = str(UniqueID())
+    events = [
+        AccountCredited(operation_id=operation_id, dollars=1, cents=0, account_id=account_id.value),
+        AccountDebited(operation_id=operation_id, dollars=1, cents=0, account_id=account_id.value)
+    ]
+    event_store.save_events(account_id, events, expected_version=AGGREGATE_VERSION)
+    assert session.query(OperationModel).count() == 1
+    assert event_store.has_operation(account_id, operation_id)
+    assert not event_store.has_operation(account_id, str(UniqueID()))
+
+
+def test_save_events_of_indexed_operation_raises_operation_duplicate(account_id: UniqueID, session: Session,
+                                                                     credit_event):
+    event_store = PostgresEventStore(session, index_operations=True)
+    event_store.save_events(account_id, [credit_event], expected_version=AGGREGATE_VERSION)
+    with pytest.raises(OperationDuplicate):
+        event_store.save_events(account_id, [credit_event], expected_version=AGGREGATE_VERSION + 1)
+    session.rollback()
+
+
+def test_save_no_events_with_operations_index_indexes_nothing(account_id: UniqueID, session: Session):
+    event_store = PostgresEventStore(session, index_operations=True)
+    event_store.save_events(account_id, [], expected_version=AGGREGATE_VERSION)
+    assert session.query(OperationModel).count() == 0
+
+
+def test_save_events_with_integrity_error_other_than_duplicate_raises_it(account_id: UniqueID, session: Session,
+                                                                         credit_event):
+    event_store = PostgresEventStore(session, index_operations=True)
+    # A `NULL` operation id fails the `NOT NULL` constraint of the column
+    with patch('bank_ddd_es_cqrs.accounts.infrastructure.sql.event_store.compact_operation_id', return_value=None):
+        with pytest.raises(IntegrityError):
+            event_store.save_events(account_id, [credit_event], expected_version=AGGREGATE_VERSION)
+    session.rollback()
+
+
+def test_has_operation_without_index_looks_through_stream(account_id: UniqueID, postgres_event_store):
+    operation_id = postgres_event_store.load_stream(account_id).events[0].operation_id
+    assert postgres_event_store.has_operation(account_id, operation_id)
+    assert not postgres_event_store.has_operation(account_id, str(UniqueID()))
+
+
+def test_backfill_operations_indexes_operations_of_saved_events(account_id: UniqueID, session: Session):
+    event_store = PostgresEventStore(session, index_operations=True)
+    last_position, indexed = event_store.backfill_operations()
+    assert indexed == 1
+    operation_id = event_store.load_stream(account_id).events[0].operation_id
+    assert event_store.has_operation(account_id, operation_id)
+    assert event_store.backfill_operations() == (last_position, 0)
+    assert event_store.backfill_operations(last_position) == (last_position, 0)
+
+
+def test_operation_events_are_read_from_first_event_of_operation(account_id: UniqueID, session: Session):
+    event_store = PostgresEventStore(session, index_operations=True)
+    operation_id = str(UniqueID())
+    events = [
+        AccountCredited(operation_id=operation_id, dollars=1, cents=0, account_id=account_id.value),
+        AccountDebited(operation_id=operation_id, dollars=2, cents=0, account_id=account_id.value)
+    ]
+    event_store.save_events(account_id, events, expected_version=AGGREGATE_VERSION)
+    event_store.save_events(account_id, [
+        AccountCredited(operation_id=str(UniqueID()), dollars=3, cents=0, account_id=account_id.value)
+    ], expected_version=AGGREGATE_VERSION + 2)
+    assert event_store.operation_events(account_id, operation_id) == events
+    assert event_store.operation_events(account_id, str(UniqueID())) is None
+
+
+def test_operation_events_of_backfilled_operation(account_id: UniqueID, session: Session):
+    event_store = PostgresEventStore(session, index_operations=True)
+    event_store.backfill_operations()
+    stream = event_store.load_stream(account_id)
+    assert event_store.operation_events(account_id, stream.events[0].operation_id) == stream.events
+
+
+def test_operation_events_without_index_looks_through_stream(account_id: UniqueID, postgres_event_store):
+    stream = postgres_event_store.load_stream(account_id)
+    assert postgres_event_store.operation_events(account_id, stream.events[0].operation_id) == stream.events
+    assert postgres_event_store.operation_events(account_id, str(UniqueID())) is None
+
+
+def test_save_events_with_serializer_saves_type_id_and_payload(account_id: UniqueID, session: Session,
+                                                               credit_event):
+    event_store = PostgresEventStore(session, serializer=EventSerializer(StructEventCodec()))
+    event_store.save_events(aggregate_id=account_id, events=[credit_event], expected_version=AGGREGATE_VERSION)
+    event_model = session.query(EventModel).filter(EventModel.sequence == 3).one()
+    assert event_model.data is None
+    assert event_model.type_id == event_types.type_id(AccountCredited)
+    assert event_model.name == 'AccountCredited'
+
+
+def test_events_saved_with_serializer_are_loaded_with_json_events(account_id: UniqueID, session: Session,
+                                                                  credit_event, debit_event, postgres_event_store):
+    event_store = PostgresEventStore(session, serializer=EventSerializer(StructEventCodec()))
+    event_store.save_events(aggregate_id=account_id, events=[credit_event, debit_event],
+                            expected_version=AGGREGATE_VERSION)
+    assert postgres_event_store.load_stream(account_id).events[2:] == [credit_event, debit_event]
+    assert list(postgres_event_store.iter_stream(account_id).events)[2:] == [credit_event, debit_event]
+    recorded = [recorded_event for batch in postgres_event_store.read_all() for recorded_event in batch]
+    assert [r.event for r in recorded if r.aggregate_id == account_id.value][2:] == [credit_event, debit_event]
+
+
+def test_rewrite_upcasted_events_saves_upcasted_data_in_format_of_each_event(account_id: UniqueID, session: Session,
+                                                                             credit_event, postgres_event_store):
+    struct_serializer = EventSerializer(StructEventCodec())
+    PostgresEventStore(session, serializer=struct_serializer).save_events(account_id, [credit_event],
+                                                                          expected_version=AGGREGATE_VERSION)
+    registry = EventTypeRegistry()
+    registry.register(1, AccountCreated)
+    registry.register(2, AccountCredited)
+    registry.register_upcaster('AccountCredited', 1, lambda data: {**data, 'version': 2, 'cents': 0})
+    event_store = PostgresEventStore(session, serializer=EventSerializer(StructEventCodec(), registry))
+
+    last_position, rewritten = event_store.rewrite_upcasted_events(0, batch_size=2)
+    assert rewritten == 1
+    assert event_store.rewrite_upcasted_events(last_position, batch_size=2)[1] == 1
+    assert event_store.rewrite_upcasted_events(0)[1] == 0
+
+    credits = postgres_event_store.load_stream(account_id).events[1:]
+    assert [(event.version, event.cents) for event in credits] == [(2, 0), (2, 0)]
+    assert session.query(EventModel).filter(EventModel.sequence == 3).one().data is None
+
+
+def test_id_columns_are_uuid_on_postgres_and_varchar_elsewhere():
+    assert 'uuid UUID NOT NULL' in str(CreateTable(AggregateModel.__table__).compile(dialect=postgresql.dialect()))
+    assert 'aggregate_uuid UUID' in str(CreateTable(EventModel.__table__).compile(dialect=postgresql.dialect()))
+    assert 'uuid VARCHAR(36) NOT NULL' in str(CreateTable(AggregateModel.__table__).compile(dialect=sqlite.dialect()))
+
+
+def test_ids_are_loaded_as_the_strings_they_were_saved_with(account_id: UniqueID, session: Session):
+    assert session.query(AggregateModel).filter(AggregateModel.uuid == account_id.value).one().uuid == account_id.value
+
+
+def test_migrate_uuid_columns_is_only_for_postgres(session: Session):
+    with pytest.raises(ValueError):
+        migrate_uuid_columns(session)
+
+
+def test_migrate_events_table_is_only_for_postgres(session: Session):
+    with pytest.raises(ValueError):
+        migrate_events_table(session)
+
+
+@pytest.mark.parametrize('load', [
+    lambda store, aggregate_id: store.load_stream(aggregate_id),
+    lambda store, aggregate_id: store.iter_stream(aggregate_id),
+    lambda store, aggregate_id: store.load_streams([UniqueID(), aggregate_id])
+])
+def test_loading_id_that_is_not_a_uuid_raises_not_found_without_querying(postgres_event_store, load):
+    # A `UUID` column of postgres raises on such an id instead of finding nothing
+    with patch.object(postgres_event_store.session, 'query', side_effect=AssertionError('queried')):
+        with pytest.raises(NotFoundException):
+            load(postgres_event_store, UniqueID('not-a-uuid'))
@@ -0,0 +1,154 @@
+import threading
+import pytest
+from bank_ddd_es_cqrs.shared.model import UniqueID, Snapshot
+from bank_ddd_es_cqrs.accounts import AccountCreated, AccountCredited, AccountDebited, Account, Amount
+from bank_ddd_es_cqrs.accounts import InMemoryEventStore, ESAccountRepository, ConcurrencyException, \
+    NotFoundException, credit_account, AmountDTO
+
+
+@pytest.fixture
+def event_store():
+    return InMemoryEventStore()
+
+
+@pytest.fixture
+def account_id():
+    return UniqueID()
+
+
+@pytest.fixture
+def events(account_id):
+    return [
+        AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=account_id.value,
+                       account_name='test'),
+        AccountCredited(operation_id=str(UniqueID()), dollars=23, cents=0, account_id=account_id.value),
+        AccountDebited(operation_id=str(UniqueID()), dollars=3, cents=50, account_id=account_id.value)
+    ]
+
+
+def test_load_stream_returns_saved_events_and_version(event_store, account_id, events):
+    event_store.save_events(account_id, events)
+    stream = event_store.load_stream(account_id)
+    assert stream.events == events
+    assert stream.version == len(events)
+    assert stream.snapshot is None
+
+
+def test_load_stream_raises_not_found_for_unknown_aggregate(event_store):
+    with pytest.raises(NotFoundException):
+        event_store.load_stream(UniqueID())
+
+
+def test_save_events_with_expected_version_appends_events(event_store, account_id, events):
+    event_store.save_events(account_id, events[:1])
+    event_store.save_events(account_id, events[1:], expected_version=1)
+    stream = event_store.load_stream(account_id)
+    assert stream.events == events
+    assert stream.version == 3
+
+
+def test_save_events_with_wrong_expected_version_raises_concurrency_exception(event_store, account_id, events):
+    event_store.save_events(account_id, events[:1])
+    with pytest.raises(ConcurrencyException):
+        event_store.save_events(account_id, events[1:], expected_version=4)
+    assert event_store.load_stream(account_id).events == events[:1]
+
+
+def test_save_events_of_existing_new_aggregate_raises_concurrency_exception(event_store, account_id, events):
+    event_store.save_events(account_id, events[:1])
+    with pytest.raises(ConcurrencyException):
+        event_store.save_events(account_id, events[:1])
+
+
+def test_load_stream_with_range_returns_events_between_sequences(event_store, account_id, events):
+    event_store.save_events(account_id, events)
+    assert event_store.load_stream(account_id, from_version=2).events == events[1:]
+    assert event_store.load_stream(account_id, to_version=2).events == events[:2]
+    assert event_store.load_stream(account_id, from_version=2, to_version=2).events == events[1:2]
+
+
+def test_load_stream_uses_snapshot_and_following_events(event_store, account_id, events):
+    event_store.save_events(account_id, events)
+    snapshot = Snapshot({'balance': 1}, 2)
+    event_store.save_snapshot(account_id, snapshot)
+    stream = event_store.load_stream(account_id)
+    assert stream.snapshot == snapshot
+    assert stream.events == events[2:]
+
+
+def test_load_streams_raises_not_found_with_missing_ids_only(event_store, account_id, events):
+    event_store.save_events(account_id, events)
+    missing_id = UniqueID()
+    with pytest.raises(NotFoundException) as error:
+        event_store.load_streams([account_id, missing_id])
+    assert str(missing_id) in str(error.value)
+    assert str(account_id) not in str(error.value)
+
+
+def test_load_streams_returns_stream_of_every_aggregate(event_store, account_id, events):
+    other_id = UniqueID()
+    event_store.save_events(account_id, events)
+    event_store.save_events(other_id, events[:1])
+    streams = event_store.load_streams([account_id, other_id])
+    assert streams[account_id].events == events
+    assert streams[other_id].events == events[:1]
+
+
+def test_read_all_returns_events_of_all_streams_in_batches(event_store, account_id, events):
+    other_id = UniqueID()
+    event_store.save_events(account_id, events[:2])
+    event_store.save_events(other_id, events[:1])
+    event_store.save_events(account_id, events[2:], expected_version=2)
+    batches = list(event_store.read_all(batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2]
+    recorded = [recorded_event for batch in batches for recorded_event in batch]
+    assert [r.position for r in recorded] == [1, 2, 3, 4]
+    assert [(r.aggregate_id, r.sequence) for r in recorded] == [
+        (str(account_id), 1), (str(account_id), 2), (str(other_id), 1), (str(account_id), 3)
+    ]
+    assert [r.event for r in next(event_store.read_all(from_position=3))] == events[2:]
+
+
+def test_delete_stream_removes_stream_and_keeps_positions_of_other_events(event_store, account_id, events):
+    other_id = UniqueID()
+    event_store.save_events(account_id, events[:1])
+    event_store.save_events(other_id, events[1:2])
+    event_store.delete_stream(account_id)
+    with pytest.raises(NotFoundException):
+        event_store.load_stream(account_id)
+    recorded = [recorded_event for batch in event_store.read_all() for recorded_event in batch]
+    assert [(r.position, r.aggregate_id) for r in recorded] == [(2, str(other_id))]
+
+
+def test_operation_events_returns_events_of_committed_operation_only(event_store, account_id, events):
+    event_store.save_events(account_id, events)
+    assert event_store.operation_events(account_id, events[1].operation_id) == [events[1]]
+    assert event_store.operation_events(account_id, str(UniqueID())) is None
+
+
+def test_concurrent_saves_with_same_expected_version_only_one_succeeds(event_store, account_id, events):
+    event_store.save_events(account_id, events[:1])
+    failures = []
+
+    def append():
+        try:
+            event_store.save_events(account_id, events[1:2], expected_version=1)
+        except ConcurrencyException:
+            failures.append(1)
+
+    threads = [threading.Thread(target=append) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(failures) == 7
+    assert event_store.load_stream(account_id).version == 2
+
+
+def test_credit_account_through_repository(event_store):
+    account_repo = ESAccountRepository(event_store)
+    account = Account.create(UniqueID(), UniqueID(), UniqueID(), 'test')
+    account_repo.save(account)
+    for _ in range(3):
+        credit_account(UniqueID(), account.account_id, account_repo, AmountDTO(dollars=10, cents=0))
+    assert account_repo.get_by_id(account.account_id).balance == Amount(30)
@@ -0,0 +1,38 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import patch, Mock
+from attr import asdict
+from bank_ddd_es_cqrs.shared.model import UniqueID
+from bank_ddd_es_cqrs.accounts import AccountCredited
+from bank_ddd_es_cqrs.accounts.infrastructure.kafka import KafkaEventConsumer
+
+
+def change_message(op, after):
+    return SimpleNamespace(value=json.dumps({'payload': {'op': op, 'after': after}}).encode())
+
+
+def event_row(event):
+    return {'name': event.__class__.__name__, 'data': json.dumps(asdict(event)), 'payload': None, 'type_id': None}
+
+
+def read_messages(messages):
+    trigger = Mock()
+    with patch('bank_ddd_es_cqrs.accounts.infrastructure.kafka.KafkaConsumer', return_value=messages):
+        KafkaEventConsumer('localhost:9092', 'events', 'group').read(trigger)
+    return [call.args[0] for call in trigger.call_args_list]
+
+
+def test_read_triggers_created_events():
+    event = AccountCredited(operation_id=str(UniqueID()), dollars=1, cents=0, account_id=str(UniqueID()))
+    assert read_messages([change_message('c', event_row(event))]) == [event]
+
+
+def test_read_skips_deleted_events_and_their_tombstones():
+    deleted = AccountCredited(operation_id=str(UniqueID()), dollars=1, cents=0, account_id=str(UniqueID()))
+    created = AccountCredited(operation_id=str(UniqueID()), dollars=2, cents=0, account_id=str(UniqueID()))
+    messages = [
+        SimpleNamespace(value=json.dumps({'payload': {'op': 'd', 'before': event_row(deleted), 'after': None}})),
+        SimpleNamespace(value=None),
+        change_message('c', event_row(created))
+    ]
+    assert read_messages(messages) == [created]
@@ -0,0 +1,91 @@
+import attr
+import pytest
+from bank_ddd_es_cqrs.shared.model import UniqueID, BaseEvent
+from bank_ddd_es_cqrs.accounts import AccountCredited, EventTypeRegistry, event_types
+from bank_ddd_es_cqrs.accounts.model import events as account_module_events
+from bank_ddd_es_cqrs.accounts.infrastructure.registry import compile_constructor
+
+
+@attr.s(frozen=True)
+class EventWithFactory(BaseEvent):
+    tags: list = attr.ib(kw_only=True, factory=list)
+
+
+@attr.s(frozen=True, slots=True)
+class EventWithSlots(BaseEvent):
+    amount: int = attr.ib(kw_only=True)
+
+
+@pytest.fixture
+def credit_data():
+    return {'operation_id': str(UniqueID()), 'version': 1, 'dollars': 10, 'cents': 5, 'account_id': str(UniqueID())}
+
+
+@pytest.fixture
+def registry():
+    registry = EventTypeRegistry()
+    registry.register(1, AccountCredited)
+    return registry
+
+
+def test_every_event_is_registered():
+    event_classes = [
+        value for value in vars(account_module_events).values()
+        if isinstance(value, type) and issubclass(value, BaseEvent) and value is not BaseEvent
+    ]
+    assert all(event_types.event_class(event_types.type_id(event_class)) is event_class
+               for event_class in event_classes)
+
+
+def test_compiled_constructor_creates_same_event_as_init(credit_data):
+    assert compile_constructor(AccountCredited)(credit_data) == AccountCredited(**credit_data)
+
+
+def test_compiled_constructor_creates_event_of_class_with_slots():
+    assert compile_constructor(EventWithSlots)({'operation_id': 'id', 'amount': 3}) == \
+        EventWithSlots(operation_id='id', amount=3)
+
+
+def test_compiled_constructor_uses_defaults_of_missing_fields(credit_data):
+    del credit_data['version']
+    assert compile_constructor(AccountCredited)(credit_data).version == 1
+    assert compile_constructor(EventWithFactory)({'operation_id': 'id'}).tags == []
+
+
+def test_compiled_constructor_raises_key_error_when_field_without_default_is_missing(credit_data):
+    del credit_data['dollars']
+    with pytest.raises(KeyError):
+        compile_constructor(AccountCredited)(credit_data)
+
+
+def test_compiled_constructor_creates_frozen_event(credit_data):
+    with pytest.raises(attr.exceptions.FrozenInstanceError):
+        compile_constructor(AccountCredited)(credit_data).dollars = 5
+
+
+def test_create_runs_chain_of_upcasters_from_version_of_data(registry, credit_data):
+    registry.register_upcaster('AccountCredited', 1, lambda data: {**data, 'version': 2, 'cents': data['cents'] + 1})
+    registry.register_upcaster('AccountCredited', 2, lambda data: {**data, 'version': 3, 'dollars': 0})
+    event = registry.create('AccountCredited', credit_data)
+    assert (event.version, event.dollars, event.cents) == (3, 0, 6)
+    event = registry.create('AccountCredited', {**credit_data, 'version': 2})
+    assert (event.version, event.dollars, event.cents) == (3, 0, 5)
+
+
+def test_upcast_returns_same_data_when_no_upcaster_applies(registry, credit_data):
+    registry.register_upcaster('AccountCredited', 2, lambda data: {**data, 'version': 3})
+    assert registry.upcast('AccountCredited', credit_data) is credit_data
+
+
+def test_register_upcaster_twice_for_same_version_raises_value_error(registry):
+    registry.register_upcaster('AccountCreated', 1, lambda data: data)
+    with pytest.raises(ValueError):
+        registry.register_upcaster('AccountCreated', 1, lambda data: data)
+
+
+def test_every_event_has_no_instance_dict():
+    event_classes = [
+        value for value in vars(account_module_events).values()
+        if isinstance(value, type) and issubclass(value, BaseEvent)
+    ]
+    assert all('__dict__' not in dir(event_class) for event_class in event_classes)
@@ -1,7 +1,10 @@
 from unittest.mock import MagicMock
 import pytest
-from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream
-from bank_ddd_es_cqrs.accounts import ESAccountRepository, ESClientRepository
+from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream, LazyEventStream, SnapshotPolicy, \
+    BoundedOperationLog, OperationDuplicate
+from bank_ddd_es_cqrs.accounts import ESAccountRepository, ESClientRepository, InMemoryEventStore, \
+    ConcurrencyException
+from bank_ddd_es_cqrs.accounts.infrastructure.cache import AggregateCache
 from bank_ddd_es_cqrs.accounts import Client, Account, SocialSecurityNumber, FirstName, LastName, \
     Birthdate, Amount, AccountCredited, AccountCreated
 
@@ -93,3 +96,124 @@ def test_get_by_id_applies_event_stream(account_repo, fake_event_store):
     account = account_repo.get_by_id(account_id)
     assert account.balance == Amount(20)
     assert account.version == 2
+
+
+def test_account_repo_saves_snapshot_when_policy_says_so(fake_event_store, new_account):
+    repo = ESAccountRepository(fake_event_store, SnapshotPolicy(every=4))
+    repo.save(new_account)
+    fake_event_store.save_snapshot.assert_called_once()
+    assert fake_event_store.save_snapshot.call_args.args[1].stream_version == 4
+
+
+def test_account_repo_does_not_save_snapshot_before_policy_says_so(fake_event_store, new_account):
+    repo = ESAccountRepository(fake_event_store, SnapshotPolicy(every=5))
+    repo.save(new_account)
+    fake_event_store.save_snapshot.assert_not_called()
+
+
+def test_backfill_snapshots_snapshots_long_enough_aggregates(fake_event_store):
+    account_id = UniqueID()
+    fake_event_store.load_streams = MagicMock(return_value={account_id: return_based_on_id(account_id)(account_id)})
+    repo = ESAccountRepository(fake_event_store, SnapshotPolicy(every=2))
+    assert repo.backfill_snapshots([account_id]) == 1
+    fake_event_store.save_snapshot.assert_called_once()
+
+
+def test_get_by_ids_returns_aggregates_in_order_of_ids(account_repo, fake_event_store):
+    account_ids = [UniqueID(), UniqueID()]
+    fake_event_store.load_streams = MagicMock(side_effect=lambda ids: {
+        account_id: return_based_on_id(account_id)(account_id) for account_id in ids
+    })
+    accounts = account_repo.get_by_ids(account_ids)
+    assert [account.account_id for account in accounts] == account_ids
+
+
+def test_get_by_id_with_stream_batch_size_replays_lazy_stream(fake_event_store):
+    account_id = UniqueID()
+    event_stream = return_based_on_id(account_id)(account_id)
+    fake_event_store.iter_stream = MagicMock(
+        return_value=LazyEventStream(iter(event_stream.events), event_stream.version)
+    )
+    account = ESAccountRepository(fake_event_store, stream_batch_size=100).get_by_id(account_id)
+    fake_event_store.iter_stream.assert_called_with(account_id, 100)
+    assert account.balance == Amount(20)
+
+
+@pytest.fixture
+def cached_account_repo():
+    return ESAccountRepository(InMemoryEventStore(), cache=AggregateCache('account_test'))
+
+
+def save_new_account(repo) -> Account:
+    account = Account.create(UniqueID(), UniqueID(), UniqueID(), 'test')
+    repo.save(account)
+    repo.cache_saved()
+    return account
+
+
+def test_get_by_id_takes_aggregate_from_cache(cached_account_repo):
+    account = save_new_account(cached_account_repo)
+    assert cached_account_repo.get_by_id(account.account_id) is account
+    assert cached_account_repo._cache.hits == 1
+
+
+def test_saved_aggregate_is_cached_only_once_cache_saved_is_called(cached_account_repo):
+    account = Account.create(UniqueID(), UniqueID(), UniqueID(), 'test')
+    cached_account_repo.save(account)
+    assert len(cached_account_repo._cache) == 0
+    cached_account_repo.cache_saved()
+    assert len(cached_account_repo._cache) == 1
+
+
+def test_get_by_id_of_cached_aggregate_applies_events_of_other_writers(cached_account_repo):
+    account = save_new_account(cached_account_repo)
+    other_repo = ESAccountRepository(cached_account_repo._event_store)
+    other_copy = other_repo.get_by_id(account.account_id)
+    other_copy.credit(Amount(30), UniqueID())
+    other_repo.save(other_copy)
+    loaded = cached_account_repo.get_by_id(account.account_id)
+    assert loaded is account
+    assert loaded.balance == Amount(30)
+    assert loaded.version == other_copy.version
+
+
+def test_get_by_id_loads_from_store_when_cached_aggregate_does_not_match_store(cached_account_repo):
+    account = save_new_account(cached_account_repo)
+    # As if the transaction the changes were saved in was rolled back after they were cached
+    account.credit(Amount(30), UniqueID())
+    account.mark_changes_as_committed()
+    cached_account_repo._cache.put(account.account_id, account)
+    loaded = cached_account_repo.get_by_id(account.account_id)
+    assert loaded is not account
+    assert loaded.balance == Amount(0)
+
+
+def test_aggregate_is_not_cached_again_when_save_raises_concurrency_exception(cached_account_repo):
+    account = save_new_account(cached_account_repo)
+    other_repo = ESAccountRepository(cached_account_repo._event_store)
+    stale = cached_account_repo.get_by_id(account.account_id)
+    other_copy = other_repo.get_by_id(account.account_id)
+    other_copy.credit(Amount(30), UniqueID())
+    other_repo.save(other_copy)
+    stale.credit(Amount(10), UniqueID())
+    with pytest.raises(ConcurrencyException):
+        cached_account_repo.save(stale)
+    cached_account_repo.cache_saved()
+    assert len(cached_account_repo._cache) == 0
+    assert cached_account_repo.get_by_id(account.account_id).balance == Amount(30)
+
+
+def test_aggregate_loaded_by_repository_looks_up_operations_out_of_its_window(monkeypatch):
+    monkeypatch.setattr(Account, 'operation_log_factory', lambda: BoundedOperationLog(window=1))
+    repo = ESAccountRepository(InMemoryEventStore())
+    account = save_new_account(repo)
+    operation_id = UniqueID()
+    account.credit(Amount(10), operation_id)
+    repo.save(account)
+    account = repo.get_by_id(account.account_id)
+    account.credit(Amount(10), UniqueID())
+    repo.save(account)
+    account = repo.get_by_id(account.account_id)
+    with pytest.raises(OperationDuplicate):
+        account.credit(Amount(10), operation_id)
+    assert account.balance == Amount(20)
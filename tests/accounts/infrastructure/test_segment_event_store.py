@@ -0,0 +1,159 @@
+import os
+import pytest
+from unittest.mock import patch
+from bank_ddd_es_cqrs.shared.model import UniqueID, Snapshot
+from bank_ddd_es_cqrs.accounts import AccountCreated, AccountCredited, ClientCreated, SegmentEventStore, \
+    ConcurrencyException, NotFoundException
+
+SEGMENT_SIZE = 1024
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path)
+
+
+@pytest.fixture
+def event_store(directory):
+    event_store = SegmentEventStore(directory, segment_size=SEGMENT_SIZE)
+    yield event_store
+    event_store.close()
+
+
+@pytest.fixture
+def account_id():
+    return UniqueID()
+
+
+@pytest.fixture
+def events(account_id):
+    return [
+        AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=account_id.value,
+                       account_name='test')
+    ] + [
+        AccountCredited(operation_id=str(UniqueID()), dollars=dollars, cents=0, account_id=account_id.value)
+        for dollars in range(1, 10)
+    ]
+
+
+def reopen(event_store, directory):
+    event_store.close()
+    return SegmentEventStore(directory, segment_size=SEGMENT_SIZE)
+
+
+def test_load_stream_returns_saved_events_and_version(event_store, account_id, events):
+    event_store.save_events(account_id, events[:3])
+    event_store.save_events(account_id, events[3:], expected_version=3)
+    stream = event_store.load_stream(account_id)
+    assert stream.events == events
+    assert stream.version == len(events)
+
+
+def test_load_stream_raises_not_found_for_unknown_aggregate(event_store):
+    with pytest.raises(NotFoundException):
+        event_store.load_stream(UniqueID())
+
+
+def test_save_events_with_wrong_expected_version_raises_concurrency_exception(event_store, account_id, events):
+    event_store.save_events(account_id, events[:1])
+    with pytest.raises(ConcurrencyException):
+        event_store.save_events(account_id, events[1:], expected_version=5)
+    with pytest.raises(ConcurrencyException):
+        event_store.save_events(account_id, events[1:])
+
+
+def test_load_stream_with_range_returns_events_between_sequences(event_store, account_id, events):
+    event_store.save_events(account_id, events)
+    assert event_store.load_stream(account_id, from_version=3, to_version=5).events == events[2:5]
+
+
+def test_events_span_many_segments(event_store, directory, account_id, events):
+    event_store.save_events(account_id, events)
+    assert len(os.listdir(directory)) > 1
+    assert all(os.path.getsize(os.path.join(directory, name)) == SEGMENT_SIZE for name in os.listdir(directory))
+    assert event_store.load_stream(account_id).events == events
+
+
+def test_index_is_rebuilt_when_reopened(event_store, directory, account_id, events):
+    other_id = UniqueID()
+    event_store.save_events(account_id, events[:4])
+    event_store.save_events(other_id, events[:1])
+    event_store.save_snapshot(account_id, Snapshot({'balance': 6}, 3))
+    event_store.save_events(account_id, events[4:], expected_version=4)
+    event_store = reopen(event_store, directory)
+    stream = event_store.load_stream(account_id)
+    assert stream.snapshot == Snapshot({'balance': 6}, 3)
+    assert stream.events == events[3:]
+    assert stream.version == len(events)
+    assert event_store.load_stream(other_id).events == events[:1]
+    recorded = [recorded_event for batch in event_store.read_all() for recorded_event in batch]
+    assert [(r.aggregate_id, r.sequence) for r in recorded] == \
+        [(str(account_id), sequence) for sequence in range(1, 5)] + [(str(other_id), 1)] + \
+        [(str(account_id), sequence) for sequence in range(5, len(events) + 1)]
+    event_store.close()
+
+
+def test_partial_last_record_is_erased_when_reopened(event_store, directory, account_id, events):
+    event_store.save_events(account_id, events[:1])
+    end = event_store._end
+    event_store.save_events(account_id, events[1:2], expected_version=1)
+    number, local = divmod(end, SEGMENT_SIZE)
+    # Cut the last record in the middle, as if the process crashed while writing it
+    event_store._segments[number][local + 20:event_store._end - number * SEGMENT_SIZE] = \
+        bytes(event_store._end - number * SEGMENT_SIZE - local - 20)
+    event_store = reopen(event_store, directory)
+    assert event_store.load_stream(account_id).events == events[:1]
+    event_store.save_events(account_id, events[1:3], expected_version=1)
+    event_store = reopen(event_store, directory)
+    assert event_store.load_stream(account_id).events == events[:3]
+    event_store.close()
+
+
+def test_incomplete_batch_is_erased_when_reopened(event_store, directory, account_id, events):
+    event_store.save_events(account_id, events[:1])
+    event_store.save_events(account_id, events[1:], expected_version=1)
+    # Drop the segment of the last records of the batch, as if the process crashed before writing them
+    last_segment = len(event_store._segments) - 1
+    event_store._segments[last_segment][:] = bytes(SEGMENT_SIZE)
+    event_store = reopen(event_store, directory)
+    stream = event_store.load_stream(account_id)
+    assert stream.events == events[:1]
+    assert stream.version == 1
+    event_store.close()
+
+
+def test_batch_that_fails_to_be_written_is_erased(event_store, directory, account_id, events):
+    other_id = UniqueID()
+    event_store.save_events(account_id, events[:1])
+    end = event_store._end
+    with patch.object(event_store, '_open_segment', side_effect=OSError('No space left on device')):
+        with pytest.raises(OSError):
+            event_store.save_events(other_id, events)
+    assert event_store._end == end
+    event_store.save_events(account_id, events[1:2], expected_version=1)
+    event_store = reopen(event_store, directory)
+    assert event_store.load_stream(account_id).events == events[:2]
+    with pytest.raises(NotFoundException):
+        event_store.load_stream(other_id)
+    event_store.close()
+
+
+def test_stream_ids_returns_ids_of_streams_that_start_with_event(event_store, account_id, events):
+    client_id = UniqueID()
+    event_store.save_events(account_id, events)
+    event_store.save_events(client_id, [ClientCreated(
+        operation_id=str(UniqueID()), client_id=client_id.value, ssn=123456789, first_name='test',
+        last_name='test', birthdate='2000-01-01'
+    )])
+    assert list(event_store.stream_ids(AccountCreated)) == [account_id]
+    assert list(event_store.stream_ids(ClientCreated)) == [client_id]
+
+
+def test_record_larger_than_segment_raises_value_error(event_store, account_id):
+    with pytest.raises(ValueError):
+        event_store.save_events(account_id, [
+            AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=account_id.value,
+                           account_name='a' * SEGMENT_SIZE)
+        ])
+    with pytest.raises(NotFoundException):
+        event_store.load_stream(account_id)
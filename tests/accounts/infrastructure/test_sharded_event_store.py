@@ -0,0 +1,152 @@
+import pytest
+from bank_ddd_es_cqrs.shared.model import UniqueID, Snapshot
+from bank_ddd_es_cqrs.accounts import AccountCreated, AccountCredited
+from bank_ddd_es_cqrs.accounts.infrastructure import InMemoryEventStore, ShardedEventStore, HashRing, \
+    NotFoundException
+from bank_ddd_es_cqrs.accounts.infrastructure.sharded.event_store import copy_stream, moved_streams
+
+
+def created(account_id: UniqueID) -> AccountCreated:
+    return AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=str(account_id),
+                          account_name='test')
+
+
+def credited(account_id: UniqueID) -> AccountCredited:
+    return AccountCredited(operation_id=str(UniqueID()), dollars=1, cents=0, account_id=str(account_id))
+
+
+@pytest.fixture
+def stores():
+    return {'a': InMemoryEventStore(), 'b': InMemoryEventStore(), 'c': InMemoryEventStore()}
+
+
+@pytest.fixture
+def sharded(stores) -> ShardedEventStore:
+    return ShardedEventStore(stores)
+
+
+@pytest.fixture
+def account_ids(sharded):
+    account_ids = [UniqueID() for _ in range(30)]
+    for account_id in account_ids:
+        sharded.save_events(account_id, [created(account_id), credited(account_id)])
+    return account_ids
+
+
+def test_ring_places_aggregate_on_same_shard_every_time():
+    account_id = UniqueID()
+    assert HashRing(['a', 'b', 'c']).shard(account_id) == HashRing(['a', 'b', 'c']).shard(account_id)
+
+
+def test_ring_spreads_aggregates_over_all_shards():
+    ring = HashRing(['a', 'b', 'c'])
+    assert {ring.shard(UniqueID()) for _ in range(300)} == {'a', 'b', 'c'}
+
+
+def test_adding_shard_only_moves_aggregates_to_new_shard():
+    account_ids = [UniqueID() for _ in range(300)]
+    moves = list(moved_streams(account_ids, HashRing(['a', 'b', 'c']), HashRing(['a', 'b', 'c', 'd'])))
+    assert all(target == 'd' for _, _, target in moves)
+    assert 0 < len(moves) < len(account_ids) / 2
+
+
+def test_stream_is_saved_only_in_its_shard(sharded, stores, account_ids):
+    for account_id in account_ids:
+        owners = [name for name, store in stores.items() if list(store.stream_ids(AccountCreated)).count(account_id)]
+        assert owners == [sharded.ring.shard(account_id)]
+
+
+def test_load_stream_reads_from_shard_of_aggregate(sharded, account_ids):
+    stream = sharded.load_stream(account_ids[0])
+    assert stream.version == 2
+    assert isinstance(stream.events[1], AccountCredited)
+
+
+def test_load_streams_merges_streams_of_all_shards(sharded, account_ids):
+    streams = sharded.load_streams(account_ids)
+    assert set(streams) == set(account_ids)
+    assert all(stream.version == 2 for stream in streams.values())
+
+
+def test_load_streams_raises_not_found_with_missing_ids(sharded, account_ids):
+    missing = UniqueID()
+    with pytest.raises(NotFoundException) as error:
+        sharded.load_streams(account_ids[:3] + [missing])
+    assert str(missing) in str(error.value)
+
+
+def test_read_all_returns_events_of_all_shards_in_order_of_position(sharded, account_ids):
+    recorded = [event for batch in sharded.read_all(batch_size=7) for event in batch]
+    positions = [event.position for event in recorded]
+    assert len(recorded) == 60
+    assert positions == sorted(positions)
+    assert {event.aggregate_id for event in recorded} == {str(account_id) for account_id in account_ids}
+
+
+def test_read_all_resumes_after_position(sharded, account_ids):
+    recorded = [event for batch in sharded.read_all() for event in batch]
+    resumed = [event for batch in sharded.read_all(recorded[24].position) for event in batch]
+    assert resumed == recorded[25:]
+
+
+def test_stream_ids_of_all_shards(sharded, account_ids):
+    assert set(sharded.stream_ids(AccountCreated)) == set(account_ids)
+
+
+def test_operation_events_are_read_from_shard_of_aggregate(sharded, stores, account_ids):
+    event = sharded.load_stream(account_ids[0]).events[1]
+    assert sharded.operation_events(account_ids[0], event.operation_id) == [event]
+    assert sharded.has_operation(account_ids[0], event.operation_id)
+
+
+def test_copy_stream_copies_events_version_and_snapshot(account_ids):
+    source, target = InMemoryEventStore(), InMemoryEventStore()
+    account_id = account_ids[0]
+    source.save_events(account_id, [created(account_id), credited(account_id)])
+    source.save_snapshot(account_id, Snapshot({'state': 1}, 1))
+    assert copy_stream(account_id, source, target)
+    assert target.load_stream(account_id, from_version=1) == source.load_stream(account_id, from_version=1)
+    assert target.load_stream(account_id).snapshot == Snapshot({'state': 1}, 1)
+
+
+def test_copy_stream_already_in_target_is_skipped():
+    source, target = InMemoryEventStore(), InMemoryEventStore()
+    account_id = UniqueID()
+    source.save_events(account_id, [created(account_id)])
+    copy_stream(account_id, source, target)
+    assert not copy_stream(account_id, source, target)
+
+
+def test_copy_stream_of_version_counting_commits_already_in_target_is_skipped():
+    source, target = InMemoryEventStore(), InMemoryEventStore()
+    account_id = UniqueID()
+    source.save_events(account_id, [created(account_id), credited(account_id)])
+    # Versions of aggregates saved before they counted events are the number of their commits
+    source._versions[str(account_id)] = 5
+    assert copy_stream(account_id, source, target)
+    assert not copy_stream(account_id, source, target)
+
+
+def test_copy_stream_with_other_events_in_target_raises_value_error():
+    source, target = InMemoryEventStore(), InMemoryEventStore()
+    account_id = UniqueID()
+    source.save_events(account_id, [created(account_id), credited(account_id)])
+    target.save_events(account_id, [created(account_id)])
+    with pytest.raises(ValueError):
+        copy_stream(account_id, source, target)
+
+
+def test_moving_streams_to_new_ring_keeps_them_loadable(stores, sharded, account_ids):
+    stores['d'] = InMemoryEventStore()
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    for account_id, source, target in moved_streams(account_ids, sharded.ring, ring):
+        copy_stream(account_id, stores[source], stores[target])
+        stores[source].delete_stream(account_id)
+    rebalanced = ShardedEventStore(stores, ring)
+    assert all(stream.version == 2 for stream in rebalanced.load_streams(account_ids).values())
+    assert len(list(rebalanced.stream_ids(AccountCreated))) == len(account_ids)
+
+
+def test_ring_with_shard_without_store_raises_value_error(stores):
+    with pytest.raises(ValueError):
+        ShardedEventStore(stores, HashRing(['a', 'd']))
@@ -2,7 +2,7 @@ import random
 import pytest
 from bank_ddd_es_cqrs.accounts import Account, AccountCreated, Amount, AccountCredited, AccountDebited, \
     AccountMaximumDebtChanged
-from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream
+from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream, OperationDuplicate
 
 
 @pytest.fixture
@@ -118,6 +118,16 @@ def test_credit_increases_balance(related_random_account_created_event):
     assert account.balance == Amount(120, 65)
 
 
+def test_credit_with_committed_operation_id_leaves_balance_unchanged(related_random_account_created_event):
+    account = Account(EventStream([related_random_account_created_event]))
+    operation_id = UniqueID()
+    account.credit(Amount(10, 0), operation_id)
+    account.mark_changes_as_committed()
+    with pytest.raises(OperationDuplicate):
+        account.credit(Amount(10, 0), operation_id)
+    assert account.balance == Amount(10, 0)
+
+
 def test_credit_adds_account_credited_event_to_uncommitted_changes(new_random_account,
                                                                    related_random_account_created_event,
                                                                    new_random_account_credit_event):
@@ -191,3 +201,24 @@ def test_mark_changes_as_committed_removes_events_from_uncommitted_changes(new_r
     assert len(new_random_account.uncommitted_changes) != 0
     new_random_account.mark_changes_as_committed()
     assert len(new_random_account.uncommitted_changes) == 0
+
+
+def test_account_restored_from_snapshot_has_same_state(new_random_account_with_high_maximum_debt):
+    account = new_random_account_with_high_maximum_debt
+    account.debit(Amount(120, 50), UniqueID())
+    account.mark_changes_as_committed()
+    restored = Account(EventStream([], snapshot=account.snapshot()))
+    assert restored.account_id == account.account_id
+    assert restored.client_id == account.client_id
+    assert restored.balance == account.balance
+    assert restored.maximum_debt == account.maximum_debt
+    assert restored.committed_operations == account.committed_operations
+    assert restored.stream_version == 3
+
+
+def test_account_restored_from_snapshot_applies_events_after_it(new_random_account):
+    new_random_account.mark_changes_as_committed()
+    credited_event = get_account_credited_event(new_random_account.account_id, Amount(12, 5))
+    account = Account(EventStream([credited_event], snapshot=new_random_account.snapshot()))
+    assert account.balance == Amount(12, 5)
+    assert account.stream_version == 2
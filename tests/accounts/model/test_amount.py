@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 
+import pickle
 import pytest
 
 from dataclasses import FrozenInstanceError
+from decimal import Decimal, ROUND_UP, ROUND_DOWN, ROUND_FLOOR
 from bank_ddd_es_cqrs.accounts import Amount
+from bank_ddd_es_cqrs.accounts.model.amount import divide_rounded, ROUNDING_MODES
 
 
 def test_amount_immutable():
@@ -106,3 +109,62 @@ def test_total_dollars():
 
 def test_total_cents():
     assert Amount(9, 42).total_cents == 942
+
+
+def test_negative_cents_are_taken_from_dollars():
+    amount = Amount(5, -30)
+    assert (amount.dollars, amount.cents) == (4, 70)
+    assert amount == Amount(4, 70)
+
+
+def test_cents_of_negative_amount_are_not_negative():
+    amount = Amount(-2, 50)
+    assert (amount.dollars, amount.cents) == (-2, 50)
+    assert (Amount(0, -50).dollars, Amount(0, -50).cents) == (-1, 50)
+
+
+def test_from_cents_is_same_as_dollars_and_cents():
+    assert Amount.from_cents(1234) == Amount(12, 34)
+    assert Amount.from_cents(-1234) == Amount(-12, -34)
+
+
+def test_equal_amounts_have_same_hash():
+    assert hash(Amount(8, 253)) == hash(Amount(10, 53))
+
+
+def test_amount_survives_pickling():
+    assert pickle.loads(pickle.dumps(Amount(-3, -5))) == Amount(-3, -5)
+
+
+def test_division_ratio_is_exact():
+    assert Amount(3, 0) / Amount(2, 0) == Amount(1, 50)
+    assert Amount(1, 99) / Amount(1, 0) == Amount(1, 99)
+
+
+def test_divide_into_parts_rounds_half_to_even_by_default():
+    assert Amount(0, 5).divide(2) == Amount(0, 2)
+    assert Amount(0, 15).divide(2) == Amount(0, 8)
+
+
+def test_divide_into_parts_with_rounding_mode():
+    assert Amount(10, 0).divide(3, ROUND_UP) == Amount(3, 34)
+    assert Amount(10, 0).divide(3, ROUND_DOWN) == Amount(3, 33)
+    assert Amount(-10, 0).divide(3, ROUND_FLOOR) == Amount(-3, -34)
+
+
+def test_divide_into_zero_parts_raises_zero_division_error():
+    with pytest.raises(ZeroDivisionError):
+        Amount(1, 0).divide(0)
+
+
+def test_divide_with_unknown_rounding_mode_raises_value_error():
+    with pytest.raises(ValueError):
+        Amount(1, 0).divide(3, 'ROUND_RANDOM')
+
+
+@pytest.mark.parametrize('rounding', ROUNDING_MODES)
+def test_divide_rounded_is_same_as_decimal(rounding):
+    for numerator in range(-30, 31):
+        for denominator in (-8, -4, -3, -2, 1, 2, 3, 4, 8):
+            expected = (Decimal(numerator) / Decimal(denominator)).quantize(Decimal(1), rounding=rounding)
+            assert divide_rounded(numerator, denominator, rounding) == expected
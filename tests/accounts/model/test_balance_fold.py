@@ -0,0 +1,107 @@
+import pytest
+from unittest.mock import patch
+from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream, LazyEventStream, BoundedOperationLog
+from bank_ddd_es_cqrs.accounts import Account, AccountCreated, AccountCredited, AccountDebited, \
+    AccountMaximumDebtChanged, Amount
+from bank_ddd_es_cqrs.accounts.model import balance_fold
+from bank_ddd_es_cqrs.accounts.model.balance_fold import fold_cents
+
+
+@pytest.fixture
+def events():
+    account_id = str(UniqueID())
+    events = [AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=account_id,
+                             account_name='test')]
+    for index in range(1, 500):
+        if index % 97 == 0:
+            events.append(AccountMaximumDebtChanged(operation_id=str(UniqueID()), account_id=account_id,
+                                                    dollars=index, cents=50))
+        else:
+            event_class = AccountCredited if index % 3 else AccountDebited
+            events.append(event_class(operation_id=str(UniqueID()), dollars=index, cents=index % 100,
+                                      account_id=account_id))
+    return events
+
+
+@pytest.fixture
+def fold_balance(monkeypatch):
+    monkeypatch.setattr(Account, 'fold_balance', True)
+    monkeypatch.setattr(Account, 'FOLD_CHUNK_SIZE', 64)
+
+
+def replayed(events, *args):
+    return Account(EventStream(events, len(events)), *args)
+
+
+def replayed_one_by_one(events, *args):
+    with patch.object(Account, 'fold_balance', False):
+        return replayed(events, *args)
+
+
+def test_fold_cents_sums_signed_cents():
+    assert fold_cents([10, 2, 0], [5, 50, 99], [1, -1, 1]) == 1005 - 250 + 99
+
+
+def test_fold_cents_of_no_events_is_zero():
+    assert fold_cents([], [], []) == 0
+
+
+def test_fold_cents_of_amounts_that_overflow_int64_is_exact():
+    assert fold_cents([1 << 62] * 300, [0] * 300, [1] * 300) == (1 << 62) * 100 * 300
+
+
+def columns(events):
+    return list(range(events)), [index % 100 for index in range(events)], [1, -1] * (events // 2)
+
+
+def summed(dollars, cents, signs):
+    return sum(sign * (dollar * 100 + cent) for dollar, cent, sign in zip(dollars, cents, signs))
+
+
+def test_fold_cents_without_numpy_is_same(monkeypatch):
+    dollars, cents, signs = columns(1000)
+    monkeypatch.setattr(balance_fold, 'numpy', None)
+    assert fold_cents(dollars, cents, signs) == summed(dollars, cents, signs)
+
+
+def test_numpy_fold_is_same_as_python_fold():
+    pytest.importorskip('numpy')
+    dollars, cents, signs = columns(balance_fold.NUMPY_MIN_EVENTS * 4)
+    with patch.object(balance_fold, '_numpy_fold', wraps=balance_fold._numpy_fold) as numpy_fold:
+        assert fold_cents(dollars, cents, signs) == summed(dollars, cents, signs)
+    assert numpy_fold.call_count == 1
+    assert isinstance(balance_fold._numpy_fold(dollars, cents, signs), int)
+
+
+def test_numpy_fold_leaves_amounts_that_could_overflow_to_python():
+    pytest.importorskip('numpy')
+    events = balance_fold.NUMPY_MIN_EVENTS
+    assert balance_fold._numpy_fold([1 << 55] * events, [0] * events, [1] * events) is None
+
+
+def test_folded_account_is_same_as_replayed_one(events, fold_balance):
+    expected = replayed_one_by_one(events)
+    account = replayed(events)
+    assert account.balance == expected.balance
+    assert account.maximum_debt == expected.maximum_debt
+    assert account.stream_version == expected.stream_version == len(events)
+    assert account.version == expected.version
+    assert account.snapshot() == expected.snapshot()
+
+
+def test_folded_account_keeps_same_window_of_operations(events, fold_balance):
+    expected = replayed_one_by_one(events, BoundedOperationLog(window=10))
+    assert replayed(events, BoundedOperationLog(window=10)).snapshot() == expected.snapshot()
+
+
+def test_folded_account_from_lazy_stream(events, fold_balance):
+    account = Account(LazyEventStream(iter(events), len(events)))
+    assert account.balance == replayed_one_by_one(events).balance
+    assert account.stream_version == len(events)
+
+
+def test_folded_account_takes_new_credit_after_replay(events, fold_balance):
+    account = replayed(events)
+    balance = account.balance
+    account.credit(Amount(1, 0), UniqueID())
+    assert account.balance == balance + Amount(1, 0)
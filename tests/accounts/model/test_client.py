@@ -1,7 +1,7 @@
 import pytest
 from bank_ddd_es_cqrs.accounts import Client, FirstName, LastName, Birthdate, SocialSecurityNumber, \
     ClientCreated, AccountAddedToClient, AccountRemovedFromClient
-from bank_ddd_es_cqrs.shared.model import UniqueID
+from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream
 
 
 @pytest.fixture
@@ -54,3 +54,82 @@ def test_remove_account_produces_account_removed_event_with_right_account_id(new
     new_client_with_account.remove_account(account_id, UniqueID())
     assert isinstance(new_client_with_account.uncommitted_changes[-1], AccountRemovedFromClient)
     assert new_client_with_account.uncommitted_changes[-1].account_id == account_id.value
+
+
+def test_client_restored_from_snapshot_has_same_state(new_client_with_account):
+    new_client_with_account.mark_changes_as_committed()
+    restored = Client(EventStream([], snapshot=new_client_with_account.snapshot()))
+    assert restored.client_id == new_client_with_account.client_id
+    assert restored.ssn == new_client_with_account.ssn
+    assert restored.birthdate == new_client_with_account.birthdate
+    assert restored.accounts == new_client_with_account.accounts
+    assert restored.committed_operations == new_client_with_account.committed_operations
+
+
+def test_has_account_is_true_only_for_connected_accounts(new_client_with_account):
+    assert new_client_with_account.has_account(new_client_with_account.accounts[0])
+    assert not new_client_with_account.has_account(UniqueID())
+
+
+def test_accounts_keep_the_order_they_were_added_in(new_client):
+    account_ids = [UniqueID() for _ in range(5)]
+    for account_id in account_ids:
+        new_client.add_account(account_id, UniqueID(), 'test')
+    new_client.remove_account(account_ids[2], UniqueID())
+    assert new_client.accounts == account_ids[:2] + account_ids[3:]
+
+
+def test_add_accounts_produces_an_event_for_each_account_in_one_operation(new_client):
+    account_ids = [UniqueID(), UniqueID()]
+    operation_id = UniqueID()
+    new_client.add_accounts([(account_ids[0], 'first'), (account_ids[1], 'second')], operation_id)
+    added = new_client.uncommitted_changes[1:]
+    assert [event.account_id for event in added] == [account_id.value for account_id in account_ids]
+    assert [event.account_name for event in added] == ['first', 'second']
+    assert {event.operation_id for event in added} == {operation_id.value}
+    assert new_client.accounts == account_ids
+
+
+def test_add_accounts_with_connected_account_adds_nothing(new_client_with_account):
+    connected = new_client_with_account.accounts[0]
+    with pytest.raises(ValueError):
+        new_client_with_account.add_accounts([(UniqueID(), 'new'), (connected, 'again')], UniqueID())
+    assert new_client_with_account.accounts == [connected]
+    assert len(new_client_with_account.uncommitted_changes) == 2
+
+
+def test_add_accounts_with_same_account_twice_raises_value_error(new_client):
+    account_id = UniqueID()
+    with pytest.raises(ValueError):
+        new_client.add_accounts([(account_id, 'first'), (account_id, 'second')], UniqueID())
+    assert new_client.accounts == []
+
+
+def test_remove_accounts_produces_an_event_for_each_account_in_one_operation(new_client):
+    account_ids = [UniqueID() for _ in range(3)]
+    new_client.add_accounts([(account_id, 'test') for account_id in account_ids], UniqueID())
+    new_client.mark_changes_as_committed()
+    operation_id = UniqueID()
+    new_client.remove_accounts([account_ids[2], account_ids[0]], operation_id)
+    removed = new_client.uncommitted_changes
+    assert all(isinstance(event, AccountRemovedFromClient) for event in removed)
+    assert [event.account_id for event in removed] == [account_ids[2].value, account_ids[0].value]
+    assert {event.operation_id for event in removed} == {operation_id.value}
+    assert new_client.accounts == [account_ids[1]]
+
+
+def test_remove_accounts_with_account_that_is_not_connected_removes_nothing(new_client_with_account):
+    connected = new_client_with_account.accounts[0]
+    with pytest.raises(ValueError):
+        new_client_with_account.remove_accounts([connected, UniqueID()], UniqueID())
+    with pytest.raises(ValueError):
+        new_client_with_account.remove_accounts([connected, connected], UniqueID())
+    assert new_client_with_account.accounts == [connected]
+
+
+def test_client_replayed_from_added_and_removed_accounts_has_remaining_accounts(new_client):
+    account_ids = [UniqueID() for _ in range(4)]
+    new_client.add_accounts([(account_id, 'test') for account_id in account_ids], UniqueID())
+    new_client.remove_accounts(account_ids[1:3], UniqueID())
+    replayed = Client(EventStream(new_client.uncommitted_changes))
+    assert replayed.accounts == [account_ids[0], account_ids[3]]
@@ -0,0 +1,147 @@
+import pytest
+from unittest.mock import patch
+from bank_ddd_es_cqrs.shared.model import UniqueID, OperationDuplicate
+from bank_ddd_es_cqrs.accounts import composition_root, AccountCreated, PostgresEventStore, get_engine, \
+    ESAccountRepository, ESClientRepository, AmountDTO, ClientDetailsDTO, create_client, create_account, \
+    credit_account, change_maximum_debt, add_account_to_client
+from bank_ddd_es_cqrs.accounts.infrastructure.sharded import HashRing
+from bank_ddd_es_cqrs.accounts.infrastructure.sharded.event_store import copy_stream
+from bank_ddd_es_cqrs.accounts.infrastructure.sql.model import metadata, session_scope
+
+
+def created(account_id: UniqueID) -> AccountCreated:
+    return AccountCreated(operation_id=str(UniqueID()), client_id=str(UniqueID()), account_id=str(account_id),
+                          account_name='test')
+
+
+@pytest.fixture
+def shard_urls(tmp_path):
+    urls = {name: f'sqlite:///{tmp_path / name}.db' for name in ('a', 'b', 'c')}
+    for url in urls.values():
+        metadata.create_all(get_engine(url))
+    return urls
+
+
+@pytest.fixture
+def account_ids(shard_urls):
+    ring = HashRing(list(shard_urls), composition_root.shard_virtual_nodes)
+    account_ids = [UniqueID() for _ in range(30)]
+    for account_id in account_ids:
+        with session_scope(shard_urls[ring.shard(account_id)]) as session:
+            PostgresEventStore(session).save_events(account_id, [created(account_id)])
+    return account_ids
+
+
+def use_shards(monkeypatch, shard_urls, names):
+    urls = {name: shard_urls[name] for name in names}
+    monkeypatch.setattr(composition_root, 'shard_urls', urls)
+    monkeypatch.setattr(composition_root, 'shard_ring', HashRing(names, composition_root.shard_virtual_nodes))
+
+
+def streams_of_shards(shard_urls):
+    streams = {}
+    for name, url in shard_urls.items():
+        with session_scope(url) as session:
+            streams[name] = set(PostgresEventStore(session).stream_ids(AccountCreated))
+    return streams
+
+
+def test_rebalance_shards_moves_streams_of_removed_shard(monkeypatch, shard_urls, account_ids):
+    in_a = streams_of_shards(shard_urls)['a']
+    use_shards(monkeypatch, shard_urls, ['b', 'c'])
+    assert composition_root.rebalance_shards({'a': shard_urls['a'], 'b': '', 'c': ''}) == len(in_a)
+    streams = streams_of_shards(shard_urls)
+    assert streams['a'] == set()
+    assert streams['b'] | streams['c'] == set(account_ids)
+    ring = composition_root.shard_ring
+    assert all(ring.shard(account_id) == name for name in ('b', 'c') for account_id in streams[name])
+
+
+def test_rebalance_shards_again_moves_nothing(monkeypatch, shard_urls, account_ids):
+    use_shards(monkeypatch, shard_urls, ['b', 'c'])
+    previous_shards = {'a': shard_urls['a'], 'b': '', 'c': ''}
+    composition_root.rebalance_shards(previous_shards)
+    assert composition_root.rebalance_shards(previous_shards) == 0
+    streams = streams_of_shards(shard_urls)
+    assert streams['b'] | streams['c'] == set(account_ids)
+
+
+def test_rebalance_shards_completes_move_stopped_after_copy(monkeypatch, shard_urls, account_ids):
+    in_a = streams_of_shards(shard_urls)['a']
+    use_shards(monkeypatch, shard_urls, ['b', 'c'])
+    account_id = next(iter(in_a))
+    target = composition_root.shard_ring.shard(account_id)
+    # Stopped after the stream was committed to its new shard, before it was deleted from its previous one
+    with session_scope(shard_urls['a']) as source_session, session_scope(shard_urls[target]) as target_session:
+        copy_stream(account_id, PostgresEventStore(source_session), PostgresEventStore(target_session))
+    assert composition_root.rebalance_shards({'a': shard_urls['a'], 'b': '', 'c': ''}) == len(in_a)
+    streams = streams_of_shards(shard_urls)
+    assert streams['a'] == set()
+    assert account_id in streams[target]
+
+
+@pytest.fixture
+def indexed_store(monkeypatch, shard_urls):
+    use_shards(monkeypatch, shard_urls, ['a'])
+    monkeypatch.setattr(composition_root, 'index_operations', True)
+
+
+@pytest.fixture
+def client_id(indexed_store):
+    with composition_root.get_client_write_repo() as repo:
+        return create_client(UniqueID(), ClientDetailsDTO(
+            social_security_number=123543234, first_name='asd', last_name='fdsf', birthdate='12/04/2012'
+        ), repo)
+
+
+@pytest.fixture
+def account_id(client_id):
+    account_id = UniqueID()
+    with composition_root.get_account_write_repo() as repo:
+        create_account(UniqueID(), 'test', account_id, client_id, repo)
+    return account_id
+
+
+def balance(account_id):
+    with composition_root.get_account_write_repo() as repo:
+        return repo.get_by_id(account_id).balance
+
+
+def test_retried_account_command_is_answered_without_loading_account(account_id):
+    operation_id = UniqueID()
+    composition_root.execute_account_command(credit_account, operation_id, account_id, AmountDTO(10, 0))
+    with patch.object(ESAccountRepository, 'get_by_id', side_effect=AssertionError('loaded')):
+        assert composition_root.execute_account_command(
+            credit_account, operation_id, account_id, AmountDTO(10, 0)
+        ) is None
+    assert balance(account_id).dollars == 10
+
+
+def test_retried_add_account_to_client_returns_account_it_created(client_id):
+    operation_id = UniqueID()
+    new_account_id = composition_root.execute_client_command(add_account_to_client, operation_id, client_id, 'a')
+    with patch.object(ESClientRepository, 'get_by_id', side_effect=AssertionError('loaded')):
+        assert composition_root.execute_client_command(
+            add_account_to_client, operation_id, client_id, 'a'
+        ) == new_account_id
+
+
+def test_operation_committed_after_lookup_is_answered_with_its_result(client_id):
+    operation_id = UniqueID()
+    new_account_id = composition_root.execute_client_command(add_account_to_client, operation_id, client_id, 'a')
+    lookup = composition_root.committed_operation_events
+    # The first lookup misses the operation, as if a concurrent command committed it right after
+    lookups = [lambda aggregate_id, operation_id: None, lookup]
+    with patch.object(composition_root, 'committed_operation_events',
+                      side_effect=lambda *args: lookups.pop(0)(*args)):
+        assert composition_root.execute_client_command(
+            add_account_to_client, operation_id, client_id, 'a'
+        ) == new_account_id
+    assert not lookups
+
+
+def test_retried_command_without_committed_result_raises_operation_duplicate(account_id):
+    operation_id = UniqueID()
+    composition_root.execute_account_command(change_maximum_debt, operation_id, account_id, AmountDTO(10, 0))
+    with pytest.raises(OperationDuplicate):
+        composition_root.execute_account_command(change_maximum_debt, operation_id, account_id, AmountDTO(10, 0))
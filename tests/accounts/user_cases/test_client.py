@@ -2,7 +2,7 @@ import pytest
 from unittest.mock import Mock, MagicMock
 from bank_ddd_es_cqrs.shared.model import UniqueID, EventStream
 from bank_ddd_es_cqrs.accounts import create_client, ClientDetailsDTO, add_account_to_client, \
-    remove_account_from_client
+    remove_account_from_client, add_accounts_to_client, remove_accounts_from_client
 from bank_ddd_es_cqrs.accounts import Client, ClientCreated, SocialSecurityNumber, FirstName, LastName, \
     Birthdate, AccountAddedToClient, AccountRemovedFromClient
 
@@ -84,3 +84,20 @@ def test_remove_account_for_client_adds_removed_account_event_to_uncommitted_cha
     remove_account_from_client(UniqueID(), client_id, account_id, fake_client_repo_with_accounts)
     account_called_with: Client = fake_client_repo_with_accounts.save.call_args.args[0]
     assert isinstance(account_called_with.uncommitted_changes[-1], AccountRemovedFromClient)
+
+
+def test_add_accounts_to_client_saves_client_once_with_an_event_for_each_account(fake_client_repo, client_id):
+    new_account_ids = add_accounts_to_client(UniqueID(), client_id, fake_client_repo, ['first', 'second'])
+    fake_client_repo.save.assert_called_once()
+    client_called_with: Client = fake_client_repo.save.call_args.args[0]
+    assert [event.account_id for event in client_called_with.uncommitted_changes] == \
+        [account_id.value for account_id in new_account_ids]
+
+
+def test_remove_accounts_from_client_saves_client_once_with_removed_events(fake_client_repo_with_accounts, client_id,
+                                                                           account_id):
+    remove_accounts_from_client(UniqueID(), client_id, [account_id], fake_client_repo_with_accounts)
+    fake_client_repo_with_accounts.save.assert_called_once()
+    client_called_with: Client = fake_client_repo_with_accounts.save.call_args.args[0]
+    assert isinstance(client_called_with.uncommitted_changes[-1], AccountRemovedFromClient)
+    assert client_called_with.accounts == []
@@ -1,7 +1,15 @@
 import pytest
 from typing import List, Optional
 from unittest.mock import patch
-from bank_ddd_es_cqrs.shared.model import AggregateRoot, BaseEvent, UniqueID, OperationDuplicate, EventStream
+from bank_ddd_es_cqrs.shared.model import AggregateRoot, BaseEvent, UniqueID, OperationDuplicate, EventStream, \
+    applies
+
+
+@pytest.fixture(autouse=True)
+def restore_apply(monkeypatch):
+    # The tests replace `apply` of `AggregateRoot`, it is put back after every test so the aggregates
+    # of the tests that come after keep their `apply`
+    monkeypatch.setattr(AggregateRoot, 'apply', lambda *args, **kwargs: None)
 
 
 def applyless_aggregate(events: Optional[List[BaseEvent]] = None):
@@ -46,8 +54,8 @@ def test_mark_changes_as_committed_cleans_uncommitted_changes():
     assert len(aggregate.uncommitted_changes) == 0
 
 
-def test_apply_event_is_called_for_each_event_passed_when_loading_aggregate():
-    with patch.object(AggregateRoot, 'apply_event') as mock:
+def test_apply_is_called_for_each_event_passed_when_loading_aggregate():
+    with patch.object(AggregateRoot, 'apply') as mock:
         AggregateRoot(EventStream([BaseEvent(operation_id=str(UniqueID())), BaseEvent(operation_id=str(UniqueID())), BaseEvent(operation_id=str(UniqueID()))]))
     assert mock.call_count == 3
 
@@ -95,5 +103,129 @@ def test_applying_new_event_with_same_operation_id_as_already_committed_event_ra
         aggregate.apply_event(event2)
 
 
+def test_applying_new_events_adds_them_to_uncommitted_changes_in_order():
+    aggregate = applyless_aggregate()
+    operation_id = str(UniqueID())
+    events = [BaseEvent(operation_id=operation_id), BaseEvent(operation_id=operation_id)]
+    aggregate.apply_new_events(events)
+    assert aggregate.uncommitted_changes == events
+
+
+def test_applying_new_events_with_committed_operation_applies_none_of_them():
+    committed = BaseEvent(operation_id=str(UniqueID()))
+    aggregate = applyless_aggregate([committed])
+    with patch.object(AggregateRoot, 'apply') as mock:
+        with pytest.raises(OperationDuplicate):
+            aggregate.apply_new_events([BaseEvent(operation_id=str(UniqueID())),
+                                        BaseEvent(operation_id=committed.operation_id)])
+    assert mock.call_count == 0
+    assert aggregate.uncommitted_changes == []
+
+
+def test_loading_aggregate_counts_applied_events_as_stream_version():
+    aggregate = applyless_aggregate([BaseEvent(operation_id=str(UniqueID())), BaseEvent(operation_id=str(UniqueID()))])
+    assert aggregate.stream_version == 2
+
+
+def test_marking_changes_as_committed_adds_them_to_stream_version():
+    aggregate = applyless_aggregate()
+    aggregate.apply_event(BaseEvent(operation_id=str(UniqueID())))
+    aggregate.mark_changes_as_committed()
+    assert aggregate.stream_version == 1
+
+
+def test_snapshot_with_uncommitted_changes_raises_value_error():
+    aggregate = applyless_aggregate()
+    aggregate.apply_event(BaseEvent(operation_id=str(UniqueID())))
+    with pytest.raises(ValueError):
+        aggregate.snapshot()
+
+
+def test_marking_changes_as_committed_moves_version_by_number_of_committed_events():
+    aggregate = AggregateRoot(EventStream([], 5))
+    with patch.object(AggregateRoot, 'apply'):
+        aggregate.apply_event(BaseEvent(operation_id=str(UniqueID())))
+        aggregate.apply_event(BaseEvent(operation_id=str(UniqueID())))
+    aggregate.mark_changes_as_committed()
+    assert aggregate.version == 7
+
+
+def test_marking_changes_of_new_aggregate_as_committed_sets_version_to_number_of_committed_events():
+    aggregate = applyless_aggregate()
+    aggregate.apply_event(BaseEvent(operation_id=str(UniqueID())))
+    aggregate.mark_changes_as_committed()
+    assert aggregate.version == 1
+
+
+def test_catch_up_applies_events_and_takes_version_of_stream():
+    aggregate = applyless_aggregate([BaseEvent(operation_id=str(UniqueID()))])
+    operation_id = str(UniqueID())
+    aggregate.catch_up(EventStream([BaseEvent(operation_id=operation_id)], 7))
+    assert aggregate.version == 7
+    assert aggregate.stream_version == 2
+    assert operation_id in aggregate.committed_operations
+
+
+def test_catch_up_with_uncommitted_changes_raises_value_error():
+    aggregate = applyless_aggregate()
+    aggregate._initialize([BaseEvent(operation_id=str(UniqueID()))])
+    with pytest.raises(ValueError):
+        aggregate.catch_up(EventStream([], 1))
+
+
+class CountedEvent(BaseEvent):
+    pass
+
+
+class SubCountedEvent(CountedEvent):
+    pass
+
+
+class CountingAggregate(AggregateRoot):
+    def __init__(self, *args, **kwargs):
+        self.counted = []
+        super().__init__(*args, **kwargs)
+
+    @applies
+    def _apply_counted(self, event: CountedEvent) -> None:
+        self.counted.append(event)
+
+
+class DoublingAggregate(CountingAggregate):
+    @applies
+    def _apply_counted_twice(self, event: CountedEvent) -> None:
+        self.counted += [event, event]
+
+
+def test_marked_methods_apply_events_of_their_class():
+    event = CountedEvent(operation_id=str(UniqueID()))
+    aggregate = CountingAggregate(EventStream([event]))
+    assert aggregate.counted == [event]
+    assert aggregate.stream_version == 1
+
+
+def test_events_without_method_are_applied_by_apply():
+    with patch.object(AggregateRoot, 'apply') as mock:
+        CountingAggregate().apply_event(BaseEvent(operation_id=str(UniqueID())))
+    assert mock.call_count == 1
+
+
+def test_subclass_of_event_is_applied_by_method_of_its_base_class():
+    event = SubCountedEvent(operation_id=str(UniqueID()))
+    aggregate = CountingAggregate()
+    aggregate.apply_event(event)
+    assert aggregate.counted == [event]
+    assert SubCountedEvent in CountingAggregate._appliers
+
+
+def test_method_of_subclass_replaces_method_of_aggregate_it_extends():
+    event = CountedEvent(operation_id=str(UniqueID()))
+    assert DoublingAggregate(EventStream([event])).counted == [event, event]
+    assert CountingAggregate(EventStream([event])).counted == [event]
 
 
+def test_method_without_annotated_event_raises_type_error():
+    with pytest.raises(TypeError):
+        @applies
+        def _apply(self, event) -> None:
+            pass
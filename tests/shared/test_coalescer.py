@@ -0,0 +1,114 @@
+import threading
+from contextlib import contextmanager
+from unittest.mock import patch
+import pytest
+from bank_ddd_es_cqrs.shared.coalescer import CommandCoalescer
+from bank_ddd_es_cqrs.shared.metrics import Metrics
+from bank_ddd_es_cqrs.shared.model import UniqueID, OperationDuplicate
+from bank_ddd_es_cqrs.accounts import Account, Amount, credit_account, debit_account, AmountDTO
+from bank_ddd_es_cqrs.accounts.infrastructure import InMemoryEventStore, ESAccountRepository
+
+
+@pytest.fixture
+def event_store() -> InMemoryEventStore:
+    return InMemoryEventStore()
+
+
+@pytest.fixture
+def account_id(event_store) -> UniqueID:
+    account_id = UniqueID()
+    ESAccountRepository(event_store).save(Account.create(UniqueID(), account_id, UniqueID(), 'test'))
+    return account_id
+
+
+@pytest.fixture
+def coalescer(event_store) -> CommandCoalescer:
+    @contextmanager
+    def open_repository():
+        yield ESAccountRepository(event_store)
+
+    return CommandCoalescer('test', open_repository, window=0.2, metrics=Metrics())
+
+
+def credit(dollars: int, operation_id=None):
+    operation_id = operation_id or UniqueID()
+    return operation_id, lambda repo, account_id: credit_account(operation_id, account_id, repo, AmountDTO(dollars, 0))
+
+
+def run_concurrently(coalescer, account_id, commands):
+    results = [None] * len(commands)
+
+    def run(index, operation_id, command):
+        try:
+            results[index] = coalescer.execute(account_id, operation_id, lambda repo: command(repo, account_id))
+        except Exception as e:
+            results[index] = e
+
+    threads = []
+    for index, (operation_id, command) in enumerate(commands):
+        thread = threading.Thread(target=run, args=(index, operation_id, command))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_commands_within_window_are_saved_in_one_call(coalescer, event_store, account_id):
+    saved = []
+    save_events = event_store.save_events
+
+    def record_save(aggregate_id, events, expected_version=None):
+        saved.append(len(events))
+        save_events(aggregate_id, events, expected_version)
+
+    with patch.object(event_store, 'save_events', side_effect=record_save):
+        run_concurrently(coalescer, account_id, [credit(1), credit(2), credit(3)])
+    assert saved == [3]
+    assert ESAccountRepository(event_store).get_by_id(account_id).balance == Amount(6, 0)
+
+
+def test_failing_command_fails_only_for_its_caller(coalescer, event_store, account_id):
+    operation_id = UniqueID()
+    debit = (operation_id, lambda repo, account_id: debit_account(operation_id, account_id, repo, AmountDTO(100, 0)))
+    results = run_concurrently(coalescer, account_id, [credit(5), debit, credit(7)])
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], ValueError)
+    assert ESAccountRepository(event_store).get_by_id(account_id).balance == Amount(12, 0)
+
+
+def test_command_that_fails_after_changing_aggregate_leaves_no_changes(coalescer, event_store, account_id):
+    operation_id = UniqueID()
+
+    def credit_then_fail(repo, account_id):
+        credit_account(operation_id, account_id, repo, AmountDTO(50, 0))
+        raise ValueError('failed after credit')
+
+    results = run_concurrently(coalescer, account_id, [credit(5), (operation_id, credit_then_fail), credit(7)])
+    assert isinstance(results[1], ValueError)
+    assert ESAccountRepository(event_store).get_by_id(account_id).balance == Amount(12, 0)
+
+
+def test_same_operation_twice_in_batch_raises_operation_duplicate(coalescer, event_store, account_id):
+    operation_id = UniqueID()
+    results = run_concurrently(coalescer, account_id, [credit(5, operation_id), credit(5, operation_id)])
+    assert results[0] is None
+    assert isinstance(results[1], OperationDuplicate)
+    assert ESAccountRepository(event_store).get_by_id(account_id).balance == Amount(5, 0)
+
+
+def test_full_batch_runs_without_waiting_for_window(event_store, account_id):
+    @contextmanager
+    def open_repository():
+        yield ESAccountRepository(event_store)
+
+    coalescer = CommandCoalescer('test', open_repository, window=60, max_batch_size=1, metrics=Metrics())
+    operation_id, command = credit(5)
+    coalescer.execute(account_id, operation_id, lambda repo: command(repo, account_id))
+    assert ESAccountRepository(event_store).get_by_id(account_id).balance == Amount(5, 0)
+
+
+def test_failure_to_save_batch_is_raised_to_every_caller(coalescer, event_store, account_id):
+    with patch.object(event_store, 'save_events', side_effect=RuntimeError('store is down')):
+        results = run_concurrently(coalescer, account_id, [credit(1), credit(2)])
+    assert all(isinstance(result, RuntimeError) for result in results)
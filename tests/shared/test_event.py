@@ -1,3 +1,5 @@
+import pickle
+import attr
 import pytest
 from bank_ddd_es_cqrs.shared.model import BaseEvent
 
@@ -21,3 +23,17 @@ def test_event_is_key_word_only():
     with pytest.raises(TypeError):
         BaseEvent('operation', version=3)
 
+
+def test_event_has_no_instance_dict():
+    assert not hasattr(BaseEvent(operation_id='asd'), '__dict__')
+
+
+def test_event_is_immutable():
+    event = BaseEvent(operation_id='asd')
+    with pytest.raises(attr.exceptions.FrozenInstanceError):
+        event.version = 2
+
+
+def test_event_survives_pickling():
+    event = BaseEvent(operation_id='asd', version=3)
+    assert pickle.loads(pickle.dumps(event)) == event
@@ -0,0 +1,22 @@
+from bank_ddd_es_cqrs.shared.metrics import Metrics
+
+
+def test_increment_adds_to_counter():
+    metrics = Metrics()
+    metrics.increment('calls')
+    metrics.increment('calls', 2)
+    assert metrics.counter('calls') == 3
+
+
+def test_counter_that_was_never_incremented_is_zero():
+    assert Metrics().counter('calls') == 0
+
+
+def test_snapshot_returns_counters_and_current_value_of_gauges():
+    metrics = Metrics()
+    values = [1, 2]
+    metrics.increment('calls')
+    metrics.register_gauge('size', lambda: values[-1])
+    assert metrics.snapshot() == {'calls': 1, 'size': 2}
+    values.append(7)
+    assert metrics.snapshot()['size'] == 7
@@ -0,0 +1,104 @@
+import pytest
+from unittest.mock import Mock
+from bank_ddd_es_cqrs.shared.model import UniqueID, BoundedOperationLog, UnboundedOperationLog
+from bank_ddd_es_cqrs.shared.model.operations import compact_operation_id
+
+
+def operation_ids(amount: int):
+    return [str(UniqueID()) for _ in range(amount)]
+
+
+def test_compact_operation_id_of_uuid_is_its_16_bytes():
+    operation_id = str(UniqueID())
+    assert compact_operation_id(operation_id).hex() == operation_id.replace('-', '')
+
+
+def test_compact_operation_id_of_other_ids_is_16_bytes():
+    assert len(compact_operation_id('not a uuid')) == 16
+    assert compact_operation_id('not a uuid') != compact_operation_id('not a uuid either')
+
+
+def test_bounded_log_remembers_operations_of_window():
+    log = BoundedOperationLog(window=3)
+    ids = operation_ids(3)
+    for operation_id in ids:
+        log.add(operation_id)
+    assert all(operation_id in log for operation_id in ids)
+    assert len(log) == 3
+
+
+def test_bounded_log_keeps_only_last_operations_in_window():
+    log = BoundedOperationLog(window=2)
+    for operation_id in operation_ids(5):
+        log.add(operation_id)
+    assert len(log) == 2
+
+
+def test_operation_out_of_window_is_looked_up_in_index():
+    log = BoundedOperationLog(window=1)
+    index = Mock(return_value=True)
+    log.bind_index(index)
+    first, second = operation_ids(2)
+    log.add(first)
+    log.add(second)
+    assert first in log
+    index.assert_called_once_with(first)
+
+
+def test_index_is_not_asked_about_operation_in_window_or_unknown_to_filter():
+    log = BoundedOperationLog(window=10)
+    index = Mock(return_value=True)
+    log.bind_index(index)
+    known = str(UniqueID())
+    log.add(known)
+    assert known in log
+    assert sum(operation_id in log for operation_id in operation_ids(100)) == 0
+    index.assert_not_called()
+
+
+def test_operation_out_of_window_without_index_is_taken_as_new():
+    log = BoundedOperationLog(window=1)
+    first, second = operation_ids(2)
+    log.add(first)
+    log.add(second)
+    assert first not in log
+
+
+def test_bounded_log_restored_from_its_snapshot_has_same_window_and_filter():
+    log = BoundedOperationLog(window=2)
+    ids = operation_ids(4)
+    for operation_id in ids:
+        log.add(operation_id)
+    restored = BoundedOperationLog(window=2)
+    restored.restore(log.snapshot())
+    index = Mock(return_value=False)
+    restored.bind_index(index)
+    assert ids[3] in restored and ids[2] in restored
+    assert ids[0] not in restored
+    index.assert_called_once_with(ids[0])
+
+
+def test_bounded_log_restored_from_unbounded_snapshot_keeps_last_operations():
+    unbounded = UnboundedOperationLog()
+    ids = operation_ids(3)
+    for operation_id in ids:
+        unbounded.add(operation_id)
+    log = BoundedOperationLog(window=2)
+    log.restore(unbounded.snapshot())
+    assert len(log) == 2
+    assert ids[2] in log
+
+
+def test_unbounded_log_restored_from_bounded_snapshot_keeps_window():
+    log = BoundedOperationLog(window=2)
+    ids = operation_ids(3)
+    for operation_id in ids:
+        log.add(operation_id)
+    unbounded = UnboundedOperationLog()
+    unbounded.restore(log.snapshot())
+    assert list(unbounded) == ids[1:]
+
+
+def test_bloom_bits_must_be_power_of_2():
+    with pytest.raises(ValueError):
+        BoundedOperationLog(bloom_bits=1000)
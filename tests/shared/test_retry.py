@@ -0,0 +1,112 @@
+import pytest
+from unittest.mock import Mock
+from bank_ddd_es_cqrs.shared.metrics import Metrics
+from bank_ddd_es_cqrs.shared.retry import RetryingCommandExecutor, RetryBudget
+
+
+class Conflict(Exception):
+    pass
+
+
+def failing(times: int, result: str = 'done'):
+    calls = []
+
+    def command():
+        calls.append(1)
+        if len(calls) <= times:
+            raise Conflict()
+        return result
+
+    command.calls = calls
+    return command
+
+
+@pytest.fixture
+def metrics() -> Metrics:
+    return Metrics()
+
+
+@pytest.fixture
+def sleep() -> Mock:
+    return Mock()
+
+
+def executor(metrics, sleep, **kwargs) -> RetryingCommandExecutor:
+    return RetryingCommandExecutor(
+        'test', (Conflict,), metrics=metrics, sleep=sleep, jitter=lambda low, high: high, **kwargs
+    )
+
+
+def test_execute_returns_result_of_command_that_succeeds(metrics, sleep):
+    assert executor(metrics, sleep).execute(lambda: 'done') == 'done'
+    sleep.assert_not_called()
+
+
+def test_execute_runs_command_again_after_conflict(metrics, sleep):
+    command = failing(2)
+    assert executor(metrics, sleep).execute(command) == 'done'
+    assert len(command.calls) == 3
+
+
+def test_execute_raises_conflict_after_max_attempts(metrics, sleep):
+    command = failing(10)
+    with pytest.raises(Conflict):
+        executor(metrics, sleep, max_attempts=3).execute(command)
+    assert len(command.calls) == 3
+    assert metrics.counter('commands.test.retries_exhausted') == 1
+
+
+def test_execute_does_not_retry_other_exceptions(metrics, sleep):
+    command = Mock(side_effect=ValueError())
+    with pytest.raises(ValueError):
+        executor(metrics, sleep).execute(command)
+    assert command.call_count == 1
+
+
+def test_delay_grows_exponentially_up_to_max_delay(metrics, sleep):
+    executor(metrics, sleep, max_attempts=5, base_delay=0.1, max_delay=0.3).execute(failing(4))
+    assert [call.args[0] for call in sleep.call_args_list] == [0.1, 0.2, 0.3, 0.3]
+
+
+def test_delay_is_jittered_between_zero_and_backoff(metrics, sleep):
+    jitter = Mock(return_value=0.05)
+    retrying = RetryingCommandExecutor('test', (Conflict,), base_delay=0.1, metrics=metrics, sleep=sleep,
+                                       jitter=jitter)
+    retrying.execute(failing(1))
+    jitter.assert_called_once_with(0, 0.1)
+    sleep.assert_called_once_with(0.05)
+
+
+def test_execute_stops_retrying_when_budget_is_spent(metrics, sleep):
+    retrying = executor(metrics, sleep, max_attempts=10, budget=RetryBudget(ratio=0, capacity=2))
+    command = failing(10)
+    with pytest.raises(Conflict):
+        retrying.execute(command)
+    assert len(command.calls) == 3
+    assert metrics.counter('commands.test.budget_exhausted') == 1
+
+
+def test_retry_budget_is_refilled_by_commands_up_to_capacity():
+    budget = RetryBudget(ratio=0.5, capacity=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    budget.deposit()
+    assert budget.balance == 1
+
+
+def test_execute_counts_attempts_conflicts_and_retries(metrics, sleep):
+    retrying = executor(metrics, sleep)
+    retrying.execute(failing(1))
+    retrying.execute(failing(0))
+    assert metrics.counter('commands.test.executed') == 2
+    assert metrics.counter('commands.test.attempts') == 3
+    assert metrics.counter('commands.test.conflicts') == 1
+    assert metrics.counter('commands.test.retries') == 1
+    assert metrics.snapshot()['commands.test.conflict_rate'] == pytest.approx(1 / 3)
+
+
+def test_executor_must_attempt_at_least_once(metrics):
+    with pytest.raises(ValueError):
+        RetryingCommandExecutor('test', (Conflict,), max_attempts=0, metrics=metrics)
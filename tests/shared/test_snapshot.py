@@ -0,0 +1,23 @@
+import pytest
+from dataclasses import FrozenInstanceError
+from bank_ddd_es_cqrs.shared.model import Snapshot, SnapshotPolicy
+
+
+def test_snapshot_immutable():
+    snapshot = Snapshot({}, 3)
+    with pytest.raises(FrozenInstanceError):
+        snapshot.stream_version = 4
+
+
+def test_snapshot_policy_every_must_be_positive():
+    with pytest.raises(ValueError):
+        SnapshotPolicy(every=0)
+
+
+def test_snapshot_policy_snapshots_when_crossing_multiple_of_every():
+    assert SnapshotPolicy(every=10).should_snapshot(9, 10)
+    assert SnapshotPolicy(every=10).should_snapshot(8, 13)
+
+
+def test_snapshot_policy_does_not_snapshot_between_multiples_of_every():
+    assert not SnapshotPolicy(every=10).should_snapshot(10, 19)
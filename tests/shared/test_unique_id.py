@@ -1,3 +1,7 @@
+import pickle
+import uuid
+from dataclasses import FrozenInstanceError
+import pytest
 from bank_ddd_es_cqrs.shared.model import UniqueID
 
 
@@ -5,3 +9,26 @@ def test_str_function_on_unique_id():
     g_id = UniqueID('asd')
     assert str(g_id) == 'asd'
 
+
+def test_new_unique_id_is_a_uuid4():
+    parsed = uuid.UUID(UniqueID().value)
+    assert parsed.version == 4
+    assert parsed.variant == uuid.RFC_4122
+
+
+def test_unique_ids_of_the_same_value_are_equal():
+    value = str(uuid.uuid4())
+    assert UniqueID(value) == UniqueID(value)
+    assert hash(UniqueID(value)) == hash(UniqueID(value))
+    assert UniqueID(value) != value
+
+
+def test_unique_id_is_frozen():
+    unique_id = UniqueID()
+    with pytest.raises(FrozenInstanceError):
+        unique_id.value = 'other'
+
+
+def test_unique_id_pickles_to_an_equal_id():
+    for unique_id in (UniqueID(), UniqueID('asd')):
+        assert pickle.loads(pickle.dumps(unique_id)) == unique_id